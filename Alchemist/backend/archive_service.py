@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import json
+import time
+import queue
+import tarfile
+import zipfile
+import tempfile
+import threading
+from pathlib import Path
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+
+import pdf_converter
+from pdf_converter import logger
+
+# archive 参数 -> MIME类型
+ARCHIVE_FORMATS = {
+    "zip": "application/zip",
+    "tar": "application/x-tar",
+}
+# 上传内容按块写入临时文件，不在内存中保留整个PDF
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = 4 * 1024 * 1024 * 1024
+# multipart 请求体中PDF以外的部分（分隔符、表单字段）允许的字节数
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+# 除正在渲染的页面外，最多缓存这么多张已编码、尚未发送给客户端的页面；客户端读取慢时渲染随之暂停
+ARCHIVE_BUFFER_PAGES = 4
+
+class ArchiveRequestError(Exception):
+    """无法处理的上传转换请求，status 为对应的HTTP状态码。"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def upload_too_large(max_bytes=MAX_UPLOAD_BYTES):
+    return ArchiveRequestError(f"上传的文件超过 {max_bytes // (1024 * 1024)} MB 上限。", 413)
+
+def save_upload(stream, target_path, max_bytes=MAX_UPLOAD_BYTES, content_length=None):
+    """将上传的数据流分块写入 target_path，返回写入的字节数；超过 max_bytes 时抛出 ArchiveRequestError。
+
+    给出 content_length（请求的 Content-Length）时先据此检查，超出上限的请求不读取请求体。
+    """
+    if content_length is not None and content_length > max_bytes:
+        raise upload_too_large(max_bytes)
+    size = 0
+    with open(target_path, "wb") as f:
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise upload_too_large(max_bytes)
+            f.write(chunk)
+    if size == 0:
+        raise ArchiveRequestError("上传的PDF为空。")
+    return size
+
+def receive_multipart_upload(environ, max_bytes=MAX_UPLOAD_BYTES):
+    """边接收边解析 multipart 请求体，返回 (file 字段的临时文件路径, 上传的文件名, 其他表单字段)。
+
+    文件内容直接写入临时文件，不先由 werkzeug 缓存一份再复制；请求体大小在接收前按 Content-Length
+    （分块传输时在接收过程中）检查。出错时抛出 ArchiveRequestError，并删除已写入的临时文件。
+    """
+    upload_files = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        upload_file = tempfile.NamedTemporaryFile(prefix="alchemist_upload_", suffix=".pdf", delete=False)
+        upload_files.append(upload_file)
+        return upload_file
+
+    upload_path = None
+    try:
+        try:
+            _, form, files = parse_form_data(environ, stream_factory=stream_factory, silent=False,
+                                             max_content_length=max_bytes + MULTIPART_OVERHEAD_BYTES)
+        except RequestEntityTooLarge:
+            raise upload_too_large(max_bytes)
+        except ValueError as e:
+            raise ArchiveRequestError(f"无法解析上传的表单: {e}")
+        upload = files.get("file")
+        if upload is None:
+            raise ArchiveRequestError("缺少 file 字段。")
+        upload_path = Path(upload.stream.name)
+        size = upload_path.stat().st_size
+        if size > max_bytes:
+            raise upload_too_large(max_bytes)
+        if size == 0:
+            raise ArchiveRequestError("上传的PDF为空。")
+        return upload_path, upload.filename, form.to_dict()
+    except BaseException:
+        upload_path = None
+        raise
+    finally:
+        for upload_file in upload_files:
+            upload_file.close()
+            if Path(upload_file.name) != upload_path:
+                Path(upload_file.name).unlink(missing_ok=True)
+
+def new_upload_path():
+    """上传PDF使用的临时文件路径；pdftoppm 需要随机读取PDF，输入只能先落盘。"""
+    fd, path = tempfile.mkstemp(prefix="alchemist_upload_", suffix=".pdf")
+    os.close(fd)
+    return Path(path)
+
+class StreamBuffer:
+    """只追加、不可回退的写入缓冲区，供 zipfile/tarfile 以流模式写入；drain() 取出已写入的数据。"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+class PageArchiveWriter:
+    """以流模式写入ZIP（不压缩，PNG本身已压缩）或tar，每写入一个文件后可立即取出对应的字节。"""
+
+    def __init__(self, archive_format):
+        self.archive_format = archive_format
+        self.buffer = StreamBuffer()
+        if archive_format == "zip":
+            # 缓冲区不支持 seek，zipfile 会在每个文件后写数据描述符，无需回头修改文件头
+            self.archive = zipfile.ZipFile(self.buffer, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        else:
+            self.archive = tarfile.open(fileobj=self.buffer, mode="w|", format=tarfile.PAX_FORMAT)
+
+    def add(self, name, data, mtime=None):
+        mtime = mtime or time.time()
+        if self.archive_format == "zip":
+            info = zipfile.ZipInfo(name, date_time=time.localtime(mtime)[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            self.archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(mtime)
+            self.archive.addfile(info, io.BytesIO(data))
+        return self.buffer.drain()
+
+    def close(self):
+        self.archive.close()
+        return self.buffer.drain()
+
+def encode_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+class PageArchiveStream:
+    """将上传的PDF逐页渲染并以归档流的形式返回，页面在渲染完成后立即写出。
+
+    页面按完成顺序写入归档；内存中最多保留正在渲染的页面和 ARCHIVE_BUFFER_PAGES 张待发送的页面，
+    输出不落盘。归档末尾附带任务清单（MANIFEST_FILENAME），记录被跳过和失败的页面。
+    迭代结束或被中途关闭（客户端断开）时终止渲染并删除上传的临时文件。
+    """
+
+    def __init__(self, pdf_path, upload_name, settings, archive_format="zip", stop_event=None,
+                 scheduler=None, job_id=None):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ArchiveRequestError(f"不支持的归档格式 '{archive_format}'，可选: {', '.join(ARCHIVE_FORMATS)}。")
+        self.pdf_path = Path(pdf_path)
+        self.upload_name = Path(upload_name or "upload.pdf").name
+        self.settings = settings
+        self.archive_format = archive_format
+        self.stop_event = stop_event or threading.Event()
+        self.scheduler = scheduler
+        self.job_id = job_id
+        self.manifest = pdf_converter.new_job_manifest(settings)
+        self.total_pages = pdf_converter.read_pdf_page_count(self.pdf_path, settings.get("page_timeout") or None,
+                                                             self.manifest)
+        if not self.total_pages:
+            raise ArchiveRequestError(f"无法读取上传的PDF '{self.upload_name}'，可能文件已损坏或不是PDF。", 422)
+        self.pages = pdf_converter.parse_page_ranges(settings["pages"], self.total_pages)
+        if not self.pages:
+            raise ArchiveRequestError(f"页码设置 '{settings['pages']}' 未选中任何页面（共 {self.total_pages} 页）。")
+        self.controller = pdf_converter.AdaptiveConcurrencyController(
+            settings.get("workers"), settings.get("min_workers"), settings.get("max_workers"),
+            settings.get("adaptive_workers"))
+
+    @property
+    def mimetype(self):
+        return ARCHIVE_FORMATS[self.archive_format]
+
+    @property
+    def download_name(self):
+        return f"{Path(self.upload_name).stem}_PNGs.{self.archive_format}"
+
+    def _iter_page_tasks(self, slots):
+        reserved_names = set()
+        for page_num in self.pages:
+            output_name = pdf_converter.generate_output_filename(
+                self.settings["output_filename_template"], Path(self.upload_name), page_num, self.total_pages,
+                self.settings["dpi"], self.settings["prefix"])
+            output_name = pdf_converter.reserve_output_path(Path(output_name), False, reserved_names,
+                                                            check_existing=False).name
+            # 待发送的页面达到上限时暂停取新页面，渲染速度不超过客户端读取速度
+            while not slots.acquire(timeout=pdf_converter.RENDER_POLL_INTERVAL):
+                if self.stop_event.is_set():
+                    return
+            if self.stop_event.is_set():
+                return
+            yield page_num, output_name
+
+    def _run_producer(self, results, slots):
+        options = {key: self.settings.get(key) for key in pdf_converter.IMAGE_OPTION_KEYS}
+        controller = self.controller
+
+        def run_task(task):
+            page_num, output_name = task
+            data = None
+            try:
+                processed = pdf_converter.render_processed_page(
+                    self.pdf_path, page_num, self.settings["dpi"], self.settings["grayscale"],
+                    self.settings["rotate"], self.stop_event, options, self.manifest)
+                if processed is not None:
+                    image, page_record, applied_output_mode = processed
+                    data = encode_png(image)
+                    page_record.update(page=page_num, output=output_name, output_mode=applied_output_mode,
+                                       image_mode=image.mode, bytes=len(data))
+                    self.manifest["pages"].append(page_record)
+            except pdf_converter.RenderCancelled:
+                pass
+            except (pdf_converter.RenderTimeout, pdf_converter.RenderCrashed) as e:
+                logger.error(str(e))
+                reason = "timeout" if isinstance(e, pdf_converter.RenderTimeout) else "crash"
+                pdf_converter.record_manifest_failure(self.manifest, self.pdf_path, page_num, reason, str(e))
+            except Exception as e:
+                logger.error(f"转换 '{self.upload_name}' 第 {page_num} 页时发生错误: {e}", exc_info=True)
+                pdf_converter.record_manifest_failure(self.manifest, self.pdf_path, page_num, "error", str(e))
+            if data is None:
+                slots.release()
+            else:
+                results.put((output_name, data))
+
+        try:
+            scheduling = pdf_converter.run_page_tasks(
+                self._iter_page_tasks(slots), run_task, controller, self.stop_event, self.scheduler, self.job_id,
+                self.settings.get("priority"), self.settings.get("latency_target"))
+            self.manifest["metrics"] = controller.summary()
+            if scheduling:
+                self.manifest["metrics"]["scheduling"] = scheduling
+        except BaseException as e:
+            logger.critical(f"转换上传的PDF '{self.upload_name}' 时发生严重错误: {e}", exc_info=True)
+            self.manifest["error"] = str(e)
+        finally:
+            results.put(None)
+
+    def __iter__(self):
+        results = queue.Queue()
+        slots = threading.BoundedSemaphore(self.controller.max_workers + ARCHIVE_BUFFER_PAGES)
+        producer = threading.Thread(target=self._run_producer, args=(results, slots),
+                                    name=f"archive-{self.job_id}", daemon=True)
+        writer = PageArchiveWriter(self.archive_format)
+        finished = False
+        written = 0
+        try:
+            producer.start()
+            while True:
+                result = results.get()
+                if result is None:
+                    break
+                output_name, data = result
+                chunk = writer.add(output_name, data)
+                del data, result
+                slots.release()
+                written += 1
+                yield chunk
+            self._finalize_manifest()
+            yield writer.add(pdf_converter.MANIFEST_FILENAME,
+                             json.dumps(self.manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+            yield writer.close()
+            finished = True
+            logger.info(f"上传的PDF '{self.upload_name}' 转换完成，已发送 {written} 张图片。")
+        finally:
+            if not finished:
+                logger.info(f"上传的PDF '{self.upload_name}' 的转换在发送 {written} 张图片后被中止。")
+            self.stop_event.set()
+            producer.join()
+            self.pdf_path.unlink(missing_ok=True)
+
+    def _finalize_manifest(self):
+        # 临时文件路径对客户端没有意义，替换为上传时的文件名
+        for key in ("skipped_pages", "failed_pages"):
+            for record in self.manifest[key]:
+                record["pdf"] = self.upload_name
+        self.manifest["upload"] = {"filename": self.upload_name, "total_pages": self.total_pages,
+                                   "archive_format": self.archive_format}
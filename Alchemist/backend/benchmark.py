@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""转换引擎的基准测试：各阶段的微基准和端到端吞吐量，结果保存为JSON基线，compare 子命令检查性能回退。
+
+微基准:
+  parse_page_ranges / generate_output_filename  每次调用的耗时
+  page_count   read_pdf_page_count（pdfinfo），含损坏文件
+  render       render_page，各类页面 × 各DPI（超大页面只测最低DPI）
+  transform    灰度、旋转、输出模式、自动裁剪、空白页检测、页面哈希
+  encode       PNG编码（full / bilevel / palette）
+  write        save_image（编码并原子替换写入）
+  discovery    discover_pdf_files 遍历含 --discovery_entries 个文件的目录树（--large_discovery 时为一百万个）
+端到端:
+  convert_single_pdf     各DPI下的页/秒
+  run_conversion_batch   各DPI × 并发数下的页/秒
+输入PDF由 pdf_corpus 按 seed 和档位生成。每项重复 --repeat 次，以中位数作为结果。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+import pdf_corpus
+import pdf_converter
+from pdf_converter import logger
+from archive_service import encode_png
+
+RESULTS_VERSION = 1
+BENCHMARK_GROUPS = ("parse_page_ranges", "generate_output_filename", "page_count", "render", "transform", "encode",
+                    "write", "discovery", "convert_single_pdf", "run_conversion_batch")
+DEFAULT_DPIS = "72,150,300"
+DEFAULT_WORKERS = "1,2,4"
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.10
+# 目录遍历基准的默认文件数；生成一百万个文件的目录树须显式指定 --large_discovery
+DEFAULT_DISCOVERY_ENTRIES = 10000
+LARGE_DISCOVERY_ENTRIES = 1000000
+# 纯Python函数的单个样本至少运行这么久（秒），按此自动确定每个样本的调用次数
+MICRO_SAMPLE_SECONDS = 0.2
+# 目录树中每个目录的条目数，以及PDF之外的其他文件的比例
+DISCOVERY_FANOUT = 1000
+DISCOVERY_OTHER_RATIO = 0.3
+# 渲染、变换和编码使用的页面DPI（不在 --dpis 中时取最接近的）
+TRANSFORM_DPI = 150
+PAGE_COUNT_MAX_FILES = 50
+RENDER_CATEGORIES = ("text", "vector", "images", "huge")
+MACRO_CATEGORIES = ("text", "vector", "images")
+
+def time_calls(function, repeat, number=1):
+    """运行 function repeat 组，每组 number 次，返回每组中单次调用的平均耗时（秒）。"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - started) / number)
+    return samples
+
+def calibrate_number(function, sample_seconds=MICRO_SAMPLE_SECONDS):
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        if time.perf_counter() - started >= sample_seconds / 10 or number >= 10 ** 7:
+            return number * 10
+        number *= 10
+
+class BenchmarkRun:
+    """依次运行选中的基准测试并收集结果；单项出错时记录错误并继续。"""
+
+    def __init__(self, corpus_dir, work_dir, manifest, dpis, workers, repeat, discovery_entries, groups):
+        self.corpus_dir = Path(corpus_dir)
+        self.work_dir = Path(work_dir)
+        self.manifest = manifest
+        self.dpis = dpis
+        self.workers = workers
+        self.repeat = repeat
+        self.discovery_entries = discovery_entries
+        self.groups = groups
+        self.results = {}
+        self.errors = {}
+        self._page_image = None
+
+    def corpus_files(self, category, valid=True):
+        return [self.corpus_dir / entry["path"] for entry in self.manifest["files"]
+                if entry["category"] == category and entry["valid"] == valid]
+
+    def record(self, name, unit, samples, scale=1.0, higher_is_better=False, **info):
+        values = [sample * scale for sample in samples]
+        self.results[name] = {
+            "unit": unit,
+            "higher_is_better": higher_is_better,
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+            "samples": len(values),
+            **info,
+        }
+        print(f"  {name:<48} {self.results[name]['median']:>12.3f} {unit}")
+
+    def run(self):
+        for group in BENCHMARK_GROUPS:
+            if group not in self.groups:
+                continue
+            print(f"[{group}]")
+            try:
+                getattr(self, f"bench_{group}")()
+            except Exception as e:
+                logger.error(f"基准测试 {group} 出错: {e}", exc_info=True)
+                self.errors[group] = str(e)
+        return self.results
+
+    def bench_parse_page_ranges(self):
+        cases = {"first": ("first", 10), "all_5000": ("all", 5000), "ranges": ("1-3,5,7-120,200,300-450", 500),
+                 "list_1000": (",".join(str(page) for page in range(1, 1001)), 1000)}
+        for case, (page_str, total_pages) in cases.items():
+            function = lambda: pdf_converter.parse_page_ranges(page_str, total_pages)
+            self.record(f"parse_page_ranges.{case}", "us", time_calls(function, self.repeat, calibrate_number(function)),
+                        scale=1e6)
+
+    def bench_generate_output_filename(self):
+        pdf_path = self.corpus_dir / "text" / "nested" / "report_2024.pdf"
+        cases = {"default": pdf_converter.DEFAULT_CONFIG["output_filename_template"],
+                 "full": "{prefix}{relative_parent_dir_name}_{original_dir_name}_{pdf_name}{pdf_suffix}"
+                         "_{page_num}_of_{total_pages}_{dpi}dpi",
+                 "no_template": ""}
+        for case, template in cases.items():
+            function = lambda: pdf_converter.generate_output_filename(template, pdf_path, 42, 500, 300, "scan_",
+                                                                      self.corpus_dir)
+            self.record(f"generate_output_filename.{case}", "us",
+                        time_calls(function, self.repeat, calibrate_number(function)), scale=1e6)
+
+    def bench_page_count(self):
+        for name, pdf_files in (("valid", [path for category in ("text", "vector", "images", "long", "tiny")
+                                           for path in self.corpus_files(category)]),
+                                ("corrupt", self.corpus_files("corrupt", valid=False))):
+            pdf_files = pdf_files[:PAGE_COUNT_MAX_FILES]
+            if not pdf_files:
+                continue
+            function = lambda: [pdf_converter.read_pdf_page_count(path) for path in pdf_files]
+            self.record(f"page_count.{name}", "ms/file", time_calls(function, self.repeat),
+                        scale=1e3 / len(pdf_files), files=len(pdf_files))
+
+    def render(self, pdf_path, dpi):
+        image = pdf_converter.render_page(pdf_path, 1, dpi)
+        if image is None:
+            raise RuntimeError(f"renderer produced no image for {pdf_path}")
+        return image
+
+    def bench_render(self):
+        for category in RENDER_CATEGORIES:
+            pdf_files = self.corpus_files(category)
+            if not pdf_files:
+                continue
+            # 超大页面在高DPI下需要数GB内存，只测最低DPI
+            for dpi in (self.dpis[:1] if category == "huge" else self.dpis):
+                self.record(f"render.{category}@{dpi}dpi", "ms/page",
+                            time_calls(lambda: self.render(pdf_files[0], dpi), self.repeat), scale=1e3)
+
+    def page_image(self):
+        """变换、编码和写入测试使用的页面：文字页面，以最接近 TRANSFORM_DPI 的DPI渲染。"""
+        if self._page_image is None:
+            dpi = min(self.dpis, key=lambda value: abs(value - TRANSFORM_DPI))
+            self._page_image = self.render(self.corpus_files("text")[0], dpi)
+        return self._page_image
+
+    def bench_transform(self):
+        image = self.page_image()
+        operations = {
+            "grayscale": lambda: image.convert("L"),
+            "rotate90": lambda: image.rotate(90, expand=True),
+            "bilevel": lambda: pdf_converter.apply_output_mode(image, "bilevel"),
+            "palette": lambda: pdf_converter.apply_output_mode(image, "palette"),
+            "auto_mode": lambda: pdf_converter.apply_output_mode(image, "auto"),
+            "autocrop": lambda: pdf_converter.find_content_bbox(image),
+            "ink_coverage": lambda: pdf_converter.ink_coverage(image),
+            "page_hash": lambda: pdf_converter.hash_page_image(image),
+        }
+        for name, function in operations.items():
+            self.record(f"transform.{name}", "ms/page", time_calls(function, self.repeat), scale=1e3,
+                        size=list(image.size))
+
+    def output_images(self):
+        image = self.page_image()
+        return {"full": image, "bilevel": pdf_converter.apply_output_mode(image, "bilevel")[0],
+                "palette": pdf_converter.apply_output_mode(image, "palette")[0]}
+
+    def bench_encode(self):
+        for mode, image in self.output_images().items():
+            encoded_bytes = len(encode_png(image))
+            self.record(f"encode.png_{mode}", "ms/page", time_calls(lambda: encode_png(image), self.repeat),
+                        scale=1e3, bytes=encoded_bytes)
+
+    def bench_write(self):
+        output_dir = self.work_dir / "write"
+        output_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            for mode, image in self.output_images().items():
+                output_path = output_dir / f"page_{mode}.png"
+                self.record(f"write.save_image_{mode}", "ms/page",
+                            time_calls(lambda: pdf_converter.save_image(image, output_path), self.repeat), scale=1e3)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    def bench_discovery(self):
+        tree = build_discovery_tree(self.work_dir / f"discovery_{self.discovery_entries}", self.discovery_entries)
+        cases = {"recursive": (True, [], [], ""), "include_keyword": (True, ["00042"], [], ""),
+                 "regex": (True, [], [], r"_0*[13579]\.pdf$"), "top_level": (False, [], [], "")}
+        # 目录树较大时每次遍历需要数秒，最多重复3次
+        repeat = min(self.repeat, 3)
+        for case, (recursive, include, exclude, regex) in cases.items():
+            found = []
+            function = lambda: found.append(len(pdf_converter.discover_pdf_files(tree, recursive, include, exclude,
+                                                                                 regex)))
+            self.record(f"discovery.{case}", "s", time_calls(function, repeat), entries=self.discovery_entries,
+                        found=found[-1] if found else 0)
+
+    def macro_inputs(self):
+        return [path for category in MACRO_CATEGORIES for path in self.corpus_files(category)]
+
+    def bench_convert_single_pdf(self):
+        pdf_files = self.macro_inputs()
+        output_dir = self.work_dir / "convert_single_pdf"
+        settings = dict(pdf_converter.DEFAULT_CONFIG)
+        options = {key: settings.get(key) for key in pdf_converter.IMAGE_OPTION_KEYS}
+        for dpi in self.dpis:
+            samples = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                generated = 0
+                for pdf_path in pdf_files:
+                    generated += len(pdf_converter.convert_single_pdf(
+                        pdf_path, output_dir, "all", dpi, True, "", settings["output_filename_template"], False, 0,
+                        False, options=options, manifest=pdf_converter.new_job_manifest(settings)))
+                samples.append(generated / (time.perf_counter() - started))
+                shutil.rmtree(output_dir, ignore_errors=True)
+            self.record(f"convert_single_pdf@{dpi}dpi", "pages/s", samples, higher_is_better=True,
+                        pdfs=len(pdf_files), pages=generated)
+
+    def bench_run_conversion_batch(self):
+        pdf_files = self.macro_inputs()
+        output_dir = self.work_dir / "run_conversion_batch"
+        for dpi in self.dpis:
+            for workers in self.workers:
+                settings = dict(pdf_converter.DEFAULT_CONFIG)
+                settings.update(pages="all", dpi=dpi, overwrite=True, workers=workers, max_workers=workers,
+                                quarantine=False, post_export_action="none")
+                samples = []
+                for _ in range(self.repeat):
+                    started = time.perf_counter()
+                    generated, _ = pdf_converter.run_conversion_batch(
+                        pdf_files, output_dir, settings, self.corpus_dir,
+                        manifest=pdf_converter.new_job_manifest(settings))
+                    samples.append(len(generated) / (time.perf_counter() - started))
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                self.record(f"run_conversion_batch@{dpi}dpi.w{workers}", "pages/s", samples, higher_is_better=True,
+                            pdfs=len(pdf_files), pages=len(generated))
+
+def build_discovery_tree(tree_dir, entries):
+    """生成含 entries 个空文件（约 DISCOVERY_OTHER_RATIO 为非PDF文件）的两层目录树，每个目录 DISCOVERY_FANOUT 个
+    文件；完成后写入标记文件，之后直接复用。"""
+    tree_dir = Path(tree_dir)
+    marker = tree_dir / ".complete"
+    if marker.exists():
+        return tree_dir
+    if tree_dir.exists():
+        shutil.rmtree(tree_dir)
+    print(f"  building discovery tree with {entries} files in {tree_dir} ...")
+    other_every = round(1 / DISCOVERY_OTHER_RATIO) if DISCOVERY_OTHER_RATIO else 0
+    for file_index in range(entries):
+        directory_index, position = divmod(file_index, DISCOVERY_FANOUT)
+        directory = tree_dir / f"group_{directory_index // DISCOVERY_FANOUT:04d}" / f"dir_{directory_index:06d}"
+        if position == 0:
+            directory.mkdir(parents=True)
+        suffix = ".png" if other_every and position % other_every == 0 else ".pdf"
+        open(directory / f"doc_{file_index:07d}{suffix}", "wb").close()
+    marker.touch()
+    return tree_dir
+
+def environment_info():
+    info = {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()}
+    try:
+        renderer = subprocess.run([pdf_converter.pdftoppm_executable(), "-v"], capture_output=True, text=True,
+                                  timeout=10)
+        info["pdftoppm"] = (renderer.stderr or renderer.stdout).strip().splitlines()[0]
+    except (OSError, subprocess.SubprocessError, IndexError):
+        info["pdftoppm"] = None
+    try:
+        info["git_commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                            cwd=Path(__file__).resolve().parent, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        info["git_commit"] = None
+    return info
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """逐项比较两次结果的中位数，返回 [(名称, 基线值, 当前值, 相对变化, 状态)]。
+
+    状态为 regression（变差超过 threshold）、improvement（变好超过 threshold）、ok、new 或 missing。
+    基线中位数为0时无法计算相对变化（为 None）：越小越好的指标变为非0即为 regression，越大越好的指标为 new。
+    """
+    rows = []
+    baseline_results = baseline["benchmarks"]
+    current_results = current["benchmarks"]
+    for name in sorted(set(baseline_results) | set(current_results)):
+        if name not in current_results:
+            rows.append((name, baseline_results[name]["median"], None, None, "missing"))
+            continue
+        if name not in baseline_results:
+            rows.append((name, None, current_results[name]["median"], None, "new"))
+            continue
+        before = baseline_results[name]["median"]
+        after = current_results[name]["median"]
+        if not before:
+            if after == before:
+                rows.append((name, before, after, 0.0, "ok"))
+            else:
+                rows.append((name, before, after, None,
+                             "new" if current_results[name]["higher_is_better"] else "regression"))
+            continue
+        change = (after - before) / before
+        # 统一为"正数表示变差"
+        worse = -change if current_results[name]["higher_is_better"] else change
+        status = "regression" if worse > threshold else "improvement" if worse < -threshold else "ok"
+        rows.append((name, before, after, change, status))
+    return rows
+
+def print_comparison(baseline, current, threshold):
+    for key in ("cpu_count", "platform", "pdftoppm"):
+        if baseline["environment"].get(key) != current["environment"].get(key):
+            print(f"Warning: {key} differs ({baseline['environment'].get(key)} -> {current['environment'].get(key)})")
+    if baseline["config"].get("corpus") != current["config"].get("corpus"):
+        print("Warning: results were measured on different corpora")
+    rows = compare_results(baseline, current, threshold)
+    print(f"{'benchmark':<48} {'baseline':>12} {'current':>12} {'change':>9}  status")
+    for name, before, after, change, status in rows:
+        before_text = f"{before:.3f}" if before is not None else "-"
+        after_text = f"{after:.3f}" if after is not None else "-"
+        change_text = f"{change:+.1%}" if change is not None else "-"
+        print(f"{name:<48} {before_text:>12} {after_text:>12} {change_text:>9}  {status}")
+    # 基线中有、本次缺失的项（出错或被删除）同样视为失败
+    failures = [row for row in rows if row[4] in ("regression", "missing")]
+    missing_count = sum(1 for row in failures if row[4] == "missing")
+    print(f"{len(failures) - missing_count} regression(s) beyond {threshold:.0%}, {missing_count} missing "
+          f"({baseline['environment'].get('git_commit')} -> {current['environment'].get('git_commit')})")
+    return failures
+
+def load_results(path):
+    results = json.loads(Path(path).read_text(encoding="utf-8"))
+    if results.get("version") != RESULTS_VERSION:
+        raise SystemExit(f"{path}: unsupported results version {results.get('version')}")
+    return results
+
+def parse_int_list(value):
+    try:
+        numbers = [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got '{value}'")
+    if not numbers or min(numbers) < 1:
+        raise argparse.ArgumentTypeError(f"expected positive integers, got '{value}'")
+    return numbers
+
+def parse_groups(value):
+    groups = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [group for group in groups if group not in BENCHMARK_GROUPS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown benchmark(s) {', '.join(unknown)}; "
+                                         f"expected {', '.join(BENCHMARK_GROUPS)}")
+    return groups
+
+def run_command(args):
+    work_dir = Path(args.work_dir)
+    corpus_dir = Path(args.corpus) if args.corpus else work_dir / f"corpus_{args.profile}_seed{args.seed}"
+    print(f"Preparing corpus in {corpus_dir} ...")
+    manifest = pdf_corpus.ensure_corpus(corpus_dir, args.seed, args.profile)
+    if args.large_discovery:
+        args.discovery_entries = LARGE_DISCOVERY_ENTRIES
+    run = BenchmarkRun(corpus_dir, work_dir, manifest, args.dpis, args.workers, args.repeat, args.discovery_entries,
+                       args.benchmarks)
+    benchmarks = run.run()
+    results = {
+        "version": RESULTS_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "config": {"corpus": {"seed": manifest["seed"], "profile": manifest["profile"]}, "dpis": args.dpis,
+                   "workers": args.workers, "repeat": args.repeat, "discovery_entries": args.discovery_entries},
+        "benchmarks": benchmarks,
+        "errors": run.errors,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Results saved to {args.output}")
+    exit_code = 1 if run.errors else 0
+    if args.baseline:
+        if print_comparison(load_results(args.baseline), results, args.threshold):
+            exit_code = 1
+    return exit_code
+
+def compare_command(args):
+    return 1 if print_comparison(load_results(args.baseline), load_results(args.current), args.threshold) else 0
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF conversion engine and compare against baselines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--corpus", default="", help="Corpus directory from pdf_corpus.py "
+                                                         "(generated under --work_dir when omitted)")
+    run_parser.add_argument("--profile", choices=tuple(pdf_corpus.PROFILES), default=pdf_corpus.DEFAULT_PROFILE,
+                            help="Corpus size profile")
+    run_parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    run_parser.add_argument("--work_dir", default="benchmark_work",
+                            help="Directory for the corpus, the discovery tree and temporary outputs")
+    run_parser.add_argument("--benchmarks", type=parse_groups, default=list(BENCHMARK_GROUPS),
+                            help=f"Comma-separated benchmarks to run (default: all of {', '.join(BENCHMARK_GROUPS)})")
+    run_parser.add_argument("--dpis", type=parse_int_list, default=parse_int_list(DEFAULT_DPIS),
+                            help="DPIs for render and end-to-end benchmarks")
+    run_parser.add_argument("--workers", type=parse_int_list, default=parse_int_list(DEFAULT_WORKERS),
+                            help="Worker counts for run_conversion_batch")
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Samples per benchmark (median is kept)")
+    run_parser.add_argument("--discovery_entries", type=int, default=DEFAULT_DISCOVERY_ENTRIES,
+                            help="Entries in the generated directory tree for discovery benchmarks")
+    run_parser.add_argument("--large_discovery", action="store_true",
+                            help=f"Use a {LARGE_DISCOVERY_ENTRIES:,}-file directory tree for discovery benchmarks "
+                                 "(overrides --discovery_entries; needs several minutes and disk space to build)")
+    run_parser.add_argument("--output", default="", help="Write results to this JSON file (a baseline)")
+    run_parser.add_argument("--baseline", default="", help="Compare against this results JSON after running")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                            help="Relative change counted as a regression (0.10 = 10%%)")
+    run_parser.add_argument("--verbose_level", default="WARNING",
+                            help="Log level of the conversion engine during benchmarks")
+    run_parser.set_defaults(handler=run_command)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two results files and flag regressions")
+    compare_parser.add_argument("baseline", help="Baseline results JSON")
+    compare_parser.add_argument("current", help="Current results JSON")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="Relative change counted as a regression (0.10 = 10%%)")
+    compare_parser.set_defaults(handler=compare_command)
+    return parser
+
+if __name__ == "__main__":
+    args = build_argument_parser().parse_args()
+    if args.command == "run":
+        if args.repeat < 1:
+            raise SystemExit("--repeat must be at least 1")
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%H:%M:%S'))
+        logger.addHandler(handler)
+        logger.setLevel(args.verbose_level.upper())
+        pdf_converter.find_and_set_bundled_poppler_path()
+    sys.exit(args.handler(args))
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import os
 import json
@@ -6,127 +6,341 @@ from pathlib import Path
 import logging
 import threading
 import sys
+import uuid
+import shutil
+import time
+import queue
+import collections
+from urllib.parse import quote
 
 # Import the pdf_converter module
 # Assuming pdf_converter.py is in the same directory or accessible via PYTHONPATH
 import pdf_converter
+from job_store import JobStore
+from render_service import PageRenderService, RenderRequestError
+from archive_service import (ArchiveRequestError, PageArchiveStream, new_upload_path, receive_multipart_upload,
+                             save_upload)
 
 app = Flask(__name__)
 CORS(app)
 
-# Global variable for the stop event
-stop_conversion_event = threading.Event()
+# 正在运行的转换和估算任务: job_id -> 该任务的终止信号
+active_jobs = {}
+active_jobs_lock = threading.Lock()
+# 所有转换任务共享的渲染槽位，按优先级和权重在任务之间公平分配
+page_scheduler = pdf_converter.FairShareScheduler()
+# 持久化的任务队列，服务重启后从中恢复被中断的任务
+job_store = JobStore()
+# /render 使用的单页渲染服务，内存中缓存最近渲染的页面
+render_service = PageRenderService(metadata_cache=pdf_converter.PdfMetadataCache())
+# 服务准备退出时置位：不再接受新任务，/readyz 返回 503
+draining_event = threading.Event()
+# 排空超时后置位：被中断的任务保持 running 状态，下次启动时从未完成的页面继续
+checkpoint_event = threading.Event()
+# 排空超时后等待被中断的任务记录进度的时间（秒）
+CHECKPOINT_WAIT_SECONDS = 10.0
+DRAINING_RETRY_AFTER_SECONDS = 5
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# 流式转换中两条进度记录之间的间隔（秒）
+STREAM_PROGRESS_INTERVAL = 2.0
+# 等待客户端读取的流记录数上限，服务端内存不随页数增长；达到上限时不再单独发送 page 记录，
+# 这些页面只计入 progress 记录（页面完成回调在共享的渲染槽位上执行，不能等待客户端）
+STREAM_QUEUE_MAX_RECORDS = 1000
+# 随流发送的最低日志级别，逐页的 INFO 日志不发送
+STREAM_LOG_LEVEL = logging.WARNING
+# 所有任务共用的日志缓存条数上限，超出时只保留最近的日志；非流式响应从中取出本任务的日志
+LOG_CAPTURE_MAX_MESSAGES = 10000
 
 # Custom logging handler to capture messages
 class LogCaptureHandler(logging.Handler):
     def __init__(self):
         super().__init__()
-        self.log_messages = []
+        self.log_messages = collections.deque(maxlen=LOG_CAPTURE_MAX_MESSAGES) # (任务ID, 日志条目)
         self.formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%H:%M:%S')
+        self.subscribers = set() # 流式转换注册的回调，逐条接收日志
 
     def emit(self, record):
-        self.log_messages.append({
+        entry = {
             'level': record.levelname,
             'message': self.format(record)
-        })
-
-    def get_logs(self):
-        return self.log_messages
+        }
+        # emit 在写日志的线程中执行，并发任务按 pdf_converter.current_job_id() 区分
+        self.log_messages.append((pdf_converter.current_job_id(), entry))
+        for subscriber in list(self.subscribers):
+            subscriber(record, entry)
 
-    def clear_logs(self):
-        self.log_messages = []
+    def get_logs(self, job_id):
+        """任务 job_id 的日志；其他并发任务的日志不包括在内。"""
+        self.acquire() # 与 emit 共用处理器的锁，遍历期间不会有新的日志写入
+        try:
+            return [entry for entry_job_id, entry in self.log_messages if entry_job_id == job_id]
+        finally:
+            self.release()
 
 log_capture_handler = LogCaptureHandler()
 # Add the handler to the pdf_converter's logger
 pdf_converter.logger.addHandler(log_capture_handler)
 pdf_converter.logger.setLevel(logging.DEBUG) # Ensure all levels are captured
 
+def settings_from_request(data):
+    """将请求JSON转换为转换设置，未提供的项使用 DEFAULT_CONFIG 中的默认值。"""
+    settings = dict(pdf_converter.DEFAULT_CONFIG)
+    settings.update({key: value for key, value in (data or {}).items() if key in settings and value is not None})
+    # Convert comma-separated strings to lists
+    for key in ('include_keywords', 'exclude_keywords'):
+        if isinstance(settings[key], str):
+            settings[key] = [k.strip() for k in settings[key].split(',') if k.strip()]
+    return settings
+
+def settings_from_form(fields):
+    """将查询参数或表单字段（均为字符串）按 DEFAULT_CONFIG 中默认值的类型转换后生成转换设置。"""
+    data = {}
+    for key, value in fields.items():
+        default = pdf_converter.DEFAULT_CONFIG.get(key)
+        if key not in pdf_converter.DEFAULT_CONFIG or not isinstance(value, str):
+            continue
+        if isinstance(default, bool):
+            data[key] = value.strip().lower() in ('1', 'true', 'yes', 'on')
+        elif isinstance(default, (int, float)):
+            data[key] = type(default)(value)
+        else:
+            data[key] = value
+    return settings_from_request(data)
+
+def default_output_dir(settings, input_path_obj):
+    if settings['output_dir']:
+        return Path(settings['output_dir'])
+    return input_path_obj.parent / (f"{input_path_obj.name}_PNGs" if input_path_obj.is_dir() else f"{input_path_obj.stem}_PNGs")
+
+def execute_job(job_id, settings, page_plan, output_dir_base, input_root_dir, stop_event, manifest,
+                on_page_done=None):
+    """在共享调度器上执行已写入任务队列的页面，逐页记录完成状态，并转发给 on_page_done。
+
+    返回 (生成的图片路径, 至少成功处理一页的PDF数, 任务清单路径)。
+    """
+    def record_page_done(pdf_path, page_num, output_path):
+        job_store.mark_page_done(job_id, pdf_path, page_num)
+        if on_page_done is not None:
+            on_page_done(pdf_path, page_num, output_path)
+
+    try:
+        all_generated_image_paths, pdfs_processed_count = pdf_converter.run_conversion_batch(
+            list(page_plan), output_dir_base, settings, input_root_dir,
+            stop_event=stop_event, manifest=manifest, page_plan=page_plan,
+            scheduler=page_scheduler, job_id=job_id, on_page_done=record_page_done
+        )
+    except Exception:
+        job_store.finish_job(job_id, 'failed')
+        raise
+    manifest_path = pdf_converter.write_job_manifest(manifest, output_dir_base)
+    if stop_event.is_set() and checkpoint_event.is_set():
+        # 因服务退出而中断，任务保持 running，重启后继续
+        job_store.flush()
+        pdf_converter.logger.info(f"任务 {job_id} 因服务退出而中断，进度已保存，重启后继续。")
+    else:
+        job_store.finish_job(job_id, 'stopped' if stop_event.is_set() else 'completed', manifest_path)
+    return all_generated_image_paths, pdfs_processed_count, manifest_path
+
+def resume_interrupted_jobs():
+    """认领并在后台继续执行被中断的任务（所属进程已退出），已完成的页面不再重复渲染。
+
+    其他 worker 进程正在执行的任务不受影响，因此每个 worker 进程启动时都可以调用。
+    """
+    for job in job_store.claim_interrupted_jobs():
+        threading.Thread(target=run_resumed_job, args=(job,), name=f"resume-{job['id']}", daemon=True).start()
+
+def run_resumed_job(job):
+    job_id = job['id']
+    stop_event = threading.Event()
+    with active_jobs_lock:
+        active_jobs[job_id] = stop_event
+    try:
+        settings = dict(pdf_converter.DEFAULT_CONFIG)
+        settings.update(job['settings'])
+        pages = job_store.pending_pages(job_id)
+        pdf_converter.logger.info(f"恢复被中断的任务 {job_id}: 剩余 {len(pages)} 页。")
+        output_dir_base = Path(job['output_dir'])
+        output_dir_base.mkdir(parents=True, exist_ok=True)
+        manifest = pdf_converter.new_job_manifest(settings)
+        manifest['resumed'] = True
+        page_plan = pdf_converter.page_plan_from_records(pages)
+        all_generated_image_paths, pdfs_processed_count, _ = execute_job(
+            job_id, settings, page_plan, output_dir_base, Path(job['input_root']) if job['input_root'] else None,
+            stop_event, manifest)
+        pdf_converter.log_conversion_summary(len(page_plan), pdfs_processed_count, len(all_generated_image_paths),
+                                             output_dir_base, False, manifest)
+    except Exception as e:
+        pdf_converter.logger.critical(f"恢复任务 {job_id} 时发生严重错误: {e}", exc_info=True)
+    finally:
+        with active_jobs_lock:
+            active_jobs.pop(job_id, None)
+
+def draining_response():
+    return (jsonify({'error': 'server is shutting down', 'status': 'error'}), 503,
+            {'Retry-After': str(DRAINING_RETRY_AFTER_SECONDS)})
+
+def drain_jobs(timeout):
+    """停止接受新任务并等待正在执行的任务结束，用于服务平稳退出。
+
+    超过 timeout 秒仍未结束的任务被中断：已完成的页面记录在任务队列中，任务保持 running 状态，
+    服务重启后从未完成的页面继续。所有任务均正常结束时返回 True。
+    """
+    draining_event.set()
+    pdf_converter.logger.info(f"服务准备退出，不再接受新任务，最多等待 {timeout} 秒让正在执行的任务完成。")
+    if not wait_for_active_jobs(timeout):
+        checkpoint_event.set()
+        with active_jobs_lock:
+            pdf_converter.logger.warning(f"仍有 {len(active_jobs)} 个任务未完成，中断并保存进度: {', '.join(active_jobs)}")
+            for job_stop_event in active_jobs.values():
+                job_stop_event.set()
+        wait_for_active_jobs(CHECKPOINT_WAIT_SECONDS)
+    job_store.flush()
+    return not checkpoint_event.is_set()
+
+def wait_for_active_jobs(timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        with active_jobs_lock:
+            if not active_jobs:
+                return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(pdf_converter.RENDER_POLL_INTERVAL)
+
+@app.route('/healthz', methods=['GET'])
+def health():
+    """存活检查：进程能处理请求即返回 200。"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readiness():
+    """就绪检查：服务未在退出且能找到渲染器时返回 200，否则返回 503。"""
+    renderer = pdf_converter.pdftoppm_executable()
+    renderer_found = bool(shutil.which(renderer) or os.path.isfile(renderer))
+    with active_jobs_lock:
+        active_job_count = len(active_jobs)
+    ready = renderer_found and not draining_event.is_set()
+    return jsonify({'status': 'ready' if ready else 'not_ready', 'draining': draining_event.is_set(),
+                    'renderer_found': renderer_found, 'active_jobs': active_job_count}), 200 if ready else 503
+
 @app.route('/convert', methods=['POST'])
 def convert_pdf():
-    log_capture_handler.clear_logs() # Clear logs from previous runs
-    stop_conversion_event.clear() # Clear stop signal for new conversion
+    """执行转换任务。请求中 stream 为 true（或 Accept 为 application/x-ndjson）时以NDJSON流返回结果，
+    见 stream_conversion；否则任务结束后一次性返回JSON。"""
+    if draining_event.is_set():
+        return draining_response()
+    data = request.get_json() or {}
+    job_id = str(data.get('job_id') or uuid.uuid4().hex)
+    stream = data.get('stream') or request.accept_mimetypes.best == NDJSON_MIMETYPE
+    job_stop_event = threading.Event() # Stop signal for this conversion only
+    with active_jobs_lock:
+        if job_id in active_jobs:
+            return jsonify({'error': f'job {job_id} is already running', 'status': 'error'}), 409
+        if not stream:
+            active_jobs[job_id] = job_stop_event
 
+    if stream:
+        # 任务在生成器开始迭代时才登记，客户端未读取响应时不会遗留在 active_jobs 中
+        return Response(stream_conversion(data, job_id, job_stop_event), mimetype=NDJSON_MIMETYPE,
+                        headers={'X-Job-Id': job_id})
     try:
-        data = request.get_json()
-        input_path_str = data.get('input_path')
-        output_dir_str = data.get('output_dir')
-        pages = data.get('pages', 'first')
-        dpi = data.get('dpi', 300)
-        prefix = data.get('prefix', '')
-        output_filename_template = data.get('output_filename_template', "{pdf_name}_page_{page_num}.png")
-        post_export_action = data.get('post_export_action', 'open_file')
-        recursive = data.get('recursive', False)
-        preserve_structure = data.get('preserve_structure', False)
-        include_keywords = data.get('include_keywords', '')
-        exclude_keywords = data.get('exclude_keywords', '')
-        regex_filter = data.get('regex_filter', '')
-        grayscale = data.get('grayscale', False)
-        rotate = data.get('rotate', 0)
-        dry_run = data.get('dry_run', False) # Assuming dry_run can be passed from frontend
-        overwrite = data.get('overwrite', False) # Assuming overwrite can be passed from frontend
-
-        # Convert comma-separated strings to lists
-        include_keywords_list = [k.strip() for k in include_keywords.split(',') if k.strip()]
-        exclude_keywords_list = [k.strip() for k in exclude_keywords.split(',') if k.strip()]
-
-        input_path_obj = Path(input_path_str)
-        if not input_path_obj.exists():
-            pdf_converter.logger.error(f"错误: 输入路径 '{input_path_obj}' 不存在。")
-            return jsonify({'logs': log_capture_handler.get_logs(), 'status': 'error'}), 400
+        with pdf_converter.running_job(job_id):
+            result, status_code = run_conversion_request(data, job_id, job_stop_event)
+    finally:
+        with active_jobs_lock:
+            active_jobs.pop(job_id, None)
+    result['logs'] = log_capture_handler.get_logs(job_id)
+    return jsonify(result), status_code
+
+def run_conversion_request(data, job_id, job_stop_event, on_page_done=None):
+    """按 /convert 的请求内容执行转换，返回 (结果, HTTP状态码)。
 
-        output_dir_base = Path(output_dir_str) if output_dir_str else \
-                          input_path_obj.parent / (f"{input_path_obj.name}_PNGs" if input_path_obj.is_dir() else f"{input_path_obj.stem}_PNGs")
+    on_page_done(pdf_path, page_num, output_path) 在每页处理完毕后调用（空运行时不调用）。
+    """
+    try:
+        settings = settings_from_request(data)
+        dry_run = settings['dry_run']
+        post_export_action = settings['post_export_action']
+        page_plan = None
+        try:
+            pdf_converter.parse_shard(settings['shard'])
+        except ValueError as e:
+            pdf_converter.logger.error(str(e))
+            return {'status': 'error'}, 400
+
+        if settings['plan']:
+            plan_header, page_plan = pdf_converter.load_conversion_plan(settings['plan'])
+            if plan_header is None:
+                return {'status': 'error'}, 400
+            settings = pdf_converter.settings_for_plan(plan_header, settings)
+            dry_run = False
+            output_dir_base = Path(plan_header['output_dir'])
+        else:
+            input_path_obj = Path(settings['input_path'])
+            if not input_path_obj.exists():
+                pdf_converter.logger.error(f"错误: 输入路径 '{input_path_obj}' 不存在。")
+                return {'status': 'error'}, 400
+
+            output_dir_base = default_output_dir(settings, input_path_obj)
+        settings['priority'] = pdf_converter.resolve_job_priority(settings, None if page_plan is not None else input_path_obj)
+        pdf_converter.logger.info(f"任务 {job_id} 的优先级: {settings['priority']}")
 
         if not dry_run:
             try:
                 output_dir_base.mkdir(parents=True, exist_ok=True)
             except OSError as e:
                 pdf_converter.logger.error(f"无法创建或访问输出根目录 '{output_dir_base.resolve()}': {e}")
-                return jsonify({'logs': log_capture_handler.get_logs(), 'status': 'error'}), 500
+                return {'status': 'error'}, 500
         pdf_converter.logger.info(f"PNG图片将输出到根目录: {output_dir_base.resolve()}")
 
-        pdf_files_to_process = pdf_converter.discover_pdf_files(
-            input_path_obj, recursive,
-            include_keywords_list, exclude_keywords_list,
-            regex_filter
-        )
-
-        if not pdf_files_to_process:
-            pdf_converter.logger.warning("未找到符合条件的PDF文件进行处理。")
-            return jsonify({'logs': log_capture_handler.get_logs(), 'status': 'warning'}), 200
+        if page_plan is not None:
+            # 执行计划时跳过查找和筛选，直接转换计划中的页面
+            pdf_files_to_process = list(page_plan)
+            input_root_for_structure = Path(plan_header['input_root']) if plan_header.get('input_root') else None
+            pdf_converter.logger.info(f"执行计划 '{settings['plan']}': {len(pdf_files_to_process)} 个PDF。")
+        else:
+            pdf_files_to_process = pdf_converter.discover_pdf_files(
+                input_path_obj, settings['recursive'],
+                settings['include_keywords'], settings['exclude_keywords'],
+                settings['regex_filter']
+            )
 
-        pdf_converter.logger.info(f"共找到 {len(pdf_files_to_process)} 个符合条件的PDF文件准备处理。")
-        all_generated_image_paths = [] # List to collect all generated image paths
-        pdfs_processed_count = 0
-        input_root_for_structure = input_path_obj if input_path_obj.is_dir() else input_path_obj.parent
+            if not pdf_files_to_process:
+                pdf_converter.logger.warning("未找到符合条件的PDF文件进行处理。")
+                return {'status': 'warning'}, 200
 
-        for pdf_path in pdf_files_to_process:
-            if stop_conversion_event.is_set():
-                pdf_converter.logger.info("转换任务被用户终止。")
-                break
+            pdf_converter.logger.info(f"共找到 {len(pdf_files_to_process)} 个符合条件的PDF文件准备处理。")
+            input_root_for_structure = input_path_obj if input_path_obj.is_dir() else input_path_obj.parent
 
-            pdf_converter.logger.info(f"开始处理PDF: '{pdf_path.resolve()}'")
-            # convert_single_pdf now returns a list of generated image paths
-            generated_paths_for_this_pdf = pdf_converter.convert_single_pdf(
-                pdf_path, output_dir_base, pages, dpi,
-                overwrite, prefix, output_filename_template,
-                grayscale, rotate, dry_run,
-                preserve_structure, input_root_for_structure,
-                stop_event=stop_conversion_event
+        manifest = pdf_converter.new_job_manifest(settings)
+        if dry_run:
+            all_generated_image_paths, pdfs_processed_count = pdf_converter.run_conversion_batch(
+                pdf_files_to_process, output_dir_base, settings, input_root_for_structure,
+                stop_event=job_stop_event, manifest=manifest
             )
+            manifest_path = None
+        else:
+            # 先生成完整的执行计划并写入任务队列，服务重启后可按原输出路径继续未完成的页面
+            if page_plan is None:
+                planned_pages = pdf_converter.build_conversion_plan(
+                    pdf_files_to_process, output_dir_base, settings, input_root_for_structure,
+                    stop_event=job_stop_event, manifest=manifest)["pages"]
+            else:
+                shard = pdf_converter.parse_shard(settings['shard'])
+                planned_pages = [{'pdf': pdf_path.resolve().as_posix(), 'page': page_num, 'total_pages': total_pages,
+                                  'output': output_png_path.resolve().as_posix()}
+                                 for pdf_path, pages in page_plan.items()
+                                 for page_num, total_pages, output_png_path in pages
+                                 if pdf_converter.page_in_shard(pdf_path, page_num, shard, input_root_for_structure)]
+            job_store.create_job(job_id, settings, planned_pages, output_dir_base, input_root_for_structure,
+                                 settings['priority'])
+            all_generated_image_paths, pdfs_processed_count, manifest_path = execute_job(
+                job_id, settings, pdf_converter.page_plan_from_records(planned_pages), output_dir_base,
+                input_root_for_structure, job_stop_event, manifest, on_page_done)
 
-            if generated_paths_for_this_pdf:
-                all_generated_image_paths.extend(generated_paths_for_this_pdf)
-                pdfs_processed_count += 1
-            pdf_converter.logger.info(f"PDF '{pdf_path.name}' 处理完成，{'计划' if dry_run else '实际'}生成 {len(generated_paths_for_this_pdf)} 张图片。")
-
-        summary_action = "计划生成" if dry_run else "实际创建/覆盖"
-        pdf_converter.logger.info(f"\n--- {'空运行 ' if dry_run else ''}转换总结 ---")
-        pdf_converter.logger.info(f"扫描的PDF文件总数 (通过筛选后): {len(pdf_files_to_process)}")
-        pdf_converter.logger.info(f"至少成功处理一页的PDF文件数: {pdfs_processed_count}")
-        pdf_converter.logger.info(f"PNG图片{summary_action}总数: {len(all_generated_image_paths)}")
-        if all_generated_image_paths or (dry_run and pdfs_processed_count > 0):
-            pdf_converter.logger.info(f"所有输出已保存/计划保存在根目录: {output_dir_base.resolve()}")
+        pdf_converter.log_conversion_summary(len(pdf_files_to_process), pdfs_processed_count,
+                                             len(all_generated_image_paths), output_dir_base, dry_run, manifest)
 
         # Determine the output_path based on post_export_action
         final_output_path = None
@@ -151,24 +365,325 @@ def convert_pdf():
             final_output_path = output_dir_base.resolve().as_posix() if all_generated_image_paths else None
             pdf_converter.logger.info(f"选择了'不执行任何操作'或默认，将返回输出目录（如果存在图片）: {final_output_path}")
 
-        if stop_conversion_event.is_set():
+        if job_stop_event.is_set():
             pdf_converter.logger.info("转换流程已终止。")
-            return jsonify({'logs': log_capture_handler.get_logs(), 'status': 'stopped', 'output_path': final_output_path}), 200
+            # 因服务退出而中断的任务在重启后继续
+            return {'status': 'interrupted' if checkpoint_event.is_set() else 'stopped', 'job_id': job_id, 'output_path': final_output_path, 'manifest_path': manifest_path, 'metrics': manifest.get('metrics')}, 200
         else:
             pdf_converter.logger.info("转换流程结束。")
-            return jsonify({'logs': log_capture_handler.get_logs(), 'status': 'completed', 'output_path': final_output_path}), 200
+            return {'status': 'completed', 'job_id': job_id, 'output_path': final_output_path, 'manifest_path': manifest_path, 'metrics': manifest.get('metrics')}, 200
 
     except Exception as e:
         pdf_converter.logger.critical(f"转换过程中发生严重错误: {e}", exc_info=True)
-        return jsonify({'logs': log_capture_handler.get_logs(), 'status': 'critical_error'}), 500
+        return {'status': 'critical_error', 'job_id': job_id}, 500
+
+def stream_conversion(data, job_id, job_stop_event):
+    """在后台执行转换，以NDJSON逐行返回: 每处理完一页一条 page 记录，每隔 STREAM_PROGRESS_INTERVAL 秒
+    一条 progress 记录，本任务 WARNING 及以上的日志为 log 记录，最后一条为 summary 记录（内容同非流式响应，不含日志）。
+
+    客户端读取慢、待发送的记录达到 STREAM_QUEUE_MAX_RECORDS 时，之后完成的页面不再发送 page 记录，
+    只计入 progress 和 summary 记录的 done_pages 与 omitted_page_records，渲染不因此放慢。
+
+    任务在生成器开始迭代时登记到 active_jobs，此时已有同名任务则只返回一条 http_status 为 409 的 summary 记录。
+    客户端断开后任务继续执行，可通过 /jobs/<job_id> 查询进度。
+    """
+    records = queue.Queue(maxsize=STREAM_QUEUE_MAX_RECORDS)
+    client_gone = threading.Event()
+    counts = collections.Counter()
+    counts_lock = threading.Lock()
+    started_at = time.monotonic()
+
+    def put_record(record):
+        while not client_gone.is_set():
+            try:
+                records.put(record, timeout=pdf_converter.RENDER_POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    def on_page_done(pdf_path, page_num, output_path):
+        # 在调度器的渲染槽位上执行，等待客户端会占住槽位、挤占其他任务的份额，因此不能阻塞
+        with counts_lock:
+            counts['converted' if output_path else 'not_converted'] += 1
+        if client_gone.is_set():
+            return
+        try:
+            records.put_nowait({'type': 'page', 'job_id': job_id, 'pdf': Path(pdf_path).resolve().as_posix(),
+                                'page': page_num, 'output': output_path})
+        except queue.Full:
+            with counts_lock:
+                counts['omitted_page_records'] += 1
+
+    def on_log(record, entry):
+        # 回调在写日志的线程中执行：只转发本任务的日志，且不能阻塞；队列已满时丢弃
+        if (record.levelno >= STREAM_LOG_LEVEL and not client_gone.is_set()
+                and pdf_converter.current_job_id() == job_id):
+            try:
+                records.put_nowait(dict(entry, type='log'))
+            except queue.Full:
+                pass
+
+    def run():
+        pdf_converter.job_context.job_id = job_id
+        try:
+            result, status_code = run_conversion_request(data, job_id, job_stop_event, on_page_done)
+        except BaseException as e:
+            result, status_code = {'status': 'critical_error', 'job_id': job_id, 'error': str(e)}, 500
+        finally:
+            log_capture_handler.subscribers.discard(on_log)
+            with active_jobs_lock:
+                active_jobs.pop(job_id, None)
+        result.update(type='summary', http_status=status_code, job_id=job_id,
+                      converted_pages=counts['converted'], not_converted_pages=counts['not_converted'],
+                      omitted_page_records=counts['omitted_page_records'],
+                      elapsed_seconds=round(time.monotonic() - started_at, 3))
+        put_record(result)
+        put_record(None)
+
+    def progress_record():
+        elapsed = time.monotonic() - started_at
+        done_pages = counts['converted'] + counts['not_converted']
+        job_status = job_store.job_status(job_id) or {}
+        return {'type': 'progress', 'job_id': job_id, 'done_pages': done_pages,
+                'total_pages': job_status.get('total_pages'), 'omitted_page_records': counts['omitted_page_records'],
+                'elapsed_seconds': round(elapsed, 3),
+                'pages_per_second': round(done_pages / elapsed, 3) if elapsed > 0 else None}
+
+    with active_jobs_lock:
+        duplicate = job_id in active_jobs
+        if not duplicate:
+            active_jobs[job_id] = job_stop_event
+    if duplicate:
+        yield json.dumps({'type': 'summary', 'status': 'error', 'job_id': job_id, 'http_status': 409,
+                          'error': f'job {job_id} is already running'}, ensure_ascii=False) + '\n'
+        return
+    started = False
+    try:
+        log_capture_handler.subscribers.add(on_log)
+        # 线程启动后由其负责移出 active_jobs，客户端断开时任务继续执行
+        threading.Thread(target=run, name=f"convert-{job_id}", daemon=True).start()
+        started = True
+        next_progress_at = started_at + STREAM_PROGRESS_INTERVAL
+        while True:
+            timeout = next_progress_at - time.monotonic()
+            if timeout <= 0:
+                yield json.dumps(progress_record(), ensure_ascii=False) + '\n'
+                next_progress_at = time.monotonic() + STREAM_PROGRESS_INTERVAL
+                continue
+            try:
+                record = records.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if record is None:
+                break
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+    finally:
+        client_gone.set()
+        log_capture_handler.subscribers.discard(on_log)
+        if not started:
+            with active_jobs_lock:
+                active_jobs.pop(job_id, None)
+
+@app.route('/convert/upload', methods=['POST'])
+def convert_upload():
+    """上传PDF（multipart 的 file 字段或原始请求体），渲染结果以ZIP或tar归档流边生成边返回。
+
+    转换设置取自查询参数和表单字段，archive 参数选择归档格式（zip 或 tar）。
+    """
+    if draining_event.is_set():
+        return draining_response()
+    job_id = request.args.get('job_id') or uuid.uuid4().hex
+    with active_jobs_lock:
+        # 接收上传之前先拒绝重复的任务；任务在响应开始迭代时才登记（见 generate）
+        if job_id in active_jobs:
+            return jsonify({'error': f'job {job_id} is already running', 'status': 'error'}), 409
+    upload_path = None
+    try:
+        if request.mimetype == 'multipart/form-data':
+            upload_path, upload_name, fields = receive_multipart_upload(request.environ)
+        else:
+            upload_name = request.args.get('filename')
+            upload_path = new_upload_path()
+            save_upload(request.stream, upload_path, content_length=request.content_length)
+            fields = {}
+        fields.update(request.args.items())
+        try:
+            settings = settings_from_form(fields)
+        except ValueError as e:
+            raise ArchiveRequestError(f"无效的转换设置: {e}")
+        settings['priority'] = settings['priority'] if settings['priority'] in pdf_converter.JOB_PRIORITIES else 'interactive'
+        job_stop_event = threading.Event()
+        archive_stream = PageArchiveStream(upload_path, upload_name, settings, fields.get('archive', 'zip'),
+                                           stop_event=job_stop_event, scheduler=page_scheduler, job_id=job_id)
+    except ArchiveRequestError as e:
+        if upload_path is not None:
+            upload_path.unlink(missing_ok=True)
+        return jsonify({'error': str(e), 'status': 'error'}), e.status
+    except BaseException:
+        if upload_path is not None:
+            upload_path.unlink(missing_ok=True)
+        raise
+
+    def generate():
+        with active_jobs_lock:
+            duplicate = job_id in active_jobs
+            if not duplicate:
+                active_jobs[job_id] = job_stop_event
+        if duplicate:
+            pdf_converter.logger.error(f"任务 {job_id} 已在执行，未转换上传的PDF '{archive_stream.upload_name}'。")
+            return
+        try:
+            yield from archive_stream
+        finally:
+            with active_jobs_lock:
+                active_jobs.pop(job_id, None)
+
+    pdf_converter.logger.info(f"任务 {job_id}: 转换上传的PDF '{archive_stream.upload_name}' "
+                              f"({len(archive_stream.pages)} 页) 并以 {archive_stream.archive_format} 流返回。")
+    response = Response(generate(), mimetype=archive_stream.mimetype, headers={
+        'Content-Disposition': f"attachment; filename*=UTF-8''{quote(archive_stream.download_name)}",
+        'X-Job-Id': job_id,
+    })
+    # 客户端在响应开始前断开时生成器不会执行，上传的临时文件在响应关闭时删除
+    response.call_on_close(lambda: upload_path.unlink(missing_ok=True))
+    return response
+
+@app.route('/estimate', methods=['POST'])
+def estimate_conversion():
+    """抽样估算转换任务。与转换任务一样登记在 active_jobs 中，可通过 /stop 按 job_id 单独终止。"""
+    if draining_event.is_set():
+        return draining_response()
+    data = request.get_json() or {}
+    job_id = str(data.get('job_id') or uuid.uuid4().hex)
+    job_stop_event = threading.Event() # Stop signal for this estimate only
+    with active_jobs_lock:
+        if job_id in active_jobs:
+            return jsonify({'error': f'job {job_id} is already running', 'status': 'error'}), 409
+        active_jobs[job_id] = job_stop_event
+    try:
+        with pdf_converter.running_job(job_id):
+            result, status_code = run_estimate_request(data, job_id, job_stop_event)
+    finally:
+        with active_jobs_lock:
+            active_jobs.pop(job_id, None)
+    result['logs'] = log_capture_handler.get_logs(job_id)
+    return jsonify(result), status_code
+
+def run_estimate_request(data, job_id, job_stop_event):
+    """按 /estimate 的请求内容执行估算，返回 (结果, HTTP状态码)。"""
+    try:
+        settings = settings_from_request(data)
+        try:
+            pdf_converter.parse_shard(settings['shard'])
+        except ValueError as e:
+            pdf_converter.logger.error(str(e))
+            return {'status': 'error', 'job_id': job_id}, 400
+        input_path_obj = Path(settings['input_path'])
+        if not input_path_obj.exists():
+            pdf_converter.logger.error(f"错误: 输入路径 '{input_path_obj}' 不存在。")
+            return {'status': 'error', 'job_id': job_id}, 400
+
+        pdf_files_to_process = pdf_converter.discover_pdf_files(
+            input_path_obj, settings['recursive'],
+            settings['include_keywords'], settings['exclude_keywords'],
+            settings['regex_filter']
+        )
+        if not pdf_files_to_process:
+            pdf_converter.logger.warning("未找到符合条件的PDF文件进行处理。")
+            return {'status': 'warning', 'job_id': job_id}, 200
+
+        input_root_for_structure = input_path_obj if input_path_obj.is_dir() else input_path_obj.parent
+        estimate = pdf_converter.estimate_conversion(pdf_files_to_process, settings, input_root_for_structure,
+                                                     stop_event=job_stop_event)
+        if estimate is None:
+            return {'status': 'stopped' if job_stop_event.is_set() else 'warning', 'job_id': job_id}, 200
+        pdf_converter.log_estimate_summary(estimate)
+        return {'status': 'completed', 'job_id': job_id, 'estimate': estimate}, 200
+
+    except Exception as e:
+        pdf_converter.logger.critical(f"估算过程中发生严重错误: {e}", exc_info=True)
+        return {'status': 'critical_error', 'job_id': job_id}, 500
 
 @app.route('/stop', methods=['POST'])
 def stop_conversion():
-    stop_conversion_event.set()
+    # 指定 job_id 时只终止该任务，否则终止所有任务
+    job_id = (request.get_json(silent=True) or {}).get('job_id')
+    with active_jobs_lock:
+        if job_id:
+            if job_id not in active_jobs:
+                return jsonify({'error': f'job {job_id} is not running'}), 404
+            active_jobs[job_id].set()
+        else:
+            for job_stop_event in active_jobs.values():
+                job_stop_event.set()
     pdf_converter.logger.info("终止转换请求已发送。")
     return jsonify({'message': 'Conversion stop signal sent.'}), 200
 
+def job_snapshot():
+    """正在运行的任务及其调度排位；尚在查找/读取PDF、还没有页面排队的任务 position 为 None。"""
+    snapshot = page_scheduler.snapshot()
+    scheduled = {job['job_id'] for job in snapshot['jobs']}
+    with active_jobs_lock:
+        snapshot['jobs'] += [{'job_id': job_id, 'position': None} for job_id in active_jobs if job_id not in scheduled]
+    return snapshot
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify(job_snapshot()), 200
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """任务的调度排位（仅运行中的任务）及任务队列中记录的状态和进度。"""
+    job_status = job_store.job_status(job_id) or {}
+    for job in job_snapshot()['jobs']:
+        if job['job_id'] == job_id:
+            job.update(job_status)
+            return jsonify(job), 200
+    if job_status:
+        return jsonify(job_status), 200
+    return jsonify({'error': f'job {job_id} is not running'}), 404
+
+@app.route('/render', methods=['GET'])
+def render_page_image():
+    """渲染单页并直接返回图片，支持 ETag/If-None-Match；带上与内容一致的 hash 参数时可长期缓存。"""
+    try:
+        page_request = render_service.prepare(request.args.get('path'), request.args.get('page', '1'),
+                                              request.args.get('dpi'), request.args.get('width'),
+                                              request.args.get('format', 'png'))
+    except RenderRequestError as e:
+        return jsonify({'error': str(e)}), e.status
+    headers = {
+        'ETag': f'"{page_request["cache_key"]}"',
+        'Cache-Control': render_service.cache_control(page_request, request.args.get('hash')),
+        'X-Content-Hash': page_request['content_hash'],
+    }
+    if request.if_none_match.contains_weak(page_request['cache_key']):
+        return Response(status=304, headers=headers)
+    try:
+        body, mimetype, cache_status = render_service.get_encoded_page(page_request)
+    except RenderRequestError as e:
+        return jsonify({'error': str(e)}), e.status
+    headers['X-Render-Cache'] = cache_status
+    return Response(body, mimetype=mimetype, headers=headers)
+
+@app.route('/render/stats', methods=['GET'])
+def render_stats():
+    return jsonify(render_service.summary()), 200
+
+@app.route('/quarantine', methods=['GET'])
+def get_quarantine():
+    # 只报告服务默认使用的隔离列表，不读取客户端指定的任意文件
+    store = pdf_converter.QuarantineStore(pdf_converter.DEFAULT_CONFIG['quarantine_file'])
+    quarantined = {content_hash: entry for content_hash, entry in store.entries.items() if entry.get('quarantined')}
+    return jsonify({'quarantine_file': store.path.resolve().as_posix(), 'quarantined': quarantined,
+                    'suspects': {content_hash: entry for content_hash, entry in store.entries.items()
+                                 if content_hash not in quarantined}}), 200
+
 if __name__ == '__main__':
     # Ensure Poppler path is set when running Flask directly for testing
     pdf_converter.find_and_set_bundled_poppler_path()
-    app.run(debug=True, host='0.0.0.0', port=5003)
+    # debug 模式下重载器会在子进程中再次执行这里，只在实际提供服务的子进程中恢复任务
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resume_interrupted_jobs()
+    # 只监听本机；生产环境请使用 server.py
+    app.run(debug=True, host='127.0.0.1', port=5003)
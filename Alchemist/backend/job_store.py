@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import sqlite3
+import platform
+import threading
+from pathlib import Path
+
+DEFAULT_JOB_STORE_FILE = Path.home() / ".alchemist" / "jobs.sqlite3"
+# 页面完成记录先缓存在内存中，累计到该条数或距上次提交超过该时间（秒）时批量提交；
+# 进程意外退出最多丢失这段时间内的记录，恢复时这些页面会重新渲染（输出为原子替换，重复渲染无副作用）
+COMMIT_BATCH_SIZE = 500
+COMMIT_INTERVAL_SECONDS = 1.0
+
+# 任务状态: running 表示正在执行；状态为 running 而所属进程（owner_pid）已退出的任务即被中断的任务
+JOB_STATES = ("running", "completed", "stopped", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    priority TEXT,
+    settings TEXT NOT NULL,
+    output_dir TEXT NOT NULL,
+    input_root TEXT,
+    total_pages INTEGER NOT NULL,
+    manifest_path TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    owner_pid INTEGER
+);
+CREATE TABLE IF NOT EXISTS pages (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    pdf TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    total_pages INTEGER NOT NULL,
+    output TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pages_by_pdf_page ON pages (job_id, pdf, page);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state);
+"""
+
+def process_alive(pid):
+    """进程 pid 是否仍在运行。
+
+    Windows 上没有多 worker 进程（os.kill 在其上会结束目标进程），当前进程以外的进程一律视为已退出。
+    """
+    if pid is None:
+        return False
+    if pid == os.getpid():
+        return True
+    if platform.system() == "Windows":
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobStore:
+    """SQLite（WAL模式）中持久化的任务队列：任务设置、每个页面任务及其完成状态。
+
+    服务重启后，状态仍为 running 的任务可以从未完成的页面继续执行，输出路径与中断前相同。
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else DEFAULT_JOB_STORE_FILE
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # WAL模式下 NORMAL 只在检查点时同步，断电最多丢失最近提交的事务
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(jobs)")}
+        if "owner_pid" not in columns:
+            # 旧版本创建的任务队列没有 owner_pid 列，其中的任务视为所属进程已退出
+            try:
+                self.connection.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+            except sqlite3.OperationalError: # 其他 worker 进程已添加
+                pass
+        self.pending_done = [] # 尚未提交的已完成页面: (job_id, pdf, page)
+        self.last_commit = time.monotonic()
+
+    def _now(self):
+        return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def create_job(self, job_id, settings, pages, output_dir, input_root=None, priority=None):
+        """登记新任务及其全部页面任务（pages 为执行计划中的页面记录），在一个事务中写入，所属进程为当前进程。"""
+        now = self._now()
+        with self.lock:
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.execute("DELETE FROM pages WHERE job_id = ?", (job_id,))
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO jobs (id, state, priority, settings, output_dir, input_root, total_pages,"
+                    " created_at, updated_at, owner_pid) VALUES (?, 'running', ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, priority, json.dumps(settings, ensure_ascii=False, default=str),
+                     Path(output_dir).resolve().as_posix(),
+                     Path(input_root).resolve().as_posix() if input_root else None, len(pages), now, now,
+                     os.getpid()))
+                self.connection.executemany(
+                    "INSERT INTO pages (job_id, seq, pdf, page, total_pages, output) VALUES (?, ?, ?, ?, ?, ?)",
+                    ((job_id, seq, page["pdf"], page["page"], page["total_pages"], page["output"])
+                     for seq, page in enumerate(pages)))
+
+    def mark_page_done(self, job_id, pdf_path, page_num):
+        """记录页面已处理完毕；记录按批提交。"""
+        with self.lock:
+            self.pending_done.append((job_id, Path(pdf_path).resolve().as_posix(), page_num))
+            if (len(self.pending_done) >= COMMIT_BATCH_SIZE
+                    or time.monotonic() - self.last_commit >= COMMIT_INTERVAL_SECONDS):
+                self._commit_pending()
+
+    def _commit_pending(self):
+        if self.pending_done:
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.executemany("UPDATE pages SET done = 1 WHERE job_id = ? AND pdf = ? AND page = ?",
+                                            self.pending_done)
+            self.pending_done = []
+        self.last_commit = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self._commit_pending()
+
+    def finish_job(self, job_id, state, manifest_path=None):
+        with self.lock:
+            self._commit_pending()
+            self.connection.execute("UPDATE jobs SET state = ?, manifest_path = ?, updated_at = ? WHERE id = ?",
+                                    (state, manifest_path, self._now(), job_id))
+
+    def interrupted_jobs(self):
+        """状态为 running 而所属进程已退出的任务（服务上次退出或 worker 进程崩溃时被中断）。"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, priority, settings, output_dir, input_root, owner_pid FROM jobs WHERE state = 'running'"
+                " ORDER BY created_at").fetchall()
+        return [self._job_record(row) for row in rows if not process_alive(row[5])]
+
+    def claim_interrupted_jobs(self):
+        """将被中断的任务的所属进程改为当前进程并返回这些任务，供当前进程恢复执行。
+
+        多个 worker 进程共用任务队列：检查和认领在同一个写事务中进行，每个任务只被一个进程认领；
+        所属进程仍在运行的任务（其他 worker 正在执行的任务）不会被认领。
+        """
+        with self.lock:
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                rows = self.connection.execute(
+                    "SELECT id, priority, settings, output_dir, input_root, owner_pid FROM jobs"
+                    " WHERE state = 'running' ORDER BY created_at").fetchall()
+                rows = [row for row in rows if not process_alive(row[5])]
+                self.connection.executemany("UPDATE jobs SET owner_pid = ?, updated_at = ? WHERE id = ?",
+                                            ((os.getpid(), self._now(), row[0]) for row in rows))
+        return [self._job_record(row) for row in rows]
+
+    def _job_record(self, row):
+        return {"id": row[0], "priority": row[1], "settings": json.loads(row[2]), "output_dir": row[3],
+                "input_root": row[4], "owner_pid": row[5]}
+
+    def pending_pages(self, job_id):
+        """任务中尚未完成的页面记录，按原计划顺序。"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT pdf, page, total_pages, output FROM pages WHERE job_id = ? AND done = 0 ORDER BY seq",
+                (job_id,)).fetchall()
+        return [{"pdf": row[0], "page": row[1], "total_pages": row[2], "output": row[3]} for row in rows]
+
+    def job_status(self, job_id):
+        """任务的持久化状态和进度；任务不存在时返回 None。"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT state, priority, total_pages, manifest_path, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)).fetchone()
+            if row is None:
+                return None
+            done_pages = self.connection.execute("SELECT COUNT(*) FROM pages WHERE job_id = ? AND done = 1",
+                                                 (job_id,)).fetchone()[0]
+            done_pages += sum(1 for pending in self.pending_done if pending[0] == job_id)
+        return {"job_id": job_id, "state": row[0], "priority": row[1], "total_pages": row[2],
+                "done_pages": done_pages, "manifest_path": row[3], "created_at": row[4], "updated_at": row[5]}
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.connection.close()
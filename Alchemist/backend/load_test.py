@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""对本地运行的后端进行并发压测，回放混合负载并保存结果供不同版本对比。
+
+负载类型:
+  preview  GET /render 单个PDF第一页的缩略图（按 PREVIEW_WIDTH 宽度渲染）
+  render   GET /render 单个PDF第一页，按 --dpi 渲染
+  batch    POST /convert 小目录（几个PDF）的全部页面
+  archive  POST /convert 大目录（几十个PDF）的全部页面
+每个客户端线程按权重随机选择负载并连续发送请求。结果包括各负载及总体的 p50/p95/p99 延迟、
+吞吐量、错误率，以及按时间采样的服务进程（含子进程）RSS。
+延迟和吞吐量以服务实际使用的 pdftoppm 为准，用替代渲染器（如测试用的桩程序）得到的结果不反映真实渲染性能。
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import signal
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+import urllib.parse
+from pathlib import Path
+
+import pdf_corpus
+
+DEFAULT_URL = "http://127.0.0.1:5003"
+DEFAULT_MIX = "preview=60,render=25,batch=12,archive=3"
+WORKLOADS = ("preview", "render", "batch", "archive")
+PERCENTILES = (50, 95, 99)
+# 单个请求的超时（秒）；archive 负载可能持续较长时间
+REQUEST_TIMEOUT = 600
+RSS_SAMPLE_INTERVAL = 1.0
+# preview 负载请求的缩略图宽度（像素）
+PREVIEW_WIDTH = 320
+SERVER_START_TIMEOUT = 30
+# 2: preview 负载由 POST /convert 改为 GET /render 缩略图，与版本1的结果不可直接对比
+RESULTS_VERSION = 2
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """通过Unix域套接字发送HTTP请求（对应 server.py --unix_socket）。"""
+
+    def __init__(self, socket_path, timeout=REQUEST_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class BackendClient:
+    def __init__(self, url=DEFAULT_URL, unix_socket=None):
+        self.url = urllib.parse.urlsplit(url)
+        self.unix_socket = unix_socket
+
+    def connection(self):
+        if self.unix_socket:
+            return UnixHTTPConnection(self.unix_socket)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=REQUEST_TIMEOUT)
+
+    def request(self, method, path, body=None):
+        """发送请求并读完响应，返回 (状态码, 响应体)。"""
+        connection = self.connection()
+        try:
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+def generate_corpus(corpus_dir, seed=0):
+    """在 corpus_dir 下生成压测用的PDF：preview/ 单页文档，batch/ 几个多页文档，archive/ 大量多页文档。
+
+    PDF由 pdf_corpus 生成，文字、矢量和图像页面混合；由 seed 决定内容，同一 seed 生成的文件相同。
+    """
+    layout = {"preview": (8, 1), "batch": (4, 3), "archive": (30, 8)} # 目录 -> (PDF数, 每个PDF的页数)
+    for subdir, (pdf_count, page_count) in layout.items():
+        target_dir = Path(corpus_dir) / subdir
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for index in range(pdf_count):
+            rng = pdf_corpus.file_rng(seed, subdir, index)
+            kind = rng.choice(("text", "text", "vector", "images"))
+            data = pdf_corpus.build_pdf(rng, kind, page_count, paths=300, image_size=600)
+            (target_dir / f"{subdir}_{index:03d}.pdf").write_bytes(data)
+    return Path(corpus_dir)
+
+def parse_mix(mix):
+    """解析 "preview=60,render=25,..." 形式的负载权重。"""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in WORKLOADS:
+            raise ValueError(f"unknown workload '{name}', expected one of {', '.join(WORKLOADS)}")
+        weights[name] = float(weight or 1)
+    if not any(weight > 0 for weight in weights.values()):
+        raise ValueError("at least one workload needs a positive weight")
+    return weights
+
+def percentile(sorted_values, pct):
+    """最近秩法百分位数；sorted_values 须已排序。"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+def process_tree_rss_mb(pid):
+    """进程及其所有子进程（gunicorn worker、pdftoppm）的RSS总和（MB）；无法读取时返回 None。"""
+    proc = Path("/proc")
+    if not proc.exists():
+        try:
+            output = subprocess.run(["ps", "-A", "-o", "pid=,ppid=,rss="], capture_output=True, text=True).stdout
+        except OSError:
+            return None
+        rows = [tuple(int(field) for field in line.split()) for line in output.splitlines() if line.strip()]
+    else:
+        rows = []
+        for entry in proc.iterdir():
+            if not entry.name.isdigit():
+                continue
+            try:
+                status = (entry / "status").read_text()
+            except OSError:
+                continue
+            fields = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+            rss_kb = int(fields.get("VmRSS", "0 kB").split()[0])
+            rows.append((int(entry.name), int(fields["PPid"]), rss_kb))
+    children = {}
+    rss = {}
+    for row_pid, parent_pid, rss_kb in rows:
+        children.setdefault(parent_pid, []).append(row_pid)
+        rss[row_pid] = rss_kb
+    if pid not in rss:
+        return None
+    total_kb = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total_kb += rss.get(current, 0)
+        stack.extend(children.get(current, []))
+    return round(total_kb / 1024, 1)
+
+class LoadTest:
+    def __init__(self, client, corpus_dir, work_dir, mix, concurrency, duration, seed=0, dpi=72, server_pid=None):
+        self.client = client
+        self.corpus_dir = Path(corpus_dir).resolve()
+        self.work_dir = Path(work_dir).resolve()
+        self.mix = mix
+        self.concurrency = concurrency
+        self.duration = duration
+        self.seed = seed
+        self.dpi = dpi
+        self.server_pid = server_pid
+        self.preview_pdfs = sorted((self.corpus_dir / "preview").glob("*.pdf")) or sorted(self.corpus_dir.rglob("*.pdf"))
+        self.samples = []
+        self.samples_lock = threading.Lock()
+        self.rss_timeline = []
+        self.stop_event = threading.Event()
+
+    def run_request(self, workload, rng):
+        """发送一个负载请求，返回 (状态码, 是否成功, 错误信息)。"""
+        output_dir = self.work_dir / "out" / uuid.uuid4().hex
+        try:
+            if workload in ("preview", "render"):
+                pdf_path = rng.choice(self.preview_pdfs)
+                size = {"width": PREVIEW_WIDTH} if workload == "preview" else {"dpi": self.dpi}
+                query = urllib.parse.urlencode(dict(path=str(pdf_path), page=1, **size))
+                status, body = self.client.request("GET", f"/render?{query}")
+                return status, status == 200, None if status == 200 else body[:200].decode("utf-8", "replace")
+            data = {"input_path": str(self.corpus_dir / workload), "pages": "all", "recursive": True,
+                    "priority": "bulk"}
+            data.update(output_dir=str(output_dir), dpi=self.dpi, overwrite=True, post_export_action="none")
+            status, body = self.client.request("POST", "/convert", data)
+            try:
+                result_status = json.loads(body).get("status")
+            except ValueError:
+                result_status = None
+            ok = status == 200 and result_status == "completed"
+            return status, ok, None if ok else f"{status} {result_status}"
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    def client_loop(self, client_index, deadline):
+        rng = random.Random(f"{self.seed}:{client_index}")
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        while not self.stop_event.is_set() and time.monotonic() < deadline:
+            workload = rng.choices(names, weights)[0]
+            started = time.monotonic()
+            try:
+                status, ok, error = self.run_request(workload, rng)
+            except (OSError, http.client.HTTPException) as e:
+                status, ok, error = None, False, f"{type(e).__name__}: {e}"
+            finished = time.monotonic()
+            with self.samples_lock:
+                self.samples.append({"workload": workload, "start": started, "latency": finished - started,
+                                     "status": status, "ok": ok, "error": error})
+
+    def sample_rss(self, started):
+        while not self.stop_event.wait(RSS_SAMPLE_INTERVAL):
+            rss_mb = process_tree_rss_mb(self.server_pid)
+            if rss_mb is not None:
+                self.rss_timeline.append({"t": round(time.monotonic() - started, 1), "rss_mb": rss_mb})
+
+    def run(self):
+        started = time.monotonic()
+        deadline = started + self.duration
+        threads = [threading.Thread(target=self.client_loop, args=(index, deadline), daemon=True)
+                   for index in range(self.concurrency)]
+        if self.server_pid:
+            threads.append(threading.Thread(target=self.sample_rss, args=(started,), daemon=True))
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads[:self.concurrency]:
+                thread.join()
+        except KeyboardInterrupt:
+            print("Interrupted, waiting for in-flight requests...", file=sys.stderr)
+        finally:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+        return self.summarize(time.monotonic() - started)
+
+    def summarize(self, elapsed):
+        def stats(samples):
+            latencies = sorted(sample["latency"] for sample in samples)
+            errors = sum(1 for sample in samples if not sample["ok"])
+            summary = {"requests": len(samples), "errors": errors,
+                       "error_rate": round(errors / len(samples), 4) if samples else None,
+                       "throughput_rps": round(len(samples) / elapsed, 3) if elapsed > 0 else None,
+                       "mean_ms": round(1000 * sum(latencies) / len(latencies), 1) if latencies else None}
+            for pct in PERCENTILES:
+                value = percentile(latencies, pct)
+                summary[f"p{pct}_ms"] = round(1000 * value, 1) if value is not None else None
+            return summary
+
+        workloads = {name: stats([sample for sample in self.samples if sample["workload"] == name])
+                     for name in self.mix}
+        error_examples = {}
+        for sample in self.samples:
+            if sample["error"] and len(error_examples.setdefault(sample["workload"], [])) < 5:
+                error_examples[sample["workload"]].append(sample["error"])
+        rss_values = [point["rss_mb"] for point in self.rss_timeline]
+        return {
+            "version": RESULTS_VERSION,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {"concurrency": self.concurrency, "duration": self.duration, "mix": self.mix,
+                       "seed": self.seed, "dpi": self.dpi, "corpus": str(self.corpus_dir)},
+            "elapsed_seconds": round(elapsed, 3),
+            "overall": stats(self.samples),
+            "workloads": workloads,
+            "error_examples": error_examples,
+            "rss": {"peak_mb": max(rss_values) if rss_values else None,
+                    "final_mb": rss_values[-1] if rss_values else None, "timeline": self.rss_timeline},
+        }
+
+def wait_for_server(client, timeout=SERVER_START_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = client.request("GET", "/healthz")
+            if status == 200:
+                return True
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.2)
+    return False
+
+def print_summary(results, baseline=None):
+    columns = ("requests", "errors", "error_rate", "throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+    print(f"{'workload':<10}" + "".join(f"{column:>16}" for column in columns))
+    rows = list(results["workloads"].items()) + [("overall", results["overall"])]
+    for name, stats in rows:
+        base = (baseline["overall"] if name == "overall" else baseline["workloads"].get(name, {})) if baseline else {}
+        cells = []
+        for column in columns:
+            value = stats.get(column)
+            cell = "-" if value is None else f"{value:g}"
+            base_value = base.get(column)
+            if base_value and value is not None and column.endswith(("_ms", "_rps")):
+                cell += f" ({(value - base_value) / base_value:+.0%})"
+            cells.append(f"{cell:>16}")
+        print(f"{name:<10}" + "".join(cells))
+    rss = results["rss"]
+    if rss["peak_mb"] is not None:
+        line = f"server RSS: peak {rss['peak_mb']} MB, final {rss['final_mb']} MB"
+        if baseline and baseline["rss"].get("peak_mb"):
+            line += f" (baseline peak {baseline['rss']['peak_mb']} MB)"
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay mixed conversion workloads against a local backend")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Backend URL")
+    parser.add_argument("--unix_socket", default="", help="Connect over this Unix domain socket instead of --url")
+    parser.add_argument("--spawn", default="", help="Command that starts the server under test (run from the backend "
+                                                    "directory and stopped with SIGTERM at the end)")
+    parser.add_argument("--server_pid", type=int, default=0, help="PID of an already running server, for RSS sampling")
+    parser.add_argument("--corpus", default="", help="Corpus directory with preview/, batch/ and archive/ subdirectories "
+                                                     "(generated under --work_dir when omitted)")
+    parser.add_argument("--work_dir", default="load_test_work", help="Directory for the generated corpus and outputs")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Workload weights, e.g. preview=60,render=25,batch=12,archive=3")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=60, help="Test duration in seconds")
+    parser.add_argument("--dpi", type=int, default=72, help="DPI for the render, batch and archive workloads")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the corpus and the request sequence")
+    parser.add_argument("--output", default="", help="Write results to this JSON file")
+    parser.add_argument("--baseline", default="", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    work_dir = Path(args.work_dir)
+    corpus_dir = Path(args.corpus) if args.corpus else work_dir / f"corpus_seed{args.seed}"
+    if not args.corpus and not corpus_dir.exists():
+        print(f"Generating corpus in {corpus_dir} ...")
+        generate_corpus(corpus_dir, args.seed)
+    client = BackendClient(args.url, args.unix_socket or None)
+
+    server_process = None
+    server_pid = args.server_pid or None
+    if args.spawn:
+        server_process = subprocess.Popen(args.spawn, shell=True, cwd=Path(__file__).resolve().parent,
+                                          stdout=subprocess.DEVNULL, start_new_session=True)
+        server_pid = server_process.pid
+    try:
+        if not wait_for_server(client):
+            sys.exit(f"Backend is not reachable at {args.unix_socket or args.url}")
+        print(f"Running {args.duration:g}s with {args.concurrency} clients, mix {args.mix} ...")
+        results = LoadTest(client, corpus_dir, work_dir, mix, args.concurrency, args.duration, args.seed, args.dpi,
+                           server_pid).run()
+    finally:
+        if server_process is not None:
+            if hasattr(os, "killpg"):
+                os.killpg(server_process.pid, signal.SIGTERM) # 结束 shell 启动的整个进程组
+            else:
+                server_process.terminate()
+            server_process.wait()
+    results["config"]["server"] = args.spawn or args.unix_socket or args.url
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+    if baseline and baseline.get("version") != RESULTS_VERSION:
+        print(f"Warning: baseline results are version {baseline.get('version')}, this run is version "
+              f"{RESULTS_VERSION}; workloads differ and deltas are not comparable", file=sys.stderr)
+    print_summary(results, baseline)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Results saved to {args.output}")
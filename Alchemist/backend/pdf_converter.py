@@ -8,15 +8,47 @@ import logging
 import subprocess
 import re
 from pathlib import Path
-from pdf2image import convert_from_path, pdfinfo_from_path
+from pdf2image import pdfinfo_from_path
 from PIL import Image # Pillow for image processing
 import threading
 import platform
 import argparse
+import time
+import hashlib
+import mmap
+import shutil
+import io
+import math
+import random
+import bisect
+import tempfile
+import collections
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from PIL import ImageChops
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
 
 # --- 全局日志记录器 ---
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
+# 当前线程正在处理的任务ID；页面在共享的渲染线程上执行，日志的订阅者据此区分并发任务的日志
+job_context = threading.local()
+
+def current_job_id():
+    return getattr(job_context, "job_id", None)
+
+@contextlib.contextmanager
+def running_job(job_id):
+    """在 with 块内将当前线程的日志归属到任务 job_id，结束后恢复原来的任务。"""
+    previous_job_id = current_job_id()
+    job_context.job_id = job_id
+    try:
+        yield
+    finally:
+        job_context.job_id = previous_job_id
 
 # --- 默认配置 ---
 DEFAULT_CONFIG = {
@@ -37,8 +69,100 @@ DEFAULT_CONFIG = {
     "dry_run": False,
     "verbose_level": "INFO", # 默认GUI日志级别改为INFO
     "post_export_action": "open_file", # open_file, open_folder, both, none
+    "output_mode": "full", # full, bilevel, palette, auto
+    "bilevel_threshold": 128,
+    "bilevel_dither": False,
+    "palette_colors": 16,
+    "auto_color": False,
+    "color_tolerance": 12,
+    "skip_blank": False,
+    "blank_ink_ratio": 0.0005, # 墨迹像素占比不超过该值的页面视为空白页
+    "blank_probe_dpi": 24,
+    "autocrop": False,
+    "autocrop_tolerance": 10, # 与白色背景的灰度差不超过该值的像素视为空白边距
+    "autocrop_padding": 16, # 裁剪后保留的边距像素
+    "dedup_files": False, # 内容相同的PDF只渲染一次，其余以硬链接输出
+    "dedup_pages": False, # 渲染结果相同的页面只编码保存一次，其余以硬链接输出
+    "page_timeout": 600, # 单页渲染超时（秒），0 表示不限制
+    "render_memory_limit_mb": 0, # 渲染进程的内存上限（仅Linux），0 表示不限制
+    "quarantine": True, # 跳过多次导致渲染崩溃或超时的PDF
+    "quarantine_file": "", # 为空时使用 ~/.alchemist/quarantine.json
+    "workers": 1, # 并发渲染的页面数
+    "adaptive_workers": False, # 根据吞吐量和内存压力自动调整并发数
+    "min_workers": 1,
+    "max_workers": 0, # 0 表示使用CPU核心数
+    "estimate_samples": 30, # 估算模式下抽样渲染的页面数
+    "write_plan": "", # 空运行时将执行计划（JSONL）写入该文件
+    "plan": "", # 直接执行该计划文件，跳过PDF查找和筛选
+    "metadata_cache_file": "", # 为空时使用 ~/.alchemist/pdf_metadata.json
+    "shard": "", # "i/N"：只处理按 (PDF路径, 页码) 哈希划分的第 i 份（共 N 份）页面
+    "priority": "auto", # 多个任务并发时的优先级: interactive, bulk, auto（单个PDF为 interactive，目录为 bulk）
+    "latency_target": 2.0, # interactive 任务的页面排队超过该时间（秒）后优先于公平分配
 }
 
+OUTPUT_MODES = ("full", "bilevel", "palette", "auto")
+
+# 传递给 convert_single_pdf(options=...) 的逐页处理选项
+IMAGE_OPTION_KEYS = ("output_mode", "bilevel_threshold", "bilevel_dither", "palette_colors",
+                     "auto_color", "color_tolerance", "skip_blank", "blank_ink_ratio", "blank_probe_dpi",
+                     "autocrop", "autocrop_tolerance", "autocrop_padding", "page_timeout",
+                     "render_memory_limit_mb")
+
+# 颜色检测在缩小后的图像上进行，每个方向缩小的倍数
+AUTO_COLOR_DOWNSAMPLE = 4
+
+# 灰度值低于该值的像素计为墨迹
+BLANK_INK_LEVEL = 230
+
+MANIFEST_FILENAME = "alchemist_manifest.json"
+# 等待渲染进程时检查终止信号的间隔（秒），决定了终止转换的响应延迟
+RENDER_POLL_INTERVAL = 0.1
+
+# 同一PDF导致渲染崩溃或超时达到该次数后被隔离，之后的任务直接跳过
+QUARANTINE_THRESHOLD = 2
+QUARANTINE_REASONS = ("crash", "timeout")
+DEFAULT_QUARANTINE_FILE = Path.home() / ".alchemist" / "quarantine.json"
+
+DEFAULT_METADATA_CACHE_FILE = Path.home() / ".alchemist" / "pdf_metadata.json"
+# 生成执行计划时并发读取PDF信息的线程数；pdfinfo 为独立进程且多受磁盘限制，可超过CPU核心数
+PLAN_METADATA_WORKERS = 8
+PLAN_VERSION = 1
+# 传给 pdfinfo 的末页页码，pdfinfo 会将其限制在实际页数以内，从而输出所有页面的尺寸
+PDFINFO_LAST_PAGE = 2 ** 31 - 1
+# 执行计划时以调用方为准的设置项，其余设置（DPI、输出模式等）沿用计划中的设置，保证输出与计划一致
+PLAN_RUNTIME_KEYS = ("workers", "adaptive_workers", "min_workers", "max_workers", "page_timeout",
+                     "render_memory_limit_mb", "quarantine", "quarantine_file", "dedup_files", "dedup_pages",
+                     "post_export_action", "verbose_level", "metadata_cache_file", "shard")
+
+# 自适应并发：每个观察窗口的最短时长（秒），吞吐量变化超过该比例才视为有效变化
+ADAPTIVE_WINDOW_SECONDS = 5.0
+ADAPTIVE_MIN_GAIN = 0.05
+# 连续保持若干个窗口后再尝试增加一次并发，以便在负载变化后重新探测
+ADAPTIVE_PROBE_AFTER_HOLDS = 3
+# 系统可用内存低于总内存的该比例时视为内存压力，并发数减半
+MEMORY_PRESSURE_RATIO = 0.10
+# 1分钟平均负载超过 CPU核心数 × 该系数时不再增加并发
+LOAD_SATURATION_FACTOR = 1.5
+
+# 并发任务调度：各优先级的权重（按权重分配渲染槽位），以及每个任务最多预先排队的页面数（相对槽位数的倍数）
+JOB_PRIORITIES = ("interactive", "bulk")
+PRIORITY_WEIGHTS = {"interactive": 8, "bulk": 1}
+SCHEDULER_QUEUE_FACTOR = 2
+
+# 计算文件内容哈希时每次读取的块大小
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+# 转换总结中逐条列出的页面数上限，其余见任务清单
+SUMMARY_MAX_LISTED_PAGES = 20
+
+# 估算模式：置信区间对应的正态分位数（95%），以及固定的抽样随机种子，保证同一输入的估算可复现
+ESTIMATE_CONFIDENCE_Z = 1.96
+ESTIMATE_RANDOM_SEED = 20240101
+
+# auto模式下，中间调像素占比不超过该值的灰度页面视为纯文本页，输出为1位图像
+AUTO_BILEVEL_MIDTONE_RANGE = (64, 192)
+AUTO_BILEVEL_MAX_MIDTONE_RATIO = 0.02
+
 # --- Poppler路径处理 ---
 BUNDLED_POPPLER_PATH = None
 
@@ -161,10 +285,14 @@ def generate_output_filename(template, pdf_path, page_num, total_pages, dpi, pre
         logger.warning(f"应用文件名模板 '{template}' 时出错: {e}。将使用默认文件名格式。")
         return default_filename
 
-def generate_unique_filename(original_path):
-    """Generates a unique filename by appending a numerical suffix if the file already exists."""
+def generate_unique_filename(original_path, reserved_paths=None, check_existing=True):
+    """Generates a unique filename by appending a numerical suffix if the file already exists
+    (or is already reserved by another page of the current job)."""
     path = Path(original_path)
-    if not path.exists():
+    reserved_paths = reserved_paths or ()
+    def is_taken(candidate):
+        return (check_existing and candidate.exists()) or candidate in reserved_paths
+    if not is_taken(path):
         return path
 
     stem = path.stem
@@ -174,37 +302,292 @@ def generate_unique_filename(original_path):
     while True:
         new_name = f"{stem}_copy_{counter}{suffix}"
         new_path = parent / new_name
-        if not new_path.exists():
+        if not is_taken(new_path):
             return new_path
         counter += 1
 
-def convert_single_pdf(pdf_path, output_dir_base, pages_to_convert_str, dpi, overwrite, prefix,
-                       filename_template, grayscale, rotate_angle, dry_run,
-                       preserve_structure=False, input_root_dir=None, stop_event=None): # Added stop_event
-    global BUNDLED_POPPLER_PATH
-    generated_image_paths = [] # Initialize list to store generated image paths
+def get_option(options, key):
+    """从选项字典中读取配置项，缺失时回退到 DEFAULT_CONFIG。"""
+    if options and options.get(key) is not None:
+        return options[key]
+    return DEFAULT_CONFIG[key]
+
+def to_bilevel(image, threshold=128, dither=False):
+    """Reduce a rendered page to a 1-bit image, by LUT threshold or Floyd-Steinberg dithering."""
+    gray = image if image.mode == "L" else image.convert("L")
+    if dither:
+        return gray.convert("1", dither=Image.Dither.FLOYDSTEINBERG)
+    lut = [255 if value >= threshold else 0 for value in range(256)]
+    return gray.point(lut, mode="1")
+
+def to_palette(image, max_colors=16):
+    """Quantize to a palette image. Pages with at most max_colors distinct colours are mapped losslessly."""
+    if image.mode == "1":
+        return image
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    exact_colors = image.getcolors(max_colors)
+    if exact_colors is None:
+        return image.quantize(colors=max_colors, dither=Image.Dither.NONE)
+    if image.mode == "L":
+        # 灰度图的 quantize(palette=...) 会把灰度值直接当作调色板索引，须用LUT将灰度值映射为索引
+        levels = [value for _, value in exact_colors]
+        lut = [0] * 256
+        for index, value in enumerate(levels):
+            lut[value] = index
+        palette_image = image.point(lut)
+        palette_image = Image.frombytes("P", palette_image.size, palette_image.tobytes())
+        palette_image.putpalette([channel for value in levels for channel in (value, value, value)])
+        return palette_image
+    palette = []
+    for _, color in exact_colors:
+        palette.extend(color if isinstance(color, tuple) else (color, color, color))
+    palette_image = Image.new("P", (1, 1))
+    palette_image.putpalette(palette)
+    return image.quantize(palette=palette_image, dither=Image.Dither.NONE)
+
+def choose_auto_output_mode(image, max_colors=16):
+    """根据颜色数和灰度直方图为页面选择 palette、bilevel 或 full 输出模式。"""
+    if image.mode == "1":
+        return "full"
+    if image.getcolors(max_colors) is not None:
+        return "palette"
+    if image.mode == "L":
+        histogram = image.histogram()
+        low, high = AUTO_BILEVEL_MIDTONE_RANGE
+        midtone_ratio = sum(histogram[low:high]) / max(1, image.width * image.height)
+        if midtone_ratio <= AUTO_BILEVEL_MAX_MIDTONE_RATIO:
+            return "bilevel"
+    return "full"
+
+def is_achromatic(image, tolerance=12):
+    """判断页面是否无彩色：在缩小后的图像上计算RGB通道间的最大差值。"""
+    if image.mode in ("1", "L", "LA", "I", "F"):
+        return True
+    rgb = image if image.mode == "RGB" else image.convert("RGB")
+    if min(rgb.size) >= AUTO_COLOR_DOWNSAMPLE * 8:
+        rgb = rgb.reduce(AUTO_COLOR_DOWNSAMPLE)
+    red, green, blue = rgb.split()
+    channel_spread = ImageChops.lighter(
+        ImageChops.lighter(ImageChops.difference(red, green), ImageChops.difference(green, blue)),
+        ImageChops.difference(red, blue)
+    )
+    return channel_spread.getextrema()[1] <= tolerance
+
+def ink_coverage(image):
+    """返回页面中墨迹像素（灰度低于 BLANK_INK_LEVEL）所占的比例。"""
+    gray = image if image.mode == "L" else image.convert("L")
+    histogram = gray.histogram()
+    return sum(histogram[:BLANK_INK_LEVEL]) / max(1, gray.width * gray.height)
+
+def find_content_bbox(image, tolerance=10, padding=0):
+    """查找非白色内容的边界框 (left, upper, right, lower)，并向外扩展 padding 像素；整页空白时返回 None。"""
+    gray = image if image.mode == "L" else image.convert("L")
+    # 反相后背景为0，再用LUT去掉容差内的浅色噪点，getbbox 即为内容所在的行列范围
+    content_mask = gray.point([255 if 255 - value > tolerance else 0 for value in range(256)])
+    bbox = content_mask.getbbox()
+    if bbox is None:
+        return None
+    left, upper, right, lower = bbox
+    return (max(0, left - padding), max(0, upper - padding),
+            min(gray.width, right + padding), min(gray.height, lower + padding))
+
+def hash_page_image(image):
+    """计算渲染结果（经过全部变换后）的内容哈希，尺寸和模式也计入哈希。"""
+    digest = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def apply_output_mode(image, output_mode, options=None):
+    """按输出模式缩减图像位深，返回 (image, 实际使用的模式)。"""
+    if output_mode == "auto":
+        output_mode = choose_auto_output_mode(image, get_option(options, "palette_colors"))
+    if output_mode == "bilevel":
+        image = to_bilevel(image, get_option(options, "bilevel_threshold"), get_option(options, "bilevel_dither"))
+    elif output_mode == "palette":
+        image = to_palette(image, get_option(options, "palette_colors"))
+    elif output_mode != "full":
+        logger.warning(f"未知的输出模式 '{output_mode}'，将保留原始图像模式。")
+        output_mode = "full"
+    return image, output_mode
+
+class RenderCancelled(Exception):
+    """渲染进程因终止信号被结束。"""
+
+class RenderTimeout(Exception):
+    """渲染进程超过单页超时时间，已被结束。"""
+
+class RenderCrashed(Exception):
+    """渲染进程异常退出（段错误、内存耗尽等）。"""
+
+def _renderer_crashed(returncode):
+    # POSIX 上被信号结束时退出码为负数；Windows 上崩溃时为 0xC0000000 以上的NTSTATUS值
+    return returncode < 0 or returncode >= 0xC0000000
+
+def pdftoppm_executable():
+    """渲染使用的 pdftoppm：找到了内置的 Poppler 时为其中的完整路径，否则为在 PATH 中查找的命令名。"""
+    executable = "pdftoppm.exe" if platform.system() == "Windows" else "pdftoppm"
+    if BUNDLED_POPPLER_PATH:
+        executable = os.path.join(BUNDLED_POPPLER_PATH, executable)
+    return executable
+
+def build_pdftoppm_command(pdf_path, page_num, dpi):
+    executable = pdftoppm_executable()
+    # 不指定输出文件时 pdftoppm 将 PPM 写到标准输出，无需临时目录
+    return [executable, "-r", str(dpi), "-f", str(page_num), "-l", str(page_num), "-singlefile", str(pdf_path)]
+
+def render_page(pdf_path, page_num, dpi, stop_event=None, timeout=None, memory_limit_mb=0):
+    """渲染PDF的单页，返回 PIL 图像；未生成图像时返回 None。
+
+    pdftoppm 在子进程中运行，等待期间定期检查 stop_event，一旦置位立即结束子进程并抛出 RenderCancelled；
+    运行超过 timeout 秒的渲染同样会被结束，并抛出 RenderTimeout。渲染进程崩溃时抛出 RenderCrashed，
+    不会影响当前进程。
+    """
+    command = build_pdftoppm_command(pdf_path, page_num, dpi)
+    logger.debug(f"Running renderer: {command}")
+    env = os.environ.copy()
+    if BUNDLED_POPPLER_PATH:
+        env["LD_LIBRARY_PATH"] = BUNDLED_POPPLER_PATH + ":" + env.get("LD_LIBRARY_PATH", "")
+    startupinfo = None
+    if platform.system() == "Windows":
+        # 避免在Windows上弹出控制台窗口
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+    started_at = time.monotonic()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               startupinfo=startupinfo)
+    if memory_limit_mb and resource is not None and hasattr(resource, "prlimit"):
+        limit_bytes = int(memory_limit_mb) * 1024 * 1024
+        try:
+            resource.prlimit(process.pid, resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+        except (OSError, ValueError) as e:
+            logger.debug(f"无法限制渲染进程内存: {e}")
+    try:
+        while True:
+            try:
+                data, err = process.communicate(timeout=RENDER_POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if stop_event and stop_event.is_set():
+                    raise RenderCancelled(f"'{Path(pdf_path).name}' 第 {page_num} 页的渲染已被终止。")
+                if timeout and time.monotonic() - started_at > timeout:
+                    raise RenderTimeout(f"'{Path(pdf_path).name}' 第 {page_num} 页渲染超过 {timeout} 秒，渲染进程已被结束。")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.communicate()
+
+    if _renderer_crashed(process.returncode):
+        raise RenderCrashed(f"'{Path(pdf_path).name}' 第 {page_num} 页的渲染进程异常退出 (退出码 {process.returncode})。")
+    if not data:
+        logger.error(f"渲染器未输出图像 (退出码 {process.returncode}): {err.decode('utf-8', 'ignore').strip()}")
+        return None
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+def save_image(image, output_path):
+    """先写入 .part 临时文件再原子替换，中断或出错时不会留下不完整的输出文件。"""
+    partial_path = output_path.with_name(output_path.name + ".part")
+    try:
+        image.save(partial_path, 'PNG')
+        os.replace(partial_path, output_path)
+    except BaseException:
+        if partial_path.exists():
+            partial_path.unlink()
+        raise
+
+def get_output_dir(pdf_path, output_dir_base, preserve_structure=False, input_root_dir=None):
+    if preserve_structure and input_root_dir and pdf_path.parent != input_root_dir:
+        try:
+            relative_subdir = pdf_path.parent.relative_to(input_root_dir)
+            return output_dir_base / relative_subdir
+        except ValueError:
+            logger.warning(f"无法为 {pdf_path} 保留目录结构，因为它不在 {input_root_dir} 之下。")
+    return output_dir_base
+
+def read_pdf_page_count(pdf_path, timeout=None, manifest=None):
+    """读取PDF的总页数，读取失败或无法获取时返回 0。"""
     try:
-        pdf_info = pdfinfo_from_path(pdf_path, poppler_path=BUNDLED_POPPLER_PATH)
+        pdf_info = pdfinfo_from_path(pdf_path, poppler_path=BUNDLED_POPPLER_PATH, timeout=timeout)
         total_pages = pdf_info.get("Pages", 0)
         if total_pages == 0:
             logger.warning(f"无法获取 '{pdf_path.name}' 的页数，可能文件已损坏或非标准PDF。跳过。")
-            return [] # Return empty list
+        return total_pages
     except Exception as e:
         logger.error(f"读取PDF信息失败 '{pdf_path.name}': {e}。跳过。")
-        return [] # Return empty list
-
-    if stop_event and stop_event.is_set(): return [] # Check before processing pages
+        record_manifest_failure(manifest, pdf_path, None, "pdfinfo", str(e))
+        return 0
 
-    pages_list = parse_page_ranges(pages_to_convert_str, total_pages)
-    if pages_list is None: return []
+def parse_shard(shard_spec):
+    """解析 "i/N" 形式的分片设置（i 从 1 开始），返回 (i, N)；为空时返回 None，格式无效时抛出 ValueError。"""
+    if not shard_spec:
+        return None
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", str(shard_spec))
+    if not match or not 0 < int(match.group(1)) <= int(match.group(2)):
+        raise ValueError(f"无效的分片设置 '{shard_spec}'，应为 i/N 且 1 <= i <= N。")
+    return int(match.group(1)), int(match.group(2))
 
-    current_output_dir = output_dir_base
-    if preserve_structure and input_root_dir and pdf_path.parent != input_root_dir:
+def shard_key(pdf_path, input_root_dir=None):
+    """PDF在分片中的标识：相对输入根目录的路径，各主机挂载点不同也能得到相同结果。"""
+    pdf_key = Path(pdf_path).resolve().as_posix()
+    if input_root_dir:
         try:
-            relative_subdir = pdf_path.parent.relative_to(input_root_dir)
-            current_output_dir = output_dir_base / relative_subdir
+            pdf_key = Path(pdf_path).resolve().relative_to(Path(input_root_dir).resolve()).as_posix()
         except ValueError:
-            logger.warning(f"无法为 {pdf_path} 保留目录结构，因为它不在 {input_root_dir} 之下。")
+            pass
+    return pdf_key
+
+def page_in_shard(pdf_path, page_num, shard, input_root_dir=None):
+    """页面是否属于该分片，按 shard_key 和页码的哈希划分。"""
+    if not shard:
+        return True
+    index, count = shard
+    digest = hashlib.sha1(f"{shard_key(pdf_path, input_root_dir)}:{page_num}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count == index - 1
+
+def reserve_output_path(output_png_path, overwrite, reserved_paths=None, check_existing=True):
+    """返回页面实际使用的输出路径：不覆盖时，为已存在或已被本任务占用的文件名生成新文件名。
+
+    check_existing 为 False 时只避开本任务占用的文件名，不受磁盘上已有文件的影响，
+    分片执行时各分片由此得到相同的路径分配。
+    """
+    taken = (check_existing and output_png_path.exists()) or (reserved_paths and output_png_path in reserved_paths)
+    if not overwrite and taken:
+        # Generate a unique filename instead of skipping
+        output_png_path = generate_unique_filename(output_png_path, reserved_paths, check_existing)
+    if reserved_paths is not None:
+        reserved_paths.add(output_png_path)
+    return output_png_path
+
+def skip_existing_shard_output(output_png_path, overwrite, pdf_path, page_num, manifest=None):
+    """分片执行时输出路径不随磁盘上的文件改名（各分片须得到相同的分配），不覆盖时跳过输出已存在的页面。
+
+    页面被跳过时返回 True，并记入任务清单的 skipped_pages。
+    """
+    if overwrite or not output_png_path.exists():
+        return False
+    logger.warning(f"输出文件 '{output_png_path}' 已存在且未启用覆盖，跳过 '{Path(pdf_path).name}' 第 {page_num} 页。")
+    record_manifest_skip(manifest, pdf_path, page_num, "exists", output=output_png_path.resolve().as_posix())
+    return True
+
+def plan_pdf_pages(pdf_path, output_dir_base, pages_to_convert_str, dpi, overwrite, prefix,
+                   filename_template, dry_run, preserve_structure=False, input_root_dir=None,
+                   options=None, manifest=None, reserved_paths=None, shard=None):
+    """逐页生成 (page_num, total_pages, output_png_path)，即PDF中需要转换的页面及其输出路径。
+
+    reserved_paths 用于在同一任务内避免不同页面使用相同的输出文件名。给出 shard 时仍为所有页面
+    分配输出路径（保证各分片互不冲突），但只生成属于该分片的页面。
+    """
+    total_pages = read_pdf_page_count(pdf_path, get_option(options, "page_timeout") or None, manifest)
+    if total_pages == 0:
+        return
+
+    pages_list = parse_page_ranges(pages_to_convert_str, total_pages)
+    if pages_list is None: return
+
+    current_output_dir = get_output_dir(pdf_path, output_dir_base, preserve_structure, input_root_dir)
 
     if not dry_run:
         current_output_dir.mkdir(parents=True, exist_ok=True)
@@ -212,52 +595,1244 @@ def convert_single_pdf(pdf_path, output_dir_base, pages_to_convert_str, dpi, ove
         logger.info(f"[空运行] {'将会创建' if not current_output_dir.exists() else '输出目录已存在'}: {current_output_dir.resolve()}")
 
     for page_num in pages_list:
-        if stop_event and stop_event.is_set():
-            logger.info(f"PDF '{pdf_path.name}' 的页面处理被终止。")
-            break # Stop processing pages for this PDF
-
         output_filename = generate_output_filename(
             filename_template, pdf_path, page_num, total_pages, dpi, prefix,
             original_input_dir=input_root_dir
         )
-        output_png_path = current_output_dir / output_filename
-
-        if output_png_path.exists() and not overwrite:
-            # Generate a unique filename instead of skipping
-            original_output_png_path = output_png_path # Store original for logging
-            output_png_path = generate_unique_filename(output_png_path)
+        original_output_png_path = current_output_dir / output_filename
+        if shard:
+            output_png_path = reserve_output_path(original_output_png_path, False, reserved_paths, check_existing=False)
+            if not page_in_shard(pdf_path, page_num, shard, input_root_dir):
+                continue
+            if skip_existing_shard_output(output_png_path, overwrite, pdf_path, page_num, manifest):
+                continue
+        else:
+            output_png_path = reserve_output_path(original_output_png_path, overwrite, reserved_paths)
+        if output_png_path != original_output_png_path:
             logger.info(f"文件 '{original_output_png_path.name}' 已存在，将保存为新文件: {output_png_path.name}")
 
         logger.info(f"准备转换: '{pdf_path.name}' (第 {page_num}/{total_pages} 页) -> '{output_png_path.resolve()}'")
-
         if dry_run:
             logger.info(f"[空运行] 将转换并保存到: {output_png_path.resolve()}")
+        yield page_num, total_pages, output_png_path
+
+def render_processed_page(pdf_path, page_num, dpi, grayscale, rotate_angle, stop_event=None, options=None,
+                          manifest=None):
+    """渲染单页并完成空白页检测、灰度、裁剪、旋转和输出模式处理。
+
+    返回 (image, page_record, 实际使用的输出模式)；页面为空白页被跳过或未生成图像时返回 None。
+    渲染超时、崩溃或被终止时抛出相应异常，由调用方记录。
+    """
+    output_mode = get_option(options, "output_mode")
+    auto_color = get_option(options, "auto_color")
+    skip_blank = get_option(options, "skip_blank")
+    blank_ink_ratio = get_option(options, "blank_ink_ratio")
+    blank_probe_dpi = get_option(options, "blank_probe_dpi")
+    autocrop = get_option(options, "autocrop")
+    page_timeout = get_option(options, "page_timeout") or None
+    memory_limit_mb = get_option(options, "render_memory_limit_mb")
+    if skip_blank and blank_probe_dpi and blank_probe_dpi < dpi:
+        # 先以低DPI试渲染，空白页无需再进行全分辨率渲染
+        probe_image = render_page(pdf_path, page_num, blank_probe_dpi, stop_event, page_timeout, memory_limit_mb)
+        if probe_image is not None:
+            coverage = ink_coverage(probe_image)
+            if coverage <= blank_ink_ratio:
+                logger.info(f"跳过空白页: '{pdf_path.name}' 第 {page_num} 页 (墨迹占比 {coverage:.4%}，试渲染 {blank_probe_dpi} DPI)")
+                record_manifest_skip(manifest, pdf_path, page_num, "blank", ink_ratio=round(coverage, 6),
+                                     probe_dpi=blank_probe_dpi)
+                return None
+
+    image = render_page(pdf_path, page_num, dpi, stop_event, page_timeout, memory_limit_mb)
+    if image is None:
+        logger.error(f"未能从 '{pdf_path.name}' 第 {page_num} 页生成图像。")
+        record_manifest_failure(manifest, pdf_path, page_num, "no_image", "renderer produced no image")
+        return None
+
+    if skip_blank and not (blank_probe_dpi and blank_probe_dpi < dpi):
+        coverage = ink_coverage(image)
+        if coverage <= blank_ink_ratio:
+            logger.info(f"跳过空白页: '{pdf_path.name}' 第 {page_num} 页 (墨迹占比 {coverage:.4%})")
+            record_manifest_skip(manifest, pdf_path, page_num, "blank", ink_ratio=round(coverage, 6))
+            return None
+    page_record = {}
+    if grayscale:
+        image = image.convert("L")
+    elif auto_color:
+        achromatic = is_achromatic(image, get_option(options, "color_tolerance"))
+        page_record["auto_color"] = "gray" if achromatic else "color"
+        if achromatic:
+            image = image.convert("L")
+    if autocrop:
+        crop_box = find_content_bbox(image, get_option(options, "autocrop_tolerance"),
+                                     get_option(options, "autocrop_padding"))
+        if crop_box and crop_box != (0, 0, image.width, image.height):
+            page_record["rendered_size"] = [image.width, image.height]
+            page_record["crop_box"] = list(crop_box)
+            image = image.crop(crop_box)
+    if rotate_angle != 0:
+        image = image.rotate(rotate_angle, expand=True)
+    image, applied_output_mode = apply_output_mode(image, output_mode, options)
+    logger.debug(f"第 {page_num} 页输出模式: {applied_output_mode} ({image.mode})")
+    return image, page_record, applied_output_mode
+
+def convert_page(pdf_path, page_num, total_pages, output_png_path, dpi, grayscale, rotate_angle,
+                 stop_event=None, options=None, manifest=None, page_index=None):
+    """渲染、处理并保存单个页面，返回生成的图片路径；页面被跳过或失败时返回 None。
+
+    渲染被终止时抛出 RenderCancelled，其余错误记录到任务清单后返回 None。
+    """
+    try:
+        processed = render_processed_page(pdf_path, page_num, dpi, grayscale, rotate_angle, stop_event,
+                                          options, manifest)
+        if processed is None:
+            return None
+        image, page_record, applied_output_mode = processed
+
+        page_hash = hash_page_image(image) if page_index is not None else None
+        first_output = page_index.get(page_hash) if page_hash else None
+        try:
+            if first_output and os.path.exists(first_output):
+                if output_png_path.exists():
+                    output_png_path.unlink()
+                link_type = link_or_copy(first_output, output_png_path)
+                page_record.update(duplicate_of=first_output, link=link_type, dedup="page")
+                logger.info(f"页面与已保存的 '{Path(first_output).name}' 相同，已链接: {output_png_path.resolve()}")
+            else:
+                save_image(image, output_png_path)
+                logger.info(f"成功保存: {output_png_path.resolve()}")
+                if page_hash:
+                    page_index[page_hash] = output_png_path.resolve().as_posix()
+            if page_hash:
+                page_record["content_hash"] = page_hash
+            record_manifest_page(manifest, pdf_path, page_num, output_png_path, total_pages=total_pages,
+                                 output_mode=applied_output_mode, image_mode=image.mode, **page_record)
+            return output_png_path.resolve().as_posix()
+        except Exception as save_e:
+            logger.error(f"保存图片 '{output_png_path.name}' 时发生错误: {save_e}")
+            record_manifest_failure(manifest, pdf_path, page_num, "save", str(save_e))
+    except RenderTimeout as e:
+        logger.error(f"{e}继续处理下一页。")
+        record_manifest_failure(manifest, pdf_path, page_num, "timeout", str(e))
+    except RenderCrashed as e:
+        logger.error(f"{e}继续处理下一页。")
+        record_manifest_failure(manifest, pdf_path, page_num, "crash", str(e))
+    except RenderCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"转换 '{pdf_path.name}' 第 {page_num} 页时发生错误: {e}", exc_info=True) # Add exc_info for full traceback
+        record_manifest_failure(manifest, pdf_path, page_num, "error", str(e))
+    return None
+
+def convert_single_pdf(pdf_path, output_dir_base, pages_to_convert_str, dpi, overwrite, prefix,
+                       filename_template, grayscale, rotate_angle, dry_run,
+                       preserve_structure=False, input_root_dir=None, stop_event=None, # Added stop_event
+                       options=None, manifest=None, page_index=None):
+    generated_image_paths = [] # Initialize list to store generated image paths
+    page_tasks = plan_pdf_pages(pdf_path, output_dir_base, pages_to_convert_str, dpi, overwrite, prefix,
+                                filename_template, dry_run, preserve_structure, input_root_dir,
+                                options=options, manifest=manifest, reserved_paths=set())
+    for page_num, total_pages, output_png_path in page_tasks:
+        if stop_event and stop_event.is_set():
+            logger.info(f"PDF '{pdf_path.name}' 的页面处理被终止。")
+            break # Stop processing pages for this PDF
+
+        if dry_run:
             generated_image_paths.append(output_png_path.resolve().as_posix()) # Add to list even in dry run
             continue
 
         try:
-            # Explicitly convert Path object to string for convert_from_path
-            logger.debug(f"Calling convert_from_path with: path='{str(pdf_path)}', dpi={dpi}, first_page={page_num}, last_page={page_num}, poppler_path='{BUNDLED_POPPLER_PATH}'")
-            images = convert_from_path(str(pdf_path), dpi=dpi, first_page=page_num, last_page=page_num, fmt='png', poppler_path=BUNDLED_POPPLER_PATH)
-            if images:
-                image = images[0]
-                if grayscale:
-                    image = image.convert("L")
-                if rotate_angle != 0:
-                    image = image.rotate(rotate_angle, expand=True)
-                
-                try:
-                    image.save(output_png_path, 'PNG')
-                    logger.info(f"成功保存: {output_png_path.resolve()}")
-                    generated_image_paths.append(output_png_path.resolve().as_posix()) # Add to list
-                except Exception as save_e:
-                    logger.error(f"保存图片 '{output_png_path.name}' 时发生错误: {save_e}")
-            else:
-                logger.error(f"未能从 '{pdf_path.name}' 第 {page_num} 页生成图像。")
-        except Exception as e:
-            logger.error(f"转换 '{pdf_path.name}' 第 {page_num} 页时发生错误: {e}", exc_info=True) # Add exc_info for full traceback
+            output_path = convert_page(pdf_path, page_num, total_pages, output_png_path, dpi, grayscale, rotate_angle,
+                                       stop_event=stop_event, options=options, manifest=manifest, page_index=page_index)
+        except RenderCancelled as e:
+            logger.info(str(e))
+            break
+        if output_path:
+            generated_image_paths.append(output_path) # Add to list
     return generated_image_paths # Return the list of generated image paths
 
+def hash_file_contents(path, chunk_size=HASH_CHUNK_SIZE):
+    """通过 mmap 分块计算文件内容的 SHA-256。"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(0, size, chunk_size):
+                    digest.update(mapped[offset:offset + chunk_size])
+    return digest.hexdigest()
+
+def group_duplicate_pdfs(pdf_files):
+    """按内容对PDF分组，返回 [(首个文件, [内容相同的其余文件], 哈希或None), ...]，保持原有顺序。
+
+    先按文件大小分桶，只有大小相同的文件才需要计算哈希。
+    """
+    size_buckets = {}
+    for pdf_path in pdf_files:
+        try:
+            size = pdf_path.stat().st_size
+        except OSError:
+            size = None
+        size_buckets.setdefault(size, []).append(pdf_path)
+
+    content_keys = {}
+    for size, paths in size_buckets.items():
+        if size is None or len(paths) == 1:
+            continue
+        for pdf_path in paths:
+            try:
+                content_keys[pdf_path] = hash_file_contents(pdf_path)
+            except OSError as e:
+                logger.warning(f"计算 '{pdf_path.name}' 的内容哈希失败: {e}")
+
+    groups = []
+    group_by_key = {}
+    for pdf_path in pdf_files:
+        key = content_keys.get(pdf_path)
+        if key is not None and key in group_by_key:
+            group_by_key[key][1].append(pdf_path)
+            continue
+        group = (pdf_path, [], key)
+        groups.append(group)
+        if key is not None:
+            group_by_key[key] = group
+    return groups
+
+def link_or_copy(source_path, target_path):
+    """以硬链接方式创建输出文件，跨文件系统等情况下回退为复制。返回 'hardlink' 或 'copy'。"""
+    try:
+        os.link(source_path, target_path)
+        return "hardlink"
+    except OSError:
+        shutil.copy2(source_path, target_path)
+        return "copy"
+
+def materialize_duplicate_pdf(duplicate_path, primary_path, output_dir_base, settings, input_root_dir, manifest):
+    """按重复PDF自己的文件名模板，为其链接首个PDF已生成的所有页面，返回生成的路径列表。"""
+    primary_key = Path(primary_path).resolve().as_posix()
+    primary_pages = [page for page in manifest["pages"] if page["pdf"] == primary_key and page.get("output")]
+    if not primary_pages:
+        return []
+
+    output_dir = get_output_dir(duplicate_path, output_dir_base, settings["preserve_structure"], input_root_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    generated_paths = []
+    for page in primary_pages:
+        output_filename = generate_output_filename(
+            settings["output_filename_template"], duplicate_path, page["page"], page.get("total_pages", 0),
+            settings["dpi"], settings["prefix"], original_input_dir=input_root_dir
+        )
+        target_path = output_dir / output_filename
+        if target_path.resolve() == Path(page["output"]):
+            continue
+        if target_path.exists():
+            if settings["overwrite"]:
+                target_path.unlink()
+            else:
+                target_path = generate_unique_filename(target_path)
+        try:
+            link_type = link_or_copy(page["output"], target_path)
+        except OSError as e:
+            logger.error(f"为重复PDF '{duplicate_path.name}' 创建 '{target_path.name}' 失败: {e}")
+            continue
+        generated_paths.append(target_path.resolve().as_posix())
+        fields = {key: value for key, value in page.items() if key not in ("pdf", "page", "output")}
+        fields.update(duplicate_of=page["output"], link=link_type, dedup="file")
+        record_manifest_page(manifest, duplicate_path, page["page"], target_path, **fields)
+    return generated_paths
+
+class QuarantineStore:
+    """持久化的“毒PDF”记录，以文件内容哈希为键，记录渲染崩溃/超时次数。"""
+
+    def __init__(self, path=None, threshold=QUARANTINE_THRESHOLD):
+        self.path = Path(path) if path else DEFAULT_QUARANTINE_FILE
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取隔离列表 '{self.path}' 失败: {e}")
+            return
+        if not isinstance(entries, dict):
+            logger.warning(f"隔离列表 '{self.path}' 的格式无效，已忽略。")
+            return
+        # 忽略格式不正确的记录，保存时会被丢弃
+        self.entries = {content_hash: entry for content_hash, entry in entries.items()
+                        if isinstance(entry, dict) and isinstance(entry.get("failures", 0), int)
+                        and isinstance(entry.get("reasons", []), list)}
+
+    def quarantined_sizes(self):
+        return {entry.get("size") for entry in self.entries.values() if entry.get("quarantined")}
+
+    def find_quarantined(self, pdf_path):
+        """返回PDF对应的隔离记录；只有大小与某条隔离记录相同的文件才需要计算哈希。"""
+        try:
+            if pdf_path.stat().st_size not in self.quarantined_sizes():
+                return None
+            entry = self.entries.get(hash_file_contents(pdf_path))
+        except OSError:
+            return None
+        return entry if entry and entry.get("quarantined") else None
+
+    def record_failure(self, pdf_path, reasons):
+        """记录一次任务中某PDF的渲染失败，返回该PDF是否因此被隔离。"""
+        try:
+            content_hash = hash_file_contents(pdf_path)
+            size = pdf_path.stat().st_size
+        except OSError as e:
+            logger.warning(f"无法为 '{pdf_path.name}' 记录隔离信息: {e}")
+            return False
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with self.lock:
+            entry = self.entries.setdefault(content_hash, {"first_seen": now, "failures": 0, "reasons": []})
+            entry.update(path=Path(pdf_path).resolve().as_posix(), size=size, last_seen=now)
+            entry["failures"] += 1
+            entry["reasons"] = sorted(set(entry["reasons"]) | set(reasons))
+            entry["quarantined"] = entry["failures"] >= self.threshold
+            self.save()
+            return entry["quarantined"]
+
+    def save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            logger.error(f"保存隔离列表 '{self.path}' 失败: {e}")
+
+class PdfMetadataCache:
+    """持久化的PDF元数据（页数和各页尺寸）缓存，以文件路径为键，文件大小或修改时间变化后失效。"""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else DEFAULT_METADATA_CACHE_FILE
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.changed = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取PDF元数据缓存 '{self.path}' 失败: {e}")
+
+    def get(self, pdf_path):
+        try:
+            stat = pdf_path.stat()
+        except OSError:
+            return None
+        entry = self.entries.get(Path(pdf_path).resolve().as_posix())
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return entry
+        return None
+
+    def put(self, pdf_path, pages, page_sizes):
+        try:
+            stat = pdf_path.stat()
+        except OSError:
+            return
+        with self.lock:
+            self.entries[Path(pdf_path).resolve().as_posix()] = {
+                "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "pages": pages, "page_sizes": page_sizes,
+            }
+            self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            partial_path = self.path.with_name(self.path.name + ".part")
+            with open(partial_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(partial_path, self.path)
+            self.changed = False
+        except OSError as e:
+            logger.error(f"保存PDF元数据缓存 '{self.path}' 失败: {e}")
+
+def read_pdf_metadata(pdf_path, timeout=None, cache=None, manifest=None):
+    """返回 {"pages": 总页数, "page_sizes": [[宽, 高], ...]}（单位为点，已按页面旋转调整），
+    读取失败时返回 None。一次 pdfinfo 调用即可得到所有页面的尺寸。
+    """
+    entry = cache.get(pdf_path) if cache is not None else None
+    if entry:
+        return entry
+    try:
+        # pdfinfo 会把末页限制在实际页数以内
+        pdf_info = pdfinfo_from_path(pdf_path, poppler_path=BUNDLED_POPPLER_PATH, timeout=timeout,
+                                     first_page=1, last_page=PDFINFO_LAST_PAGE)
+    except Exception as e:
+        logger.error(f"读取PDF信息失败 '{pdf_path.name}': {e}。跳过。")
+        record_manifest_failure(manifest, pdf_path, None, "pdfinfo", str(e))
+        return None
+    total_pages = pdf_info.get("Pages", 0)
+    if total_pages == 0:
+        logger.warning(f"无法获取 '{pdf_path.name}' 的页数，可能文件已损坏或非标准PDF。跳过。")
+        return None
+    page_sizes = [None] * total_pages
+    page_rotations = {}
+    for key, value in pdf_info.items():
+        key_match = re.match(r"Page\s+(\d+) (size|rot)$", key)
+        if not key_match or not 0 < int(key_match.group(1)) <= total_pages:
+            continue
+        page_index = int(key_match.group(1)) - 1
+        if key_match.group(2) == "rot":
+            page_rotations[page_index] = int(value) if value.lstrip("-").isdigit() else 0
+            continue
+        size_match = re.match(r"([\d.]+) x ([\d.]+)", value)
+        if size_match:
+            page_sizes[page_index] = [float(size_match.group(1)), float(size_match.group(2))]
+    for page_index, rotation in page_rotations.items():
+        if page_sizes[page_index] and rotation % 180 == 90:
+            page_sizes[page_index].reverse()
+    if cache is not None:
+        cache.put(pdf_path, total_pages, page_sizes)
+    return {"pages": total_pages, "page_sizes": page_sizes}
+
+def predict_pixel_size(page_size, dpi):
+    """按页面尺寸（点）和DPI预测渲染图像的像素尺寸，未知时返回 (None, None)。"""
+    if not page_size:
+        return None, None
+    return tuple(int(math.ceil(points * dpi / 72 - 1e-6)) for points in page_size)
+
+def sample_system_metrics():
+    """采样当前进程RSS、系统可用/总内存（MB）和1分钟平均负载；无法获取的项为 None。"""
+    metrics = {"rss_mb": None, "available_mb": None, "total_mb": None, "load": None}
+    try:
+        with open("/proc/self/statm") as f:
+            metrics["rss_mb"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        if resource is not None:
+            # ru_maxrss 为峰值RSS，Linux上单位为KB，macOS上为字节
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            metrics["rss_mb"] = max_rss / 1024 / 1024 if platform.system() == "Darwin" else max_rss / 1024
+    try:
+        with open("/proc/meminfo") as f:
+            meminfo = dict(line.split(":", 1) for line in f if ":" in line)
+        metrics["available_mb"] = int(meminfo["MemAvailable"].split()[0]) / 1024
+        metrics["total_mb"] = int(meminfo["MemTotal"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        metrics["load"] = os.getloadavg()[0]
+    except (OSError, AttributeError):
+        pass
+    return metrics
+
+class AdaptiveConcurrencyController:
+    """在 [min_workers, max_workers] 范围内调整并发页数。
+
+    每个观察窗口结束时比较吞吐量（页/秒）：吞吐量提升则继续增加并发，增加后下降则回退；
+    出现内存压力时并发数减半，CPU已饱和时不再增加。每次决策都记录在 decisions 中。
+    """
+
+    def __init__(self, workers=1, min_workers=1, max_workers=0, adaptive=False):
+        self.min_workers = max(1, int(min_workers or 1))
+        # 未指定上限时取CPU核心数，但不低于显式指定的 workers
+        self.max_workers = max(self.min_workers, int(max_workers or max(os.cpu_count() or 1, int(workers or 1))))
+        self.workers = min(max(int(workers or 1), self.min_workers), self.max_workers)
+        self.adaptive = adaptive
+        self.decisions = []
+        self.completed = 0
+        self.started_at = time.monotonic()
+        self._window_started_at = self.started_at
+        self._window_completed = 0
+        self._last_rate = None
+        self._last_action = None
+        self._holds = 0
+
+    def record_completion(self):
+        self.completed += 1
+        self._window_completed += 1
+
+    def maybe_adjust(self):
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        elapsed = now - self._window_started_at
+        if elapsed < ADAPTIVE_WINDOW_SECONDS or self._window_completed < self.workers:
+            return
+        rate = self._window_completed / elapsed
+        metrics = sample_system_metrics()
+        previous_workers = self.workers
+        action, reason = "hold", "throughput_stable"
+
+        memory_pressure = (metrics["available_mb"] is not None and metrics["total_mb"]
+                           and metrics["available_mb"] < metrics["total_mb"] * MEMORY_PRESSURE_RATIO)
+        cpu_saturated = (metrics["load"] is not None
+                         and metrics["load"] > (os.cpu_count() or 1) * LOAD_SATURATION_FACTOR)
+        if memory_pressure:
+            self.workers = max(self.min_workers, self.workers // 2)
+            action, reason = "decrease", "memory_pressure"
+        elif self._last_action == "increase" and self._last_rate and rate < self._last_rate * (1 - ADAPTIVE_MIN_GAIN):
+            self.workers = max(self.min_workers, self.workers - 1)
+            action, reason = "decrease", "throughput_dropped"
+        elif cpu_saturated:
+            reason = "cpu_saturated"
+        elif (self._last_rate is None or rate > self._last_rate * (1 + ADAPTIVE_MIN_GAIN)
+              or self._holds >= ADAPTIVE_PROBE_AFTER_HOLDS):
+            if self.workers < self.max_workers:
+                self.workers += 1
+                action, reason = "increase", "probe" if self._holds >= ADAPTIVE_PROBE_AFTER_HOLDS else "throughput_improved"
+            else:
+                reason = "at_max_workers"
+        if action == "hold" or self.workers == previous_workers:
+            action = "hold"
+            self._holds += 1
+        else:
+            self._holds = 0
+
+        decision = {
+            "elapsed_seconds": round(now - self.started_at, 2),
+            "pages_per_sec": round(rate, 3),
+            "workers_before": previous_workers,
+            "workers": self.workers,
+            "action": action,
+            "reason": reason,
+        }
+        decision.update({key: round(value, 2) if value is not None else None for key, value in metrics.items()})
+        self.decisions.append(decision)
+        log = logger.info if action != "hold" else logger.debug
+        log(f"并发调整: {previous_workers} -> {self.workers} ({reason}，{rate:.2f} 页/秒)")
+
+        self._last_rate = rate
+        self._last_action = action
+        self._window_started_at = now
+        self._window_completed = 0
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "pages_completed": self.completed,
+            "elapsed_seconds": round(elapsed, 2),
+            "pages_per_sec": round(self.completed / elapsed, 3) if elapsed > 0 else None,
+            "concurrency": {
+                "adaptive": self.adaptive,
+                "min_workers": self.min_workers,
+                "max_workers": self.max_workers,
+                "final_workers": self.workers,
+                "decisions": self.decisions,
+            },
+        }
+
+class FairShareScheduler:
+    """在多个并发任务之间分配共享的渲染槽位。
+
+    每个任务按优先级获得权重，调度时选择已服务页数/权重（虚拟时间）最小的任务，即加权公平分配；
+    interactive 任务的页面排队超过 latency_target 秒时优先于公平分配。单个任务同时运行的页面数
+    不超过其 controller.workers。
+    """
+
+    def __init__(self, slots=None):
+        self.slots = max(1, int(slots or os.cpu_count() or 1))
+        self.condition = threading.Condition()
+        self.jobs = {}
+        self.threads = []
+
+    def _ensure_threads(self):
+        while len(self.threads) < self.slots:
+            thread = threading.Thread(target=self._run_slot, name=f"render-slot-{len(self.threads) + 1}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _system_virtual_time(self):
+        active = [job["virtual_time"] for job in self.jobs.values() if job["queue"] or job["in_flight"]]
+        return min(active) if active else 0.0
+
+    def _is_overdue(self, job, now):
+        return (job["latency_target"] is not None and job["queue"]
+                and now - job["queue"][0][1] >= job["latency_target"])
+
+    def _scheduling_order(self, jobs, now):
+        # 排队超时的 interactive 任务在前（等待最久的优先），其余按虚拟时间
+        return sorted(jobs, key=lambda job: (0, job["queue"][0][1]) if self._is_overdue(job, now)
+                      else (1, job["virtual_time"], job["submitted_at"]))
+
+    def _pick_job(self):
+        ready = [job for job in self.jobs.values()
+                 if job["queue"] and job["in_flight"] < job["controller"].workers]
+        if not ready:
+            return None
+        return self._scheduling_order(ready, time.monotonic())[0]
+
+    def _run_slot(self):
+        while True:
+            with self.condition:
+                job = self._pick_job()
+                while job is None:
+                    self.condition.wait()
+                    job = self._pick_job()
+                task, enqueued_at = job["queue"].popleft()
+                waited = time.monotonic() - enqueued_at
+                job["in_flight"] += 1
+                job["virtual_time"] += 1.0 / job["weight"]
+                job["started"] += 1
+                job["total_wait"] += waited
+                job["max_wait"] = max(job["max_wait"], waited)
+                if job["latency_target"] is not None and waited > job["latency_target"]:
+                    job["latency_misses"] += 1
+                self.condition.notify_all()
+            try:
+                job["run_task"](task)
+                job["controller"].record_completion()
+            except BaseException as e:
+                job["error"] = job["error"] or e
+            finally:
+                with self.condition:
+                    job["in_flight"] -= 1
+                    self.condition.notify_all()
+
+    def run_job(self, job_id, page_tasks, run_task, controller, priority="bulk", latency_target=None,
+                stop_event=None):
+        """在共享槽位上执行一个任务的所有页面，全部完成（或被终止）后返回调度统计。"""
+        priority = priority if priority in PRIORITY_WEIGHTS else "bulk"
+        with self.condition:
+            job = {
+                "id": job_id, "priority": priority, "weight": PRIORITY_WEIGHTS[priority],
+                "latency_target": latency_target if priority == "interactive" else None,
+                "controller": controller, "run_task": run_task, "queue": collections.deque(),
+                "in_flight": 0, "started": 0, "virtual_time": self._system_virtual_time(),
+                "submitted_at": time.monotonic(), "total_wait": 0.0, "max_wait": 0.0, "latency_misses": 0,
+                "error": None,
+            }
+            self.jobs[job_id] = job
+            self._ensure_threads()
+        stopping = lambda: stop_event is not None and stop_event.is_set()
+        try:
+            for task in page_tasks:
+                with self.condition:
+                    while (len(job["queue"]) >= self.slots * SCHEDULER_QUEUE_FACTOR and not stopping()
+                           and not job["error"]):
+                        self.condition.wait(RENDER_POLL_INTERVAL)
+                        controller.maybe_adjust()
+                    if stopping() or job["error"]:
+                        break
+                    if not job["queue"] and not job["in_flight"]:
+                        # 空闲后重新排队的任务不能用之前积累的虚拟时间优势长期占用槽位
+                        job["virtual_time"] = max(job["virtual_time"], self._system_virtual_time())
+                    job["queue"].append((task, time.monotonic()))
+                    self.condition.notify_all()
+            with self.condition:
+                while job["queue"] or job["in_flight"]:
+                    if stopping() or job["error"]:
+                        job["queue"].clear()
+                    self.condition.wait(RENDER_POLL_INTERVAL)
+                    controller.maybe_adjust()
+        finally:
+            with self.condition:
+                job["queue"].clear()
+                del self.jobs[job_id]
+                self.condition.notify_all()
+        if job["error"]:
+            raise job["error"]
+        return self._job_stats(job)
+
+    def _job_stats(self, job, position=None):
+        stats = {
+            "job_id": job["id"], "priority": job["priority"], "queued_pages": len(job["queue"]),
+            "in_flight": job["in_flight"], "started_pages": job["started"],
+            "avg_wait_seconds": round(job["total_wait"] / job["started"], 3) if job["started"] else None,
+            "max_wait_seconds": round(job["max_wait"], 3), "latency_target": job["latency_target"],
+            "latency_misses": job["latency_misses"],
+        }
+        if position is not None:
+            stats["position"] = position
+        return stats
+
+    def snapshot(self):
+        """当前各任务按调度顺序排列的状态，position 为下一次调度时的排位（从1开始）。"""
+        with self.condition:
+            ordered = self._scheduling_order(
+                [job for job in self.jobs.values() if job["queue"]], time.monotonic())
+            ordered += [job for job in self.jobs.values() if not job["queue"]]
+            return {"slots": self.slots,
+                    "jobs": [self._job_stats(job, position) for position, job in enumerate(ordered, 1)]}
+
+def run_page_tasks(page_tasks, run_task, controller, stop_event=None, scheduler=None, job_id=None,
+                   priority="bulk", latency_target=None):
+    """在线程池中执行页面任务，同时运行的任务数由 controller.workers 决定。
+
+    page_tasks 为惰性迭代器，只在有空闲并发时才取下一个任务；渲染在 pdftoppm 子进程中进行，
+    线程只负责等待和后处理。给出 scheduler 时，页面在与其他任务共享的槽位上按优先级公平调度，
+    返回调度统计；否则返回 None。
+    """
+    if scheduler is not None:
+        return scheduler.run_job(job_id, page_tasks, run_task, controller, priority, latency_target, stop_event)
+    with ThreadPoolExecutor(max_workers=controller.max_workers) as pool:
+        pending = set()
+        tasks = iter(page_tasks)
+        exhausted = False
+        while True:
+            stopping = stop_event is not None and stop_event.is_set()
+            while not exhausted and not stopping and len(pending) < controller.workers:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(run_task, task))
+            if not pending:
+                break
+            done, pending = wait(pending, timeout=RENDER_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+                controller.record_completion()
+            controller.maybe_adjust()
+
+def new_job_manifest(settings):
+    """创建任务清单，记录本次任务的设置和每一页的处理结果。"""
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {key: settings.get(key) for key in DEFAULT_CONFIG if key in settings},
+        "pages": [],
+        "skipped_pages": [],
+        "duplicate_pdfs": [],
+        "failed_pages": [],
+        "quarantined_pdfs": [],
+    }
+
+def record_manifest_page(manifest, pdf_path, page_num, output_path, **fields):
+    if manifest is None:
+        return
+    record = {"pdf": Path(pdf_path).resolve().as_posix(), "page": page_num,
+              "output": Path(output_path).resolve().as_posix() if output_path else None}
+    record.update(fields)
+    manifest["pages"].append(record)
+
+def record_manifest_skip(manifest, pdf_path, page_num, reason, **fields):
+    if manifest is None:
+        return
+    record = {"pdf": Path(pdf_path).resolve().as_posix(), "page": page_num, "reason": reason}
+    record.update(fields)
+    manifest["skipped_pages"].append(record)
+
+def record_manifest_failure(manifest, pdf_path, page_num, reason, message):
+    if manifest is None:
+        return
+    manifest["failed_pages"].append({"pdf": Path(pdf_path).resolve().as_posix(), "page": page_num,
+                                     "reason": reason, "message": message})
+
+def record_manifest_duplicate(manifest, duplicate_path, primary_path, content_hash):
+    if manifest is None:
+        return
+    manifest["duplicate_pdfs"].append({
+        "pdf": Path(duplicate_path).resolve().as_posix(),
+        "duplicate_of": Path(primary_path).resolve().as_posix(),
+        "sha256": content_hash,
+    })
+
+def job_manifest_filename(shard_spec=None):
+    """任务清单文件名；分片执行时每个分片写入各自的清单，避免共享输出目录时互相覆盖。"""
+    shard = parse_shard(shard_spec)
+    if not shard:
+        return MANIFEST_FILENAME
+    stem, suffix = os.path.splitext(MANIFEST_FILENAME)
+    return f"{stem}.shard-{shard[0]}-of-{shard[1]}{suffix}"
+
+def write_job_manifest(manifest, output_dir_base):
+    """将任务清单写入输出根目录，返回清单文件路径；写入失败时返回 None。"""
+    manifest_path = Path(output_dir_base) / job_manifest_filename(manifest["settings"].get("shard"))
+    try:
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False, default=str)
+    except OSError as e:
+        logger.error(f"写入任务清单 '{manifest_path}' 失败: {e}")
+        return None
+    logger.info(f"任务清单已保存: {manifest_path.resolve()}")
+    return manifest_path.resolve().as_posix()
+
+def build_conversion_plan(pdf_files_to_process, output_dir_base, settings, input_root_dir,
+                          stop_event=None, manifest=None):
+    """生成执行计划：列出每个待转换页面的 (PDF, 页码, 输出路径, 预测像素尺寸)，不渲染任何页面。
+
+    各PDF的元数据并发读取并缓存在 metadata_cache_file 中，输出路径按PDF顺序分配，与实际转换一致。
+    """
+    cache = PdfMetadataCache(settings.get("metadata_cache_file"))
+    quarantine = QuarantineStore(settings.get("quarantine_file")) if settings.get("quarantine") else None
+    timeout = settings.get("page_timeout") or None
+    dpi = settings["dpi"]
+    shard = parse_shard(settings.get("shard"))
+    if shard:
+        # 各分片须按相同顺序分配输出路径，不能依赖目录遍历顺序
+        pdf_files_to_process = sorted(pdf_files_to_process, key=lambda path: shard_key(path, input_root_dir))
+    job_id = current_job_id()
+
+    def inspect_pdf(pdf_path):
+        job_context.job_id = job_id # 线程池的线程属于本次计划，日志归属调用者的任务
+        if stop_event and stop_event.is_set():
+            return None, None
+        if quarantine is not None:
+            quarantine_entry = quarantine.find_quarantined(pdf_path)
+            if quarantine_entry:
+                return None, quarantine_entry
+        return read_pdf_metadata(pdf_path, timeout, cache, manifest), None
+
+    plan = {
+        "plan_version": PLAN_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "output_dir": Path(output_dir_base).resolve().as_posix(),
+        "input_root": Path(input_root_dir).resolve().as_posix() if input_root_dir else None,
+        "settings": {key: settings.get(key) for key in DEFAULT_CONFIG if key in settings},
+        "pages": [],
+    }
+    reserved_paths = set()
+    with ThreadPoolExecutor(max_workers=PLAN_METADATA_WORKERS) as pool:
+        for pdf_path, (metadata, quarantine_entry) in zip(pdf_files_to_process,
+                                                          pool.map(inspect_pdf, pdf_files_to_process)):
+            if stop_event and stop_event.is_set():
+                logger.info("生成执行计划被用户终止。")
+                break
+            if quarantine_entry:
+                logger.warning(f"PDF '{pdf_path.name}' 曾 {quarantine_entry['failures']} 次导致渲染器崩溃或超时，已被隔离，跳过。")
+                if manifest is not None:
+                    manifest["quarantined_pdfs"].append({"pdf": pdf_path.resolve().as_posix(),
+                                                         "reasons": quarantine_entry["reasons"]})
+                continue
+            if not metadata:
+                continue
+            total_pages = metadata["pages"]
+            pages_list = parse_page_ranges(settings["pages"], total_pages)
+            if not pages_list:
+                continue
+            current_output_dir = get_output_dir(pdf_path, output_dir_base, settings["preserve_structure"],
+                                                input_root_dir)
+            for page_num in pages_list:
+                output_filename = generate_output_filename(
+                    settings["output_filename_template"], pdf_path, page_num, total_pages, dpi,
+                    settings["prefix"], original_input_dir=input_root_dir
+                )
+                if shard:
+                    output_png_path = reserve_output_path(current_output_dir / output_filename, False,
+                                                          reserved_paths, check_existing=False)
+                    if not page_in_shard(pdf_path, page_num, shard, input_root_dir):
+                        continue
+                    if skip_existing_shard_output(output_png_path, settings["overwrite"], pdf_path, page_num,
+                                                  manifest):
+                        continue
+                else:
+                    output_png_path = reserve_output_path(current_output_dir / output_filename,
+                                                          settings["overwrite"], reserved_paths)
+                width, height = predict_pixel_size(metadata["page_sizes"][page_num - 1], dpi)
+                plan["pages"].append({"pdf": pdf_path.resolve().as_posix(), "page": page_num,
+                                      "total_pages": total_pages, "output": output_png_path.resolve().as_posix(),
+                                      "width": width, "height": height})
+    cache.save()
+    return plan
+
+def write_conversion_plan(plan, plan_path):
+    """以JSONL格式写入执行计划：第一行为计划头（设置、输出目录），其后每行一个页面。"""
+    plan_path = Path(plan_path)
+    header = {key: value for key, value in plan.items() if key != "pages"}
+    try:
+        plan_path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = plan_path.with_name(plan_path.name + ".part")
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False, default=str) + "\n")
+            for page in plan["pages"]:
+                f.write(json.dumps(page, ensure_ascii=False) + "\n")
+        os.replace(partial_path, plan_path)
+    except OSError as e:
+        logger.error(f"写入执行计划 '{plan_path}' 失败: {e}")
+        return None
+    logger.info(f"执行计划已保存: {plan_path.resolve()} (共 {len(plan['pages'])} 页)")
+    return plan_path.resolve().as_posix()
+
+def load_conversion_plan(plan_path):
+    """读取执行计划，返回 (计划头, {PDF路径: [(页码, 总页数, 输出路径), ...]})；读取失败时返回 (None, None)。"""
+    try:
+        with open(plan_path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get("plan_version") != PLAN_VERSION:
+                raise ValueError(f"不支持的计划版本: {header.get('plan_version')}")
+            page_plan = page_plan_from_records(json.loads(line) for line in f if line.strip())
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"读取执行计划 '{plan_path}' 失败: {e}")
+        return None, None
+    return header, page_plan
+
+def page_plan_from_records(pages):
+    """将计划中的页面记录（含 pdf、page、total_pages、output）按PDF分组为 run_conversion_batch 使用的 page_plan。"""
+    page_plan = {}
+    for page in pages:
+        page_plan.setdefault(Path(page["pdf"]), []).append(
+            (page["page"], page["total_pages"], Path(page["output"])))
+    return page_plan
+
+def settings_for_plan(plan_header, settings):
+    """执行计划时使用的设置：沿用计划中的转换设置，运行相关的设置以本次调用为准。"""
+    plan_settings = dict(DEFAULT_CONFIG)
+    plan_settings.update(plan_header.get("settings") or {})
+    plan_settings.update({key: settings[key] for key in PLAN_RUNTIME_KEYS if key in settings})
+    plan_settings.update(dry_run=False, write_plan="", plan=settings.get("plan", ""),
+                         output_dir=plan_header["output_dir"])
+    return plan_settings
+
+def log_plan_summary(plan):
+    pages = plan["pages"]
+    logger.info(f"[空运行] 已规划 {len({page['pdf'] for page in pages})} 个PDF的 {len(pages)} 页。")
+    for page in pages[:SUMMARY_MAX_LISTED_PAGES]:
+        size = f" ({page['width']}x{page['height']})" if page["width"] else ""
+        logger.info(f"[空运行] '{Path(page['pdf']).name}' 第 {page['page']}/{page['total_pages']} 页 -> {page['output']}{size}")
+    if len(pages) > SUMMARY_MAX_LISTED_PAGES:
+        logger.info(f"[空运行] ... 其余 {len(pages) - SUMMARY_MAX_LISTED_PAGES} 页见执行计划。")
+    known_sizes = [page["width"] * page["height"] for page in pages if page["width"]]
+    if known_sizes:
+        logger.info(f"[空运行] 预计像素总数: {sum(known_sizes) / 1e6:.1f} 百万像素")
+
+def resolve_job_priority(settings, input_path_obj=None):
+    """任务的调度优先级；auto 时单个PDF视为交互式预览（interactive），目录视为批量任务（bulk）。"""
+    priority = settings.get("priority") or "auto"
+    if priority in JOB_PRIORITIES:
+        return priority
+    return "interactive" if input_path_obj is not None and Path(input_path_obj).is_file() else "bulk"
+
+def run_conversion_batch(pdf_files_to_process, output_dir_base, settings, input_root_dir,
+                         stop_event=None, manifest=None, page_plan=None, scheduler=None, job_id=None,
+                         on_page_done=None):
+    """转换一组PDF，返回 (所有生成的图片路径, 至少成功处理一页的PDF数)。
+
+    各PDF的页面作为独立任务交给 run_page_tasks 执行，并发数由 settings 中的 workers /
+    adaptive_workers 控制；吞吐量和并发调整记录写入任务清单的 metrics。
+    空运行时只生成执行计划（见 build_conversion_plan）；给出 page_plan（见 load_conversion_plan）
+    时直接转换计划中的页面，不再读取PDF信息和分配输出路径。给出 scheduler 时与其他并发任务
+    共享渲染槽位（见 FairShareScheduler），调度统计写入 metrics 的 scheduling。
+    on_page_done(pdf_path, page_num, output_path) 在每页处理完毕（含跳过和失败，不含被终止）后调用。
+    """
+    if settings["dry_run"]:
+        plan = build_conversion_plan(pdf_files_to_process, output_dir_base, settings, input_root_dir,
+                                     stop_event, manifest)
+        log_plan_summary(plan)
+        if settings.get("write_plan"):
+            write_conversion_plan(plan, settings["write_plan"])
+        return [page["output"] for page in plan["pages"]], len({page["pdf"] for page in plan["pages"]})
+
+    options = {key: settings.get(key) for key in IMAGE_OPTION_KEYS}
+    # 页面内容哈希 -> 首次保存的输出路径，跨文档共享
+    page_index = {} if settings.get("dedup_pages") else None
+    if manifest is None:
+        manifest = new_job_manifest(settings)
+    quarantine = QuarantineStore(settings.get("quarantine_file")) if settings.get("quarantine") else None
+    shard = parse_shard(settings.get("shard"))
+    if shard:
+        logger.info(f"分片执行: 第 {shard[0]}/{shard[1]} 份")
+        # 各分片须按相同顺序分配输出路径，不能依赖目录遍历顺序
+        pdf_files_to_process = sorted(pdf_files_to_process, key=lambda path: shard_key(path, input_root_dir))
+    if settings.get("dedup_files"):
+        pdf_groups = group_duplicate_pdfs(pdf_files_to_process)
+    else:
+        pdf_groups = [(pdf_path, [], None) for pdf_path in pdf_files_to_process]
+    controller = AdaptiveConcurrencyController(settings.get("workers"), settings.get("min_workers"),
+                                               settings.get("max_workers"), settings.get("adaptive_workers"))
+
+    generated_by_pdf = {} # 按PDF分组的生成路径，键的顺序即处理顺序
+    processed_pages_by_pdf = {} # 按PDF分组的已处理完毕的页码，用于为重复PDF的页面调用 on_page_done
+    reserved_paths = set()
+
+    def iter_page_tasks():
+        for pdf_path, duplicate_paths, content_hash in pdf_groups:
+            if stop_event and stop_event.is_set():
+                logger.info("转换任务被用户终止。")
+                return
+
+            if quarantine is not None:
+                quarantine_entry = quarantine.find_quarantined(pdf_path)
+                if quarantine_entry:
+                    logger.warning(f"PDF '{pdf_path.name}' 曾 {quarantine_entry['failures']} 次导致渲染器崩溃或超时，已被隔离，跳过。")
+                    for quarantined_path in [pdf_path] + duplicate_paths:
+                        manifest["quarantined_pdfs"].append({"pdf": quarantined_path.resolve().as_posix(),
+                                                             "reasons": quarantine_entry["reasons"]})
+                    continue
+
+            logger.info(f"开始处理PDF: '{pdf_path.resolve()}'")
+            generated_by_pdf.setdefault(pdf_path, [])
+            processed_pages_by_pdf.setdefault(pdf_path, [])
+            if page_plan is not None:
+                planned_pages = [(page_num, total_pages, output_png_path)
+                                 for page_num, total_pages, output_png_path in page_plan[pdf_path]
+                                 if page_in_shard(pdf_path, page_num, shard, input_root_dir)]
+                for output_dir in {output_png_path.parent for _, _, output_png_path in planned_pages}:
+                    output_dir.mkdir(parents=True, exist_ok=True)
+            else:
+                planned_pages = plan_pdf_pages(
+                    pdf_path, output_dir_base, settings["pages"], settings["dpi"], settings["overwrite"],
+                    settings["prefix"], settings["output_filename_template"], False,
+                    settings["preserve_structure"], input_root_dir,
+                    options=options, manifest=manifest, reserved_paths=reserved_paths, shard=shard)
+            for page_num, total_pages, output_png_path in planned_pages:
+                yield pdf_path, page_num, total_pages, output_png_path
+
+    def run_task(task):
+        pdf_path, page_num, total_pages, output_png_path = task
+        try:
+            with running_job(job_id):
+                output_path = convert_page(pdf_path, page_num, total_pages, output_png_path, settings["dpi"],
+                                           settings["grayscale"], settings["rotate"], stop_event=stop_event,
+                                           options=options, manifest=manifest, page_index=page_index)
+        except RenderCancelled as e:
+            logger.info(str(e))
+            return
+        if output_path:
+            generated_by_pdf[pdf_path].append(output_path)
+        processed_pages_by_pdf[pdf_path].append(page_num)
+        if on_page_done is not None:
+            on_page_done(pdf_path, page_num, output_path)
+
+    scheduling = run_page_tasks(iter_page_tasks(), run_task, controller, stop_event, scheduler, job_id,
+                                settings.get("priority"), settings.get("latency_target"))
+
+    failed_by_pdf = {}
+    for page in manifest["failed_pages"]:
+        failed_by_pdf.setdefault(page["pdf"], set()).add(page["reason"])
+
+    all_generated_image_paths = []
+    pdfs_processed_count = 0
+    for pdf_path, duplicate_paths, content_hash in pdf_groups:
+        if pdf_path not in generated_by_pdf:
+            continue
+        generated_paths_for_this_pdf = generated_by_pdf[pdf_path]
+        if generated_paths_for_this_pdf:
+            all_generated_image_paths.extend(generated_paths_for_this_pdf)
+            pdfs_processed_count += 1
+        logger.info(f"PDF '{pdf_path.name}' 处理完成，实际生成 {len(generated_paths_for_this_pdf)} 张图片。")
+
+        poison_reasons = failed_by_pdf.get(pdf_path.resolve().as_posix(), set()) & set(QUARANTINE_REASONS)
+        if quarantine is not None and poison_reasons:
+            if quarantine.record_failure(pdf_path, poison_reasons):
+                logger.warning(f"PDF '{pdf_path.name}' 多次导致渲染器崩溃或超时，已加入隔离列表: {quarantine.path}")
+
+        for duplicate_path in duplicate_paths:
+            record_manifest_duplicate(manifest, duplicate_path, pdf_path, content_hash)
+            linked_paths = materialize_duplicate_pdf(duplicate_path, pdf_path, output_dir_base, settings,
+                                                     input_root_dir, manifest)
+            if linked_paths:
+                all_generated_image_paths.extend(linked_paths)
+                pdfs_processed_count += 1
+            logger.info(f"PDF '{duplicate_path.name}' 与 '{pdf_path.name}' 内容相同，已复用 {len(linked_paths)} 张图片，未重新渲染。")
+            if on_page_done is not None:
+                # 重复PDF的页面不经过 run_task，同样逐页报告（首个PDF中被跳过或失败的页面输出为 None）
+                duplicate_key = duplicate_path.resolve().as_posix()
+                linked_by_page = {record["page"]: record["output"] for record in manifest["pages"]
+                                  if record["pdf"] == duplicate_key and record.get("dedup") == "file"}
+                for page_num in processed_pages_by_pdf.get(pdf_path, []):
+                    on_page_done(duplicate_path, page_num, linked_by_page.get(page_num))
+
+    manifest["metrics"] = controller.summary()
+    if scheduling:
+        manifest["metrics"]["scheduling"] = scheduling
+    return all_generated_image_paths, pdfs_processed_count
+
+def log_conversion_summary(pdf_files_count, pdfs_processed_count, generated_count, output_dir_base, dry_run,
+                           manifest=None):
+    summary_action = "计划生成" if dry_run else "实际创建/覆盖"
+    logger.info(f"\n--- {'空运行 ' if dry_run else ''}转换总结 ---")
+    logger.info(f"扫描的PDF文件总数 (通过筛选后): {pdf_files_count}")
+    logger.info(f"至少成功处理一页的PDF文件数: {pdfs_processed_count}")
+    logger.info(f"PNG图片{summary_action}总数: {generated_count}")
+    if manifest is not None:
+        gray_pages = sum(1 for page in manifest["pages"] if page.get("auto_color") == "gray")
+        if gray_pages:
+            logger.info(f"自动识别为灰度并以单通道保存的页面数: {gray_pages}")
+        skipped_pages = manifest["skipped_pages"]
+        if skipped_pages:
+            reasons = {}
+            for page in skipped_pages:
+                reasons[page["reason"]] = reasons.get(page["reason"], 0) + 1
+            logger.info(f"跳过的页面数: {len(skipped_pages)} ({', '.join(f'{reason}: {count}' for reason, count in reasons.items())})")
+            for page in skipped_pages[:SUMMARY_MAX_LISTED_PAGES]:
+                logger.info(f"  已跳过: {Path(page['pdf']).name} 第 {page['page']} 页 ({page['reason']})")
+            if len(skipped_pages) > SUMMARY_MAX_LISTED_PAGES:
+                logger.info(f"  ... 其余 {len(skipped_pages) - SUMMARY_MAX_LISTED_PAGES} 页见任务清单。")
+        if manifest["duplicate_pdfs"]:
+            linked_pages = [page for page in manifest["pages"] if page.get("dedup") == "file"]
+            saved_bytes = 0
+            for page in linked_pages:
+                try:
+                    saved_bytes += os.path.getsize(page["output"]) if page.get("link") == "hardlink" else 0
+                except OSError:
+                    pass
+            logger.info(f"内容重复的PDF数: {len(manifest['duplicate_pdfs'])}，免于渲染的页面数: {len(linked_pages)}，"
+                        f"硬链接节省的存储: {saved_bytes / 1024 / 1024:.2f} MB")
+        failed_pages = manifest["failed_pages"]
+        if failed_pages:
+            logger.warning(f"失败的页面数: {len(failed_pages)}")
+            for page in failed_pages[:SUMMARY_MAX_LISTED_PAGES]:
+                page_label = f"第 {page['page']} 页" if page["page"] else "文件信息"
+                logger.warning(f"  失败: {Path(page['pdf']).name} {page_label} ({page['reason']})")
+            if len(failed_pages) > SUMMARY_MAX_LISTED_PAGES:
+                logger.warning(f"  ... 其余 {len(failed_pages) - SUMMARY_MAX_LISTED_PAGES} 页见任务清单。")
+        if manifest["quarantined_pdfs"]:
+            logger.warning(f"因处于隔离列表而跳过的PDF数: {len(manifest['quarantined_pdfs'])}")
+        metrics = manifest.get("metrics")
+        if metrics and metrics["pages_completed"]:
+            concurrency = metrics["concurrency"]
+            adjustments = sum(1 for decision in concurrency["decisions"] if decision["action"] != "hold")
+            logger.info(f"处理速度: {metrics['pages_per_sec']} 页/秒 ({metrics['pages_completed']} 页，{metrics['elapsed_seconds']} 秒)，"
+                        f"并发数: {concurrency['final_workers']}" + (f"，自动调整 {adjustments} 次" if concurrency["adaptive"] else ""))
+        repeated_pages = sum(1 for page in manifest["pages"] if page.get("dedup") == "page")
+        if repeated_pages:
+            logger.info(f"与已保存页面内容相同、以链接输出而未重新编码的页面数: {repeated_pages}")
+    if generated_count > 0 or (dry_run and pdfs_processed_count > 0):
+        logger.info(f"所有输出已保存/计划保存在根目录: {Path(output_dir_base).resolve()}")
+
+def allocate_estimate_samples(strata_sizes, num_samples):
+    """按各层页数比例分配抽样数，每层至少1页且不超过该层页数。"""
+    total = sum(strata_sizes)
+    return [min(size, max(1, round(num_samples * size / total))) for size in strata_sizes]
+
+def estimate_total(strata, z=ESTIMATE_CONFIDENCE_Z):
+    """分层抽样的总量估计。strata 为 [(该层页数, [样本值...])]，返回 (估计值, 下限, 上限)。
+
+    只抽到1个样本的层无法计算层内方差，使用全部样本的方差代替。
+    """
+    all_values = [value for _, values in strata for value in values]
+    pooled_variance = _sample_variance(all_values)
+    total = 0.0
+    variance = 0.0
+    for size, values in strata:
+        n = len(values)
+        mean = sum(values) / n
+        total += size * mean
+        stratum_variance = _sample_variance(values) if n > 1 else pooled_variance
+        variance += size * size * (1 - n / size) * stratum_variance / n
+    margin = z * math.sqrt(variance)
+    return total, max(0.0, total - margin), total + margin
+
+def _sample_variance(values):
+    if len(values) < 2:
+        return 0.0
+    mean = sum(values) / len(values)
+    return sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+
+def _peak_child_rss_mb():
+    """已结束的子进程（渲染器）中的最大RSS（MB），无法获取时返回 None。"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max_rss / 1024 / 1024 if platform.system() == "Darwin" else max_rss / 1024
+
+def estimate_conversion(pdf_files_to_process, settings, input_root_dir=None, stop_event=None):
+    """以当前设置抽样渲染部分页面，估算整个任务的耗时、输出大小和内存峰值，不写入任何输出。
+
+    PDF按待转换页数排序后分为若干层，各层按页数比例随机抽取页面（分层抽样），
+    总量估计附带95%置信区间。返回估算结果字典；没有可转换的页面或估算被终止时返回 None。
+    设置了 shard 时只估算本分片的页面，分片按相对 input_root_dir 的路径划分，与实际转换一致。
+    页面去重、PDF去重和隔离列表不计入估算，实际耗时可能更短。
+    """
+    options = {key: settings.get(key) for key in IMAGE_OPTION_KEYS}
+    num_samples = max(1, int(settings.get("estimate_samples") or DEFAULT_CONFIG["estimate_samples"]))
+    shard = parse_shard(settings.get("shard"))
+
+    population = [] # (pdf_path, total_pages, pages_list)
+    for pdf_path in pdf_files_to_process:
+        if stop_event and stop_event.is_set():
+            logger.info("估算被用户终止。")
+            return None
+        total_pages = read_pdf_page_count(pdf_path, get_option(options, "page_timeout") or None)
+        pages_list = parse_page_ranges(settings["pages"], total_pages) if total_pages else None
+        if pages_list and shard:
+            pages_list = [page_num for page_num in pages_list
+                          if page_in_shard(pdf_path, page_num, shard, input_root_dir)]
+        if pages_list:
+            population.append((pdf_path, total_pages, pages_list))
+    total_pages_to_convert = sum(len(pages_list) for _, _, pages_list in population)
+    if not total_pages_to_convert:
+        logger.warning("没有可转换的页面，无法估算。")
+        return None
+
+    # 每层至少分到约2个样本，才能估计层内方差
+    population.sort(key=lambda item: len(item[2]))
+    num_strata = max(1, min(len(population), num_samples // 2))
+    strata = [population[i * len(population) // num_strata:(i + 1) * len(population) // num_strata]
+              for i in range(num_strata)]
+    strata_sizes = [sum(len(pages_list) for _, _, pages_list in stratum) for stratum in strata]
+    allocations = allocate_estimate_samples(strata_sizes, num_samples)
+
+    rng = random.Random(ESTIMATE_RANDOM_SEED)
+    sample_manifest = new_job_manifest(settings)
+    seconds_by_stratum = []
+    bytes_by_stratum = []
+    sample_count = 0
+    with tempfile.TemporaryDirectory(prefix="alchemist_estimate_") as temp_dir:
+        for stratum, size, allocation in zip(strata, strata_sizes, allocations):
+            offsets = []
+            running_total = 0
+            for _, _, pages_list in stratum:
+                offsets.append(running_total)
+                running_total += len(pages_list)
+            seconds_values = []
+            bytes_values = []
+            for index in sorted(rng.sample(range(size), allocation)):
+                pdf_position = bisect.bisect_right(offsets, index) - 1
+                pdf_path, total_pages, pages_list = stratum[pdf_position]
+                page_num = pages_list[index - offsets[pdf_position]]
+                sample_count += 1
+                output_png_path = Path(temp_dir) / f"sample_{sample_count}.png"
+                logger.info(f"估算抽样 {sample_count}/{sum(allocations)}: '{pdf_path.name}' 第 {page_num} 页")
+                started = time.perf_counter()
+                try:
+                    output_path = convert_page(pdf_path, page_num, total_pages, output_png_path, settings["dpi"],
+                                               settings["grayscale"], settings["rotate"], stop_event=stop_event,
+                                               options=options, manifest=sample_manifest)
+                except RenderCancelled as e:
+                    logger.info(f"{e}估算被终止。")
+                    return None
+                seconds_values.append(time.perf_counter() - started)
+                bytes_values.append(os.path.getsize(output_path) if output_path else 0)
+                if output_path:
+                    os.remove(output_path)
+            seconds_by_stratum.append((size, seconds_values))
+            bytes_by_stratum.append((size, bytes_values))
+
+    workers = max(1, int(settings.get("workers") or 1))
+    # 渲染受CPU限制，超过核心数的并发不会缩短总耗时
+    effective_workers = min(workers, os.cpu_count() or 1)
+    render_seconds = estimate_total(seconds_by_stratum)
+    output_bytes = estimate_total(bytes_by_stratum)
+    peak_renderer_mb = _peak_child_rss_mb()
+    process_rss_mb = sample_system_metrics()["rss_mb"]
+    peak_memory_mb = None
+    if peak_renderer_mb is not None:
+        peak_memory_mb = peak_renderer_mb * workers + (process_rss_mb or 0)
+
+    def rounded(values, digits=1):
+        estimate, low, high = values
+        return {"estimate": round(estimate, digits), "low": round(low, digits), "high": round(high, digits)}
+
+    return {
+        "pdf_files": len(population),
+        "total_pages": total_pages_to_convert,
+        "sampled_pages": sample_count,
+        "strata": num_strata,
+        "failed_samples": len(sample_manifest["failed_pages"]),
+        "skipped_samples": len(sample_manifest["skipped_pages"]),
+        "workers": workers,
+        "effective_workers": effective_workers,
+        "confidence": 0.95,
+        "render_seconds": rounded(render_seconds),
+        "wall_seconds": rounded([value / effective_workers for value in render_seconds]),
+        "output_bytes": rounded(output_bytes, 0),
+        "peak_renderer_memory_mb": round(peak_renderer_mb, 1) if peak_renderer_mb is not None else None,
+        "peak_memory_mb": round(peak_memory_mb, 1) if peak_memory_mb is not None else None,
+    }
+
+def log_estimate_summary(estimate):
+    wall = estimate["wall_seconds"]
+    output = estimate["output_bytes"]
+    logger.info("\n--- 任务估算 ---")
+    logger.info(f"待转换页面总数: {estimate['total_pages']} (PDF文件数: {estimate['pdf_files']})，"
+                f"抽样渲染 {estimate['sampled_pages']} 页，分 {estimate['strata']} 层")
+    logger.info(f"预计耗时 ({estimate['workers']} 个并发，有效 {estimate['effective_workers']} 个): "
+                f"{wall['estimate'] / 60:.1f} 分钟 (95%置信区间 {wall['low'] / 60:.1f} - {wall['high'] / 60:.1f} 分钟)")
+    logger.info(f"预计输出大小: {output['estimate'] / 1024 / 1024:.1f} MB "
+                f"(95%置信区间 {output['low'] / 1024 / 1024:.1f} - {output['high'] / 1024 / 1024:.1f} MB)")
+    if estimate["peak_memory_mb"] is not None:
+        logger.info(f"预计内存峰值: {estimate['peak_memory_mb']:.0f} MB (单个渲染进程峰值 {estimate['peak_renderer_memory_mb']:.0f} MB)")
+    if estimate["failed_samples"] or estimate["skipped_samples"]:
+        logger.warning(f"抽样页面中失败 {estimate['failed_samples']} 页，跳过 {estimate['skipped_samples']} 页，估算已计入。")
+
 def discover_pdf_files(input_path_obj, recursive, include_keywords_list, exclude_keywords_list, regex_filter_str):
     pdf_files_to_process = []
     regex = None
@@ -298,6 +1873,64 @@ def check_filename_filters(filename, include_keywords, exclude_keywords, regex_o
             return False
     return True
 
+def build_argument_parser(add_help=True):
+    """命令行参数定义，分布式协调进程（render_coordinator.py）复用同一组参数。"""
+    parser = argparse.ArgumentParser(description="Convert PDF to PNG images", add_help=add_help)
+    parser.add_argument("--input_path", help="Path to PDF file or directory (required unless --plan is given)")
+    parser.add_argument("--output_dir", help="Path to output directory (required unless --plan is given)")
+    parser.add_argument("--pages", default="first", help="Pages to convert (e.g., first, all, 1, 2-5)")
+    parser.add_argument("--dpi", type=int, default=300, help="DPI of output images")
+    parser.add_argument("--prefix", default="", help="Prefix for output filenames")
+    parser.add_argument("--output_filename_template", default="{pdf_name}_page_{page_num}.png", help="Template for output filenames")
+    parser.add_argument("--post_export_action", default="open_file", help="Action after export (open_file, open_folder, both, none)")
+    parser.add_argument("--recursive", action="store_true", help="Recursively process subdirectories")
+    parser.add_argument("--preserve_structure", action="store_true", help="Preserve directory structure (recursive only)")
+    parser.add_argument("--include_keywords", default="", help="Comma-separated keywords to include in filenames")
+    parser.add_argument("--exclude_keywords", default="", help="Comma-separated keywords to exclude in filenames")
+    parser.add_argument("--regex_filter", default="", help="Regular expression to filter filenames")
+    parser.add_argument("--grayscale", action="store_true", help="Convert to grayscale")
+    parser.add_argument("--rotate", type=int, default=0, help="Rotation angle")
+    parser.add_argument("--output_mode", default="full", choices=OUTPUT_MODES, help="Output image mode (full, bilevel, palette, auto)")
+    parser.add_argument("--bilevel_threshold", type=int, default=128, help="Threshold (0-255) for bilevel output")
+    parser.add_argument("--bilevel_dither", action="store_true", help="Use Floyd-Steinberg dithering for bilevel output")
+    parser.add_argument("--palette_colors", type=int, default=16, help="Maximum colours for palette output")
+    parser.add_argument("--auto_color", action="store_true", help="Save pages without colour as single-channel grayscale")
+    parser.add_argument("--color_tolerance", type=int, default=12, help="Maximum channel difference for a page to count as grey")
+    parser.add_argument("--skip_blank", action="store_true", help="Skip pages that are (nearly) blank")
+    parser.add_argument("--blank_ink_ratio", type=float, default=0.0005, help="Maximum ink coverage for a page to count as blank")
+    parser.add_argument("--blank_probe_dpi", type=int, default=24, help="DPI of the blank-page probe render (0 to measure the full render)")
+    parser.add_argument("--autocrop", action="store_true", help="Trim white page margins before saving")
+    parser.add_argument("--autocrop_tolerance", type=int, default=10, help="Grey level difference from white still treated as margin")
+    parser.add_argument("--page_timeout", type=int, default=600, help="Per-page render timeout in seconds (0 for no limit)")
+    parser.add_argument("--render_memory_limit_mb", type=int, default=0, help="Memory limit for each renderer process in MB (Linux only, 0 for no limit)")
+    parser.add_argument("--no_quarantine", dest="quarantine", action="store_false", help="Do not skip PDFs that repeatedly crashed the renderer")
+    parser.add_argument("--quarantine_file", default="", help="Path of the persistent quarantine list")
+    parser.add_argument("--workers", type=int, default=1, help="Number of pages rendered concurrently")
+    parser.add_argument("--adaptive_workers", action="store_true", help="Tune the number of workers from observed throughput and memory pressure")
+    parser.add_argument("--min_workers", type=int, default=1, help="Lower bound for adaptive workers")
+    parser.add_argument("--max_workers", type=int, default=0, help="Upper bound for adaptive workers (0 for CPU count)")
+    parser.add_argument("--dedup_pages", action="store_true", help="Encode identical rendered pages once and hardlink the repeats")
+    parser.add_argument("--dedup_files", action="store_true", help="Render PDFs with identical content once and hardlink the outputs")
+    parser.add_argument("--autocrop_padding", type=int, default=16, help="Pixels of margin kept around the content")
+    #parser.add_argument("--overwrite", action="store_true", help="Overwrite existing PNG files") # Removed overwrite
+    parser.add_argument("--dry_run", action="store_true", help="Dry run mode")
+    parser.add_argument("--estimate", action="store_true", help="Render a stratified sample of pages and estimate time, output size and peak memory without converting")
+    parser.add_argument("--estimate_samples", type=int, default=30, help="Number of pages rendered by --estimate")
+    parser.add_argument("--write_plan", default="", help="With --dry_run, write the execution plan (JSONL) to this file")
+    parser.add_argument("--plan", default="", help="Execute a plan written by --write_plan, skipping discovery and filtering")
+    parser.add_argument("--metadata_cache_file", default="", help="Path of the PDF metadata cache used for planning")
+    parser.add_argument("--shard", default="", help="Only process shard i of N (e.g. 2/8); pages are partitioned by hashing PDF path and page number")
+    parser.add_argument("--verbose_level", default="INFO", help="Verbose level (DEBUG, INFO, WARNING, ERROR, CRITICAL)")
+    return parser
+
+def validate_args(parser, args):
+    if not args.plan and not (args.input_path and args.output_dir):
+        parser.error("--input_path and --output_dir are required unless --plan is given")
+    try:
+        parse_shard(args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+
 if __name__ == "__main__":
     # 备份并重定向stderr以消除macOS警告
     original_stderr = sys.stderr
@@ -305,30 +1938,33 @@ if __name__ == "__main__":
     try:
         find_and_set_bundled_poppler_path()
 
-        parser = argparse.ArgumentParser(description="Convert PDF to PNG images")
-        parser.add_argument("--input_path", required=True, help="Path to PDF file or directory")
-        parser.add_argument("--output_dir", required=True, help="Path to output directory")
-        parser.add_argument("--pages", default="first", help="Pages to convert (e.g., first, all, 1, 2-5)")
-        parser.add_argument("--dpi", type=int, default=300, help="DPI of output images")
-        parser.add_argument("--prefix", default="", help="Prefix for output filenames")
-        parser.add_argument("--output_filename_template", default="{pdf_name}_page_{page_num}.png", help="Template for output filenames")
-        parser.add_argument("--post_export_action", default="open_file", help="Action after export (open_file, open_folder, both, none)")
-        parser.add_argument("--recursive", action="store_true", help="Recursively process subdirectories")
-        parser.add_argument("--preserve_structure", action="store_true", help="Preserve directory structure (recursive only)")
-        parser.add_argument("--include_keywords", default="", help="Comma-separated keywords to include in filenames")
-        parser.add_argument("--exclude_keywords", default="", help="Comma-separated keywords to exclude in filenames")
-        parser.add_argument("--regex_filter", default="", help="Regular expression to filter filenames")
-        parser.add_argument("--grayscale", action="store_true", help="Convert to grayscale")
-        parser.add_argument("--rotate", type=int, default=0, help="Rotation angle")
-        #parser.add_argument("--overwrite", action="store_true", help="Overwrite existing PNG files") # Removed overwrite
-        parser.add_argument("--dry_run", action="store_true", help="Dry run mode")
-        parser.add_argument("--verbose_level", default="INFO", help="Verbose level (DEBUG, INFO, WARNING, ERROR, CRITICAL)")
-
+        parser = build_argument_parser()
         args = parser.parse_args()
+        validate_args(parser, args)
 
         # Configure logging level
         logger.setLevel(args.verbose_level.upper())
 
+        if args.plan:
+            plan_header, page_plan = load_conversion_plan(args.plan)
+            if plan_header is None:
+                sys.exit(1)
+            settings = settings_for_plan(plan_header, vars(args))
+            settings["overwrite"] = True # CLI always overwrites
+            output_dir_base = Path(plan_header["output_dir"])
+            input_root_for_structure = Path(plan_header["input_root"]) if plan_header.get("input_root") else None
+            logger.info(f"执行计划 '{args.plan}': {len(page_plan)} 个PDF，{sum(len(pages) for pages in page_plan.values())} 页")
+            manifest = new_job_manifest(settings)
+            generated_paths, pdfs_processed_count = run_conversion_batch(
+                list(page_plan), output_dir_base, settings, input_root_for_structure,
+                stop_event=None, manifest=manifest, page_plan=page_plan
+            )
+            log_conversion_summary(len(page_plan), pdfs_processed_count, len(generated_paths),
+                                   output_dir_base, False, manifest)
+            write_job_manifest(manifest, output_dir_base)
+            logger.info("转换流程结束。")
+            sys.exit(0)
+
         # Process PDF conversion
         input_path_obj = Path(args.input_path)
         output_dir_base = Path(args.output_dir)
@@ -345,31 +1981,25 @@ if __name__ == "__main__":
             sys.exit(0)
 
         logger.info(f"共找到 {len(pdf_files_to_process)} 个符合条件的PDF文件准备处理。")
-        total_pngs_created, pdfs_processed_count = 0, 0
         input_root_for_structure = input_path_obj if input_path_obj.is_dir() else input_path_obj.parent
 
-        for pdf_path in pdf_files_to_process:
-            logger.info(f"开始处理PDF: '{pdf_path.resolve()}'")
-            converted_for_this = convert_single_pdf(
-                pdf_path, output_dir_base, args.pages, args.dpi,
-                True, args.prefix, args.output_filename_template, # Set overwrite to True
-                args.grayscale, args.rotate, args.dry_run,
-                args.preserve_structure, input_root_for_structure,
-                stop_event=None
-            )
-
-            if converted_for_this > 0:
-                total_pngs_created += converted_for_this
-                pdfs_processed_count += 1
-            logger.info(f"PDF '{pdf_path.name}' 处理完成，{'计划' if args.dry_run else '实际'}生成 {converted_for_this} 张图片。")
-
-        summary_action = "计划生成" if args.dry_run else "实际创建/覆盖"
-        logger.info(f"\n--- {'空运行 ' if args.dry_run else ''}转换总结 ---")
-        logger.info(f"扫描的PDF文件总数 (通过筛选后): {len(pdf_files_to_process)}")
-        logger.info(f"至少成功处理一页的PDF文件数: {pdfs_processed_count}")
-        logger.info(f"PNG图片{summary_action}总数: {total_pngs_created}")
-        if total_pngs_created > 0 or (args.dry_run and pdfs_processed_count > 0):
-            logger.info(f"所有输出已保存/计划保存在根目录: {output_dir_base.resolve()}")
+        settings = dict(DEFAULT_CONFIG)
+        settings.update(vars(args))
+        settings["overwrite"] = True # CLI always overwrites
+        if args.estimate:
+            estimate = estimate_conversion(pdf_files_to_process, settings, input_root_for_structure)
+            if estimate:
+                log_estimate_summary(estimate)
+            sys.exit(0)
+        manifest = new_job_manifest(settings)
+        generated_paths, pdfs_processed_count = run_conversion_batch(
+            pdf_files_to_process, output_dir_base, settings, input_root_for_structure,
+            stop_event=None, manifest=manifest
+        )
+        log_conversion_summary(len(pdf_files_to_process), pdfs_processed_count, len(generated_paths),
+                               output_dir_base, args.dry_run, manifest)
+        if not args.dry_run:
+            write_job_manifest(manifest, output_dir_base)
 
         logger.info("转换流程结束。")
 
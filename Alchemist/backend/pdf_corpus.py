@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""生成用于性能测试的合成PDF语料库，不依赖网络、第三方库或现成的PDF文件。
+
+内容由 seed 和规模档位（PROFILES）决定，同一 seed 和档位在任何机器上生成的文件逐字节相同。
+各类别放在同名子目录下:
+  text     大量文字的页面
+  vector   大量矢量路径（直线、贝塞尔曲线、填充）的页面
+  images   内嵌高分辨率图像的页面
+  huge     超大页面尺寸（最大为PDF允许的 14400pt）
+  long     数千页的长文档
+  tiny     大量单页小文件
+  corrupt  损坏的文件（截断、空文件、非PDF内容、错误的交叉引用表等）
+根目录下的 CORPUS_MANIFEST 记录每个文件的类别、页数、大小和SHA-256，以及是否为有效PDF。
+"""
+
+import re
+import sys
+import json
+import zlib
+import random
+import hashlib
+import argparse
+from pathlib import Path
+
+CORPUS_MANIFEST = "corpus.json"
+CORPUS_VERSION = 1
+CATEGORIES = ("text", "vector", "images", "huge", "long", "tiny", "corrupt")
+# 档位 -> 类别 -> 参数；count 为文件数，pages 为每个文件的页数
+PROFILES = {
+    "smoke": {
+        "text": {"count": 2, "pages": 5},
+        "vector": {"count": 2, "pages": 3, "paths": 300},
+        "images": {"count": 2, "pages": 2, "image_size": 800},
+        "huge": {"count": 1, "pages": 1, "sizes": [(2384, 3370)]},
+        "long": {"count": 1, "pages": 200},
+        "tiny": {"count": 50},
+        "corrupt": {"count": 6},
+    },
+    "standard": {
+        "text": {"count": 10, "pages": 20},
+        "vector": {"count": 6, "pages": 10, "paths": 2000},
+        "images": {"count": 6, "pages": 4, "image_size": 2400},
+        "huge": {"count": 2, "pages": 2, "sizes": [(2384, 3370), (14400, 14400)]},
+        "long": {"count": 2, "pages": 2000},
+        "tiny": {"count": 1000},
+        "corrupt": {"count": 12},
+    },
+    "stress": {
+        "text": {"count": 40, "pages": 50},
+        "vector": {"count": 20, "pages": 30, "paths": 8000},
+        "images": {"count": 20, "pages": 8, "image_size": 4000},
+        "huge": {"count": 4, "pages": 4, "sizes": [(2384, 3370), (7200, 7200), (14400, 14400), (14400, 3600)]},
+        "long": {"count": 4, "pages": 5000},
+        "tiny": {"count": 10000},
+        "corrupt": {"count": 40},
+    },
+}
+DEFAULT_PROFILE = "smoke"
+LETTER_SIZE = (612, 792)
+CORRUPTIONS = ("truncated", "empty", "garbage", "header_only", "bad_xref", "no_trailer")
+SYLLABLES = ("al", "chem", "ist", "pdf", "ren", "der", "pa", "ge", "con", "vert", "im", "age", "lo", "rem",
+             "ip", "sum", "do", "lor", "sit", "a", "met", "ta", "ble", "in", "dex", "da", "ta", "ex", "port")
+
+class PdfWriter:
+    """按对象逐个构造最小的PDF（1.7，无对象流），不写入时间戳等随运行变化的内容。"""
+
+    def __init__(self):
+        self.objects = []
+
+    def reserve(self):
+        self.objects.append(None)
+        return len(self.objects)
+
+    def set(self, number, body):
+        self.objects[number - 1] = body if isinstance(body, bytes) else body.encode("latin-1")
+
+    def add(self, body):
+        number = self.reserve()
+        self.set(number, body)
+        return number
+
+    def add_stream(self, dictionary, data, compress=True):
+        if compress:
+            data = zlib.compress(data, 6)
+            dictionary += " /Filter /FlateDecode"
+        return self.add(f"<< {dictionary} /Length {len(data)} >>\nstream\n".encode("latin-1") + data
+                        + b"\nendstream")
+
+    def to_bytes(self, root):
+        output = bytearray(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(self.objects, start=1):
+            offsets.append(len(output))
+            output += f"{number} 0 obj\n".encode("latin-1") + body + b"\nendobj\n"
+        xref_offset = len(output)
+        output += f"xref\n0 {len(self.objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+        for offset in offsets:
+            output += f"{offset:010d} 00000 n \n".encode("latin-1")
+        output += (f"trailer\n<< /Size {len(self.objects) + 1} /Root {root} 0 R >>\n"
+                   f"startxref\n{xref_offset}\n%%EOF\n").encode("latin-1")
+        return bytes(output)
+
+def random_words(rng, count):
+    return " ".join("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))) for _ in range(count))
+
+# 正文从固定词表中抽词，逐词拼音节在数千页的文档上太慢
+WORD_POOL = random_words(random.Random(0), 2000).split()
+
+def text_content(rng, width, height, title=None):
+    """整页文字：两栏、约每栏 60 行的正文。"""
+    ops = ["BT /F1 16 Tf 50 {} Td ({}) Tj ET".format(height - 50, title or random_words(rng, 4))]
+    column_width = (width - 120) / 2
+    chars_per_line = int(column_width / 5)
+    for column in range(2):
+        ops.append(f"BT /F2 9 Tf 11 TL {50 + column * (column_width + 20):.1f} {height - 80} Td")
+        for _ in range(int((height - 120) / 11)):
+            ops.append(f"({' '.join(rng.choices(WORD_POOL, k=24))[:chars_per_line]}) '")
+        ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+def vector_content(rng, width, height, paths):
+    """随机的折线、贝塞尔曲线和填充矩形，颜色和线宽各不相同。"""
+    ops = []
+    for _ in range(paths):
+        ops.append(f"{rng.random():.3f} {rng.random():.3f} {rng.random():.3f} RG {rng.uniform(0.2, 4):.2f} w")
+        kind = rng.random()
+        x, y = rng.uniform(0, width), rng.uniform(0, height)
+        if kind < 0.4:
+            points = " ".join(f"{rng.uniform(0, width):.1f} {rng.uniform(0, height):.1f} l"
+                              for _ in range(rng.randint(2, 8)))
+            ops.append(f"{x:.1f} {y:.1f} m {points} S")
+        elif kind < 0.8:
+            curve = " ".join(f"{rng.uniform(0, width):.1f} {rng.uniform(0, height):.1f}" for _ in range(3))
+            ops.append(f"{x:.1f} {y:.1f} m {curve} c S")
+        else:
+            ops.append(f"{rng.random():.3f} {rng.random():.3f} {rng.random():.3f} rg "
+                       f"{x:.1f} {y:.1f} {rng.uniform(5, width / 4):.1f} {rng.uniform(5, height / 4):.1f} re B")
+    return "\n".join(ops).encode("latin-1")
+
+def image_pixels(rng, size):
+    """size x size 的RGB像素：平滑渐变的纹理行与少量噪声行交替，压缩率接近照片而非纯色或纯噪声。"""
+    row_bytes = size * 3
+    period = rng.randint(64, 512)
+    channel_steps = [rng.randint(1, 7) for _ in range(3)]
+    texture = bytes((i // 3 * channel_steps[i % 3] * 256 // period) & 255 for i in range(row_bytes * 2))
+    rows = []
+    for _ in range(size):
+        if rng.random() < 0.05:
+            rows.append(rng.getrandbits(row_bytes * 8).to_bytes(row_bytes, "little"))
+        else:
+            offset = rng.randrange(row_bytes // 3) * 3
+            rows.append(texture[offset:offset + row_bytes])
+    return b"".join(rows)
+
+def build_pdf(rng, kind, page_count, page_size=LETTER_SIZE, paths=500, image_size=1200):
+    """生成 page_count 页、内容类型为 kind（text/vector/images/tiny）的PDF，返回文件内容。"""
+    writer = PdfWriter()
+    catalog = writer.reserve()
+    pages_root = writer.reserve()
+    fonts = writer.add("<< /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >> "
+                       "/F2 << /Type /Font /Subtype /Type1 /BaseFont /Times-Roman >> >> >>")
+    width, height = page_size
+    kids = []
+    for page_num in range(1, page_count + 1):
+        title = f"{kind} page {page_num} of {page_count}"
+        resources = f"{fonts} 0 R"
+        if kind == "tiny":
+            content = f"BT /F1 12 Tf 50 {height - 60} Td ({title}) Tj ET".encode("latin-1")
+        elif kind == "vector":
+            content = (vector_content(rng, width, height, paths)
+                       + f"\nBT /F1 16 Tf 50 {height - 40} Td ({title}) Tj ET".encode("latin-1"))
+        elif kind == "images":
+            image = writer.add_stream(f"/Type /XObject /Subtype /Image /Width {image_size} /Height {image_size} "
+                                      "/ColorSpace /DeviceRGB /BitsPerComponent 8", image_pixels(rng, image_size))
+            resources = (f"<< /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >> >> "
+                         f"/XObject << /Im1 {image} 0 R >> >>")
+            side = min(width, height) - 100
+            content = (f"q {side} 0 0 {side} 50 {height - side - 70} cm /Im1 Do Q\n"
+                       f"BT /F1 16 Tf 50 {height - 40} Td ({title}) Tj ET").encode("latin-1")
+        else:
+            content = text_content(rng, width, height, title)
+        stream = writer.add_stream("", content)
+        kids.append(writer.add(f"<< /Type /Page /Parent {pages_root} 0 R /MediaBox [0 0 {width} {height}] "
+                               f"/Resources {resources} /Contents {stream} 0 R >>"))
+    writer.set(pages_root, f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>")
+    writer.set(catalog, f"<< /Type /Catalog /Pages {pages_root} 0 R >>")
+    return writer.to_bytes(catalog)
+
+def corrupt_pdf(rng, corruption):
+    """生成一种损坏的PDF：部分可被 poppler 修复，部分完全无法读取。"""
+    if corruption == "empty":
+        return b""
+    if corruption == "header_only":
+        return b"%PDF-1.7\n"
+    if corruption == "garbage":
+        return rng.getrandbits(8 * 4096).to_bytes(4096, "little")
+    data = build_pdf(rng, "text", rng.randint(2, 5))
+    if corruption == "truncated":
+        return data[:rng.randint(len(data) // 4, len(data) * 3 // 4)]
+    if corruption == "no_trailer":
+        return data[:data.rindex(b"xref\n")]
+    # bad_xref：交叉引用表中的偏移量全部错位
+    xref_start = data.rindex(b"xref\n")
+    shift = rng.randint(1, 64)
+    xref = re.sub(rb"(\d{10}) 00000 n", lambda m: b"%010d 00000 n" % (int(m.group(1)) + shift), data[xref_start:])
+    return data[:xref_start] + xref
+
+def file_rng(seed, category, index):
+    # 每个文件使用独立的随机数序列，修改一个类别的数量不影响其他文件
+    return random.Random(f"{seed}:{category}:{index}")
+
+def iter_corpus_files(seed, profile):
+    """按顺序生成 (相对路径, 类别, 页数, 是否有效, 内容)。"""
+    settings = PROFILES[profile]
+    for category in CATEGORIES:
+        params = settings.get(category)
+        if not params:
+            continue
+        for index in range(params["count"]):
+            rng = file_rng(seed, category, index)
+            relative_path = f"{category}/{category}_{index:05d}.pdf"
+            if category == "corrupt":
+                corruption = CORRUPTIONS[index % len(CORRUPTIONS)]
+                yield f"{category}/{corruption}_{index:05d}.pdf", category, 0, False, corrupt_pdf(rng, corruption)
+            elif category == "huge":
+                page_size = params["sizes"][index % len(params["sizes"])]
+                yield relative_path, category, params["pages"], True, build_pdf(
+                    rng, rng.choice(("text", "vector")), params["pages"], page_size, paths=200)
+            elif category == "long":
+                yield relative_path, category, params["pages"], True, build_pdf(rng, "text", params["pages"])
+            else:
+                page_count = params.get("pages", 1)
+                yield relative_path, category, page_count, True, build_pdf(
+                    rng, category, page_count, paths=params.get("paths", 500),
+                    image_size=params.get("image_size", 1200))
+
+def generate_corpus(corpus_dir, seed=0, profile=DEFAULT_PROFILE):
+    """在 corpus_dir 下生成语料库并写入清单，返回清单。"""
+    if profile not in PROFILES:
+        raise ValueError(f"unknown profile '{profile}', expected one of {', '.join(PROFILES)}")
+    corpus_dir = Path(corpus_dir)
+    files = []
+    for relative_path, category, page_count, valid, data in iter_corpus_files(seed, profile):
+        path = corpus_dir / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        files.append({"path": relative_path, "category": category, "pages": page_count, "valid": valid,
+                      "bytes": len(data), "sha256": hashlib.sha256(data).hexdigest()})
+    manifest = {"version": CORPUS_VERSION, "seed": seed, "profile": profile, "files": files}
+    (corpus_dir / CORPUS_MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+def load_corpus_manifest(corpus_dir):
+    path = Path(corpus_dir) / CORPUS_MANIFEST
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def ensure_corpus(corpus_dir, seed=0, profile=DEFAULT_PROFILE):
+    """corpus_dir 中已有相同版本、seed 和档位且文件与清单一致（见 verify_corpus）的语料库时返回其清单，
+    否则重新生成，基线不会在缺失或被修改的语料库上测得。"""
+    manifest = load_corpus_manifest(corpus_dir)
+    if manifest and (manifest.get("version"), manifest.get("seed"), manifest.get("profile")) == (
+            CORPUS_VERSION, seed, profile):
+        mismatched = verify_corpus(corpus_dir)
+        if not mismatched:
+            return manifest
+        print(f"{len(mismatched)} corpus file(s) missing or modified (e.g. {mismatched[0]}), regenerating ...",
+              file=sys.stderr)
+    return generate_corpus(corpus_dir, seed, profile)
+
+def verify_corpus(corpus_dir):
+    """按清单检查文件是否缺失或被修改，返回有问题的相对路径列表。"""
+    manifest = load_corpus_manifest(corpus_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"{Path(corpus_dir) / CORPUS_MANIFEST} not found")
+    mismatched = []
+    for entry in manifest["files"]:
+        path = Path(corpus_dir) / entry["path"]
+        if not path.exists() or hashlib.sha256(path.read_bytes()).hexdigest() != entry["sha256"]:
+            mismatched.append(entry["path"])
+    return mismatched
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic PDF corpus for benchmarks")
+    parser.add_argument("corpus_dir", help="Directory to write the corpus to")
+    parser.add_argument("--profile", choices=tuple(PROFILES), default=DEFAULT_PROFILE, help="Corpus size profile")
+    parser.add_argument("--seed", type=int, default=0, help="Seed; the same seed and profile give identical files")
+    parser.add_argument("--verify", action="store_true", help="Check an existing corpus against its manifest instead")
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatched = verify_corpus(args.corpus_dir)
+        for path in mismatched:
+            print(f"Mismatch: {path}")
+        raise SystemExit(1 if mismatched else 0)
+    manifest = generate_corpus(args.corpus_dir, args.seed, args.profile)
+    total_bytes = sum(entry["bytes"] for entry in manifest["files"])
+    total_pages = sum(entry["pages"] for entry in manifest["files"])
+    print(f"Generated {len(manifest['files'])} files, {total_pages} pages, {total_bytes / (1024 * 1024):.1f} MB "
+          f"in {args.corpus_dir}")
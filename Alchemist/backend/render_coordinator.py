@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import subprocess
+import collections
+import urllib.request
+import urllib.error
+from pathlib import Path
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+import pdf_converter
+from pdf_converter import logger
+
+DEFAULT_COORDINATOR_PORT = 5004
+# 工作进程发送心跳的间隔（秒）；超过 WORKER_TIMEOUT 秒未收到心跳的工作进程视为已退出，其租约重新分配
+HEARTBEAT_INTERVAL = 2.0
+WORKER_TIMEOUT = 10.0
+# 租约期限在单页超时（试渲染 + 正式渲染）之外留出的余量（秒），作为心跳之外的兜底
+LEASE_GRACE_SECONDS = 30
+# 同一页面的租约因工作进程退出而失效达到该次数后，视为该页面会导致渲染器崩溃，不再分配
+MAX_LEASE_ATTEMPTS = 3
+# 没有可分配的任务时，工作进程再次申请租约前等待的时间（秒）
+IDLE_RETRY_SECONDS = 1.0
+# 工作进程连接协调进程失败时的重试间隔和最长等待时间（秒）
+CONNECT_RETRY_INTERVAL = 1.0
+CONNECT_RETRY_TIMEOUT = 30.0
+# 协调进程输出进度的间隔（秒）
+PROGRESS_LOG_INTERVAL = 10.0
+
+class PageTaskQueue:
+    """协调进程中的页面任务队列。
+
+    任务以租约形式分配给工作进程；工作进程停止发送心跳或租约过期后，其持有的任务重新排到队首。
+    每个任务只接受第一次完成报告，重新分配后原工作进程迟到的报告会被忽略。
+    """
+
+    def __init__(self, pages, page_timeout=None):
+        self.lock = threading.Lock()
+        self.finished_event = threading.Event()
+        self.tasks = []
+        self.pending = collections.deque()
+        self.workers = {}
+        self.results = [] # 已完成任务的报告，按完成顺序
+        self.cancelled = False
+        self.lease_seconds = page_timeout * 2 + LEASE_GRACE_SECONDS if page_timeout else None
+        for task_id, page in enumerate(pages):
+            self.tasks.append({"id": task_id, "pdf": page["pdf"], "page": page["page"],
+                               "total_pages": page["total_pages"], "output": page["output"],
+                               "state": "pending", "attempts": 0, "worker": None, "lease_expires": None})
+            self.pending.append(task_id)
+        if not self.tasks:
+            self.finished_event.set()
+
+    def _touch_worker(self, worker_id, now):
+        worker = self.workers.setdefault(worker_id, {"first_seen": now, "completed": 0, "leases": set()})
+        worker["last_seen"] = now
+        worker["alive"] = True
+        return worker
+
+    def _release(self, task, reason):
+        """将租约失效的任务重新排队；失效次数过多时直接记为失败。"""
+        worker = self.workers.get(task["worker"])
+        if worker:
+            worker["leases"].discard(task["id"])
+        task.update(worker=None, lease_expires=None)
+        if task["attempts"] >= MAX_LEASE_ATTEMPTS:
+            task["state"] = "failed"
+            message = f"工作进程在渲染该页时已 {task['attempts']} 次退出或超时 ({reason})"
+            logger.error(f"'{Path(task['pdf']).name}' 第 {task['page']} 页: {message}，不再重新分配。")
+            self.results.append({"task_id": task["id"], "output": None, "pages": [], "skipped_pages": [],
+                                 "failed_pages": [{"pdf": task["pdf"], "page": task["page"],
+                                                   "reason": "crash", "message": message}]})
+        else:
+            task["state"] = "pending"
+            self.pending.appendleft(task["id"])
+            logger.warning(f"'{Path(task['pdf']).name}' 第 {task['page']} 页的租约已失效 ({reason})，重新排队。")
+
+    def reap(self, now=None):
+        """回收已退出的工作进程和已过期的租约。"""
+        now = now or time.monotonic()
+        with self.lock:
+            for worker_id, worker in self.workers.items():
+                if worker["alive"] and now - worker["last_seen"] > WORKER_TIMEOUT:
+                    worker["alive"] = False
+                    logger.warning(f"工作进程 '{worker_id}' 已 {now - worker['last_seen']:.0f} 秒没有心跳，视为已退出。")
+                    for task_id in list(worker["leases"]):
+                        self._release(self.tasks[task_id], f"工作进程 {worker_id} 无响应")
+            for task in self.tasks:
+                if task["state"] == "leased" and task["lease_expires"] and now > task["lease_expires"]:
+                    self._release(task, "租约过期")
+            self._check_finished()
+
+    def heartbeat(self, worker_id):
+        with self.lock:
+            self._touch_worker(worker_id, time.monotonic())
+
+    def lease(self, worker_id, max_tasks=1):
+        """为工作进程分配最多 max_tasks 个任务。"""
+        self.reap()
+        now = time.monotonic()
+        leased = []
+        with self.lock:
+            worker = self._touch_worker(worker_id, now)
+            while self.pending and len(leased) < max_tasks and not self.cancelled:
+                task = self.tasks[self.pending.popleft()]
+                task.update(state="leased", worker=worker_id, attempts=task["attempts"] + 1,
+                            lease_expires=now + self.lease_seconds if self.lease_seconds else None)
+                worker["leases"].add(task["id"])
+                leased.append({key: task[key] for key in ("id", "pdf", "page", "total_pages", "output")})
+        return leased
+
+    def complete(self, worker_id, report):
+        """记录任务完成报告，返回报告是否被接受。"""
+        with self.lock:
+            worker = self._touch_worker(worker_id, time.monotonic())
+            task_id = report.get("task_id")
+            if not isinstance(task_id, int) or not 0 <= task_id < len(self.tasks):
+                return False
+            task = self.tasks[task_id]
+            worker["leases"].discard(task_id)
+            if task["state"] in ("done", "failed"):
+                return False
+            if task["worker"] and task["worker"] != worker_id:
+                # 任务已被重新分配，但原工作进程先完成了：以先完成者为准
+                other = self.workers.get(task["worker"])
+                if other:
+                    other["leases"].discard(task_id)
+            if task["state"] == "pending":
+                self.pending.remove(task_id)
+            task.update(state="failed" if report.get("failed_pages") else "done", worker=worker_id,
+                        lease_expires=None)
+            worker["completed"] += 1
+            self.results.append(report)
+            self._check_finished()
+            return True
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            for task_id in self.pending:
+                self.tasks[task_id]["state"] = "cancelled"
+            self.pending.clear()
+            self._check_finished()
+
+    def _check_finished(self):
+        if not self.pending and not any(task["state"] == "leased" for task in self.tasks):
+            self.finished_event.set()
+
+    def is_finished(self):
+        return self.finished_event.is_set()
+
+    def status(self):
+        with self.lock:
+            counts = collections.Counter(task["state"] for task in self.tasks)
+            now = time.monotonic()
+            return {
+                "total": len(self.tasks),
+                "states": dict(counts),
+                "finished": self.finished_event.is_set(),
+                "cancelled": self.cancelled,
+                "workers": {worker_id: {"alive": worker["alive"], "completed": worker["completed"],
+                                        "leases": sorted(worker["leases"]),
+                                        "last_seen_seconds_ago": round(now - worker["last_seen"], 1)}
+                            for worker_id, worker in self.workers.items()},
+            }
+
+def create_coordinator_app(task_queue, settings):
+    app = Flask(__name__)
+    # 发给工作进程的设置只需包含转换相关的项
+    worker_settings = {key: settings.get(key) for key in pdf_converter.DEFAULT_CONFIG if key in settings}
+
+    @app.route('/lease', methods=['POST'])
+    def lease_tasks():
+        data = request.get_json() or {}
+        worker_id = data.get('worker_id')
+        if not worker_id:
+            return jsonify({'error': 'worker_id is required'}), 400
+        tasks = task_queue.lease(worker_id, max(1, int(data.get('max_tasks') or 1)))
+        return jsonify({'tasks': tasks, 'settings': worker_settings if tasks else None,
+                        'done': task_queue.is_finished() or task_queue.cancelled,
+                        'retry_after': IDLE_RETRY_SECONDS}), 200
+
+    @app.route('/complete', methods=['POST'])
+    def complete_task():
+        data = request.get_json() or {}
+        worker_id = data.get('worker_id')
+        if not worker_id:
+            return jsonify({'error': 'worker_id is required'}), 400
+        return jsonify({'accepted': task_queue.complete(worker_id, data)}), 200
+
+    @app.route('/heartbeat', methods=['POST'])
+    def heartbeat():
+        data = request.get_json() or {}
+        if not data.get('worker_id'):
+            return jsonify({'error': 'worker_id is required'}), 400
+        task_queue.heartbeat(data['worker_id'])
+        return jsonify({'done': task_queue.is_finished() or task_queue.cancelled}), 200
+
+    @app.route('/status', methods=['GET'])
+    def status():
+        task_queue.reap()
+        return jsonify(task_queue.status()), 200
+
+    @app.route('/stop', methods=['POST'])
+    def stop():
+        task_queue.cancel()
+        logger.info("终止转换请求已发送，未分配的页面已取消。")
+        return jsonify({'message': 'Pending tasks cancelled.'}), 200
+
+    return app
+
+def build_coordinator_tasks(settings, manifest):
+    """查找PDF并生成执行计划，返回 (计划中的页面列表, 输出根目录, PDF数)。给出 plan 时直接使用该计划。"""
+    if settings.get("plan"):
+        plan_header, page_plan = pdf_converter.load_conversion_plan(settings["plan"])
+        if plan_header is None:
+            return None, None, 0
+        settings.update(pdf_converter.settings_for_plan(plan_header, settings))
+        shard = pdf_converter.parse_shard(settings.get("shard"))
+        input_root_dir = plan_header.get("input_root")
+        pages = [{"pdf": pdf_path.resolve().as_posix(), "page": page_num, "total_pages": total_pages,
+                  "output": output_png_path.resolve().as_posix()}
+                 for pdf_path, planned_pages in page_plan.items()
+                 for page_num, total_pages, output_png_path in planned_pages
+                 if pdf_converter.page_in_shard(pdf_path, page_num, shard, input_root_dir)]
+        return pages, Path(plan_header["output_dir"]), len(page_plan)
+
+    input_path_obj = Path(settings["input_path"])
+    if not input_path_obj.exists():
+        logger.error(f"错误: 输入路径 '{input_path_obj}' 不存在。")
+        return None, None, 0
+    pdf_files_to_process = pdf_converter.discover_pdf_files(
+        input_path_obj, settings["recursive"],
+        [k.strip() for k in settings["include_keywords"].split(',') if k.strip()],
+        [k.strip() for k in settings["exclude_keywords"].split(',') if k.strip()],
+        settings["regex_filter"]
+    )
+    logger.info(f"共找到 {len(pdf_files_to_process)} 个符合条件的PDF文件准备处理。")
+    input_root_for_structure = input_path_obj if input_path_obj.is_dir() else input_path_obj.parent
+    output_dir_base = Path(settings["output_dir"])
+    plan = pdf_converter.build_conversion_plan(pdf_files_to_process, output_dir_base, settings,
+                                               input_root_for_structure, manifest=manifest)
+    return plan["pages"], output_dir_base, len(pdf_files_to_process)
+
+def spawn_local_workers(count, coordinator_url, verbose_level):
+    """在本机启动若干工作进程，用于单机测试或充分利用本机CPU。"""
+    processes = []
+    for index in range(count):
+        command = [sys.executable, os.path.abspath(__file__), "worker", "--coordinator", coordinator_url,
+                   "--worker_id", f"{socket.gethostname()}-local-{index + 1}", "--verbose_level", verbose_level]
+        processes.append(subprocess.Popen(command))
+    logger.info(f"已在本机启动 {count} 个工作进程。")
+    return processes
+
+def finalize_coordinator_job(task_queue, manifest, settings, started):
+    """合并各工作进程的报告，更新隔离列表，返回 (生成的图片路径, 至少成功一页的PDF数)。"""
+    generated_paths = []
+    processed_pdfs = set()
+    for report in task_queue.results:
+        for key in ("pages", "skipped_pages", "failed_pages"):
+            manifest[key].extend(report.get(key) or [])
+        if report.get("output"):
+            generated_paths.append(report["output"])
+            processed_pdfs.update(page["pdf"] for page in report.get("pages") or [])
+
+    if settings.get("quarantine"):
+        quarantine = pdf_converter.QuarantineStore(settings.get("quarantine_file"))
+        failed_by_pdf = {}
+        for page in manifest["failed_pages"]:
+            failed_by_pdf.setdefault(page["pdf"], set()).add(page["reason"])
+        for pdf_key, reasons in failed_by_pdf.items():
+            poison_reasons = reasons & set(pdf_converter.QUARANTINE_REASONS)
+            if poison_reasons and quarantine.record_failure(Path(pdf_key), poison_reasons):
+                logger.warning(f"PDF '{Path(pdf_key).name}' 多次导致渲染器崩溃或超时，已加入隔离列表: {quarantine.path}")
+
+    elapsed = time.monotonic() - started
+    status = task_queue.status()
+    completed = len(task_queue.results)
+    manifest["metrics"] = {
+        "pages_completed": completed,
+        "elapsed_seconds": round(elapsed, 2),
+        "pages_per_sec": round(completed / elapsed, 3) if elapsed > 0 else 0.0,
+        "concurrency": {"adaptive": False, "final_workers": len(status["workers"]), "decisions": []},
+        "workers": {worker_id: worker["completed"] for worker_id, worker in status["workers"].items()},
+    }
+    return generated_paths, len(processed_pdfs)
+
+def run_coordinator(settings, host="127.0.0.1", port=DEFAULT_COORDINATOR_PORT, local_workers=0):
+    """运行协调进程，直到所有页面完成或任务被终止；返回任务清单路径。"""
+    manifest = pdf_converter.new_job_manifest(settings)
+    pages, output_dir_base, pdf_files_count = build_coordinator_tasks(settings, manifest)
+    if pages is None:
+        return None
+    # 执行计划时设置以计划为准
+    manifest["settings"] = {key: settings.get(key) for key in pdf_converter.DEFAULT_CONFIG if key in settings}
+    task_queue = PageTaskQueue(pages, settings.get("page_timeout") or None)
+    server = make_server(host, port, create_coordinator_app(task_queue, settings), threaded=True)
+    coordinator_url = f"http://{'127.0.0.1' if host in ('0.0.0.0', '') else host}:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"协调进程已启动: {coordinator_url}，共 {len(pages)} 页待转换。")
+
+    started = time.monotonic()
+    processes = spawn_local_workers(local_workers, coordinator_url, settings.get("verbose_level") or "INFO") \
+        if local_workers else []
+    try:
+        last_progress = started
+        while not task_queue.finished_event.wait(HEARTBEAT_INTERVAL):
+            task_queue.reap()
+            if time.monotonic() - last_progress >= PROGRESS_LOG_INTERVAL:
+                last_progress = time.monotonic()
+                status = task_queue.status()
+                alive_workers = sum(1 for worker in status["workers"].values() if worker["alive"])
+                logger.info(f"进度: {status['states']}，在线工作进程: {alive_workers}")
+    except KeyboardInterrupt:
+        logger.info("协调进程被中断，取消未分配的页面。")
+        task_queue.cancel()
+    finally:
+        # 留出一个心跳周期，让工作进程收到结束信号后自行退出
+        time.sleep(HEARTBEAT_INTERVAL)
+        server.shutdown()
+        for process in processes:
+            try:
+                process.wait(timeout=WORKER_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+
+    generated_paths, pdfs_processed_count = finalize_coordinator_job(task_queue, manifest, settings, started)
+    pdf_converter.log_conversion_summary(pdf_files_count, pdfs_processed_count, len(generated_paths),
+                                         output_dir_base, False, manifest)
+    return pdf_converter.write_job_manifest(manifest, output_dir_base)
+
+def post_json(url, payload, timeout=30):
+    http_request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                          headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(http_request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+def post_with_retry(url, payload):
+    """协调进程暂时不可达时重试，超过 CONNECT_RETRY_TIMEOUT 后抛出最后一次的错误。"""
+    deadline = time.monotonic() + CONNECT_RETRY_TIMEOUT
+    while True:
+        try:
+            return post_json(url, payload)
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+            if time.monotonic() >= deadline:
+                raise
+            logger.debug(f"连接协调进程失败: {e}，{CONNECT_RETRY_INTERVAL} 秒后重试。")
+            time.sleep(CONNECT_RETRY_INTERVAL)
+
+def run_worker(coordinator_url, worker_id=None, max_tasks=1):
+    """工作进程：循环申请租约、转换页面并报告结果，直到协调进程表示任务结束。返回完成的页面数。"""
+    coordinator_url = coordinator_url.rstrip("/")
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    stop_heartbeat = threading.Event()
+
+    def send_heartbeats():
+        while not stop_heartbeat.wait(HEARTBEAT_INTERVAL):
+            try:
+                post_json(f"{coordinator_url}/heartbeat", {"worker_id": worker_id}, timeout=HEARTBEAT_INTERVAL)
+            except (urllib.error.URLError, ConnectionError, TimeoutError, ValueError):
+                pass
+
+    threading.Thread(target=send_heartbeats, daemon=True).start()
+    logger.info(f"工作进程 '{worker_id}' 已连接协调进程: {coordinator_url}")
+    completed = 0
+    page_index = None
+    try:
+        while True:
+            try:
+                response = post_with_retry(f"{coordinator_url}/lease", {"worker_id": worker_id, "max_tasks": max_tasks})
+            except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+                logger.error(f"无法连接协调进程 '{coordinator_url}': {e}，工作进程退出。")
+                break
+            if not response["tasks"]:
+                if response["done"]:
+                    break
+                time.sleep(response.get("retry_after") or IDLE_RETRY_SECONDS)
+                continue
+
+            settings = response["settings"]
+            options = {key: settings.get(key) for key in pdf_converter.IMAGE_OPTION_KEYS}
+            if settings.get("dedup_pages") and page_index is None:
+                page_index = {}
+            for task in response["tasks"]:
+                task_manifest = pdf_converter.new_job_manifest(settings)
+                output_png_path = Path(task["output"])
+                output_png_path.parent.mkdir(parents=True, exist_ok=True)
+                output_path = pdf_converter.convert_page(
+                    Path(task["pdf"]), task["page"], task["total_pages"], output_png_path, settings["dpi"],
+                    settings["grayscale"], settings["rotate"], options=options, manifest=task_manifest,
+                    page_index=page_index)
+                report = {"worker_id": worker_id, "task_id": task["id"], "output": output_path}
+                report.update({key: task_manifest[key] for key in ("pages", "skipped_pages", "failed_pages")})
+                try:
+                    post_with_retry(f"{coordinator_url}/complete", report)
+                except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+                    logger.error(f"向协调进程报告第 {task['page']} 页的结果失败: {e}")
+                completed += 1
+    finally:
+        stop_heartbeat.set()
+    logger.info(f"工作进程 '{worker_id}' 结束，共处理 {completed} 页。")
+    return completed
+
+if __name__ == "__main__":
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%H:%M:%S'))
+    logger.addHandler(handler)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING) # 不输出每个租约/心跳请求的访问日志
+    pdf_converter.find_and_set_bundled_poppler_path()
+
+    parser = argparse.ArgumentParser(description="Distribute PDF page rendering over worker processes")
+    subparsers = parser.add_subparsers(dest="role", required=True)
+    coordinator_parser = subparsers.add_parser("coordinator", parents=[pdf_converter.build_argument_parser(add_help=False)],
+                                               help="Serve the page-task queue of one conversion job")
+    coordinator_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (0.0.0.0 for the LAN)")
+    coordinator_parser.add_argument("--port", type=int, default=DEFAULT_COORDINATOR_PORT, help="Port to listen on (0 for any free port)")
+    coordinator_parser.add_argument("--local_workers", type=int, default=0, help="Number of worker processes to start on this machine")
+    worker_parser = subparsers.add_parser("worker", help="Render pages leased from a coordinator")
+    worker_parser.add_argument("--coordinator", default=f"http://127.0.0.1:{DEFAULT_COORDINATOR_PORT}", help="Coordinator URL")
+    worker_parser.add_argument("--worker_id", default="", help="Worker name (defaults to hostname-pid)")
+    worker_parser.add_argument("--max_tasks", type=int, default=1, help="Pages leased per request")
+    worker_parser.add_argument("--verbose_level", default="INFO", help="Verbose level (DEBUG, INFO, WARNING, ERROR, CRITICAL)")
+    args = parser.parse_args()
+    logger.setLevel(args.verbose_level.upper())
+
+    if args.role == "coordinator":
+        pdf_converter.validate_args(coordinator_parser, args)
+        settings = dict(pdf_converter.DEFAULT_CONFIG)
+        settings.update(vars(args))
+        settings["overwrite"] = True # CLI always overwrites
+        sys.exit(0 if run_coordinator(settings, args.host, args.port, args.local_workers) else 1)
+    else:
+        run_worker(args.coordinator, args.worker_id or None, args.max_tasks)
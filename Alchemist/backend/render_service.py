@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import math
+import hashlib
+import threading
+import collections
+from pathlib import Path
+
+import pdf_converter
+from pdf_converter import logger
+
+# format 参数 -> (PIL保存格式, MIME类型)
+RENDER_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+DEFAULT_RENDER_DPI = 150
+MAX_RENDER_DPI = 1200
+MAX_RENDER_WIDTH = 16384
+JPEG_QUALITY = 85
+# 内存中缓存的已编码页面总大小上限
+RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# 缓存的文件内容哈希条数上限，按 (路径, 大小, 修改时间) 失效
+FILE_HASH_CACHE_ENTRIES = 4096
+# 请求中带有与当前内容一致的 hash 参数时，URL对应的内容永远不变，可以长期缓存；否则每次都需用 ETag 验证
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# 渲染设置变化时递增，使旧的 ETag 失效
+RENDER_CACHE_VERSION = 1
+
+class RenderRequestError(Exception):
+    """无法处理的渲染请求，status 为对应的HTTP状态码。"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+class EncodedPageCache:
+    """按总字节数限制大小的LRU缓存，保存已编码的页面图像。"""
+
+    def __init__(self, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key)[0])
+            self.entries[key] = (body, mimetype)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (evicted_body, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted_body)
+                self.stats["evictions"] += 1
+
+    def summary(self):
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.size, max_bytes=self.max_bytes)
+
+class RenderFlight:
+    """一次正在进行的渲染，相同请求的后来者等待其结果而不重复渲染。"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class PageRenderService:
+    """按需渲染单页并编码为图片，供 /render 使用。
+
+    缓存键（同时作为ETag）由PDF内容哈希、页码、DPI和格式决定，与文件路径无关：
+    内容相同的文件共享缓存，文件被修改后自然失效。缓存键相同的并发请求只渲染一次（single-flight）。
+    """
+
+    def __init__(self, cache_max_bytes=RENDER_CACHE_MAX_BYTES, metadata_cache=None):
+        self.cache = EncodedPageCache(cache_max_bytes)
+        self.metadata_cache = metadata_cache
+        # 查缓存和登记渲染在同一把锁内进行，渲染结果先写入缓存再移出 in_flight，
+        # 因此任何时刻相同的请求要么命中缓存，要么等待正在进行的渲染
+        self.flight_lock = threading.Lock()
+        self.in_flight = {}
+        self.stats = {"renders": 0, "coalesced": 0, "render_errors": 0}
+        self.hash_lock = threading.Lock()
+        self.file_hashes = collections.OrderedDict()
+
+    def content_hash(self, pdf_path):
+        stat = pdf_path.stat()
+        key = (pdf_path.resolve().as_posix(), stat.st_size, stat.st_mtime_ns)
+        with self.hash_lock:
+            content_hash = self.file_hashes.get(key)
+            if content_hash:
+                self.file_hashes.move_to_end(key)
+                return content_hash
+        content_hash = pdf_converter.hash_file_contents(pdf_path)
+        with self.hash_lock:
+            self.file_hashes[key] = content_hash
+            while len(self.file_hashes) > FILE_HASH_CACHE_ENTRIES:
+                self.file_hashes.popitem(last=False)
+        return content_hash
+
+    def dpi_for_width(self, pdf_path, page_num, width):
+        metadata = pdf_converter.read_pdf_metadata(pdf_path, cache=self.metadata_cache)
+        if not metadata:
+            raise RenderRequestError(f"无法读取 '{pdf_path.name}' 的页面信息。", 422)
+        if page_num > metadata["pages"]:
+            raise RenderRequestError(f"页码 {page_num} 超出总页数 {metadata['pages']}。", 404)
+        page_size = metadata["page_sizes"][page_num - 1]
+        if not page_size or not page_size[0] > 0:
+            raise RenderRequestError(f"无法获取 '{pdf_path.name}' 第 {page_num} 页的尺寸，请改用 dpi 参数。", 422)
+        # pdftoppm 只接受整数DPI，取能达到目标宽度的最小值；极窄的页面不超过 MAX_RENDER_DPI
+        return min(MAX_RENDER_DPI, max(1, math.ceil(width * 72 / float(page_size[0]))))
+
+    def prepare(self, path, page="1", dpi=None, width=None, image_format="png"):
+        """校验请求参数，返回包含渲染设置和缓存键的请求描述；参数无效时抛出 RenderRequestError。"""
+        if not path:
+            raise RenderRequestError("缺少 path 参数。")
+        pdf_path = Path(path)
+        if not pdf_path.is_file() or pdf_path.suffix.lower() != ".pdf":
+            raise RenderRequestError(f"PDF文件 '{path}' 不存在。", 404)
+        image_format = (image_format or "png").lower()
+        if image_format not in RENDER_FORMATS:
+            raise RenderRequestError(f"不支持的格式 '{image_format}'，可选: {', '.join(RENDER_FORMATS)}。")
+        try:
+            page_num = int(page or 1)
+            dpi = int(dpi) if dpi else None
+            width = int(width) if width else None
+        except ValueError:
+            raise RenderRequestError("page、dpi 和 width 必须为整数。")
+        if page_num < 1:
+            raise RenderRequestError("page 必须大于 0。")
+        if width is not None:
+            if not 0 < width <= MAX_RENDER_WIDTH:
+                raise RenderRequestError(f"width 必须在 1 到 {MAX_RENDER_WIDTH} 之间。")
+            dpi = self.dpi_for_width(pdf_path, page_num, width)
+        dpi = dpi or DEFAULT_RENDER_DPI
+        if not 0 < dpi <= MAX_RENDER_DPI:
+            raise RenderRequestError(f"dpi 必须在 1 到 {MAX_RENDER_DPI} 之间。")
+        try:
+            content_hash = self.content_hash(pdf_path)
+        except OSError as e:
+            raise RenderRequestError(f"无法读取 '{path}': {e}", 404)
+        cache_key = hashlib.sha256(
+            f"{RENDER_CACHE_VERSION}:{content_hash}:{page_num}:{dpi}:{RENDER_FORMATS[image_format][0]}".encode("utf-8")
+        ).hexdigest()[:32]
+        return {"pdf_path": pdf_path, "page": page_num, "dpi": dpi, "format": image_format,
+                "content_hash": content_hash, "cache_key": cache_key}
+
+    def render(self, page_request):
+        """渲染并编码页面，返回 (图片字节, MIME类型)。"""
+        pdf_path = page_request["pdf_path"]
+        try:
+            image = pdf_converter.render_page(pdf_path, page_request["page"], page_request["dpi"],
+                                              timeout=pdf_converter.DEFAULT_CONFIG["page_timeout"] or None,
+                                              memory_limit_mb=pdf_converter.DEFAULT_CONFIG["render_memory_limit_mb"])
+        except pdf_converter.RenderTimeout as e:
+            raise RenderRequestError(str(e), 504)
+        except pdf_converter.RenderCrashed as e:
+            raise RenderRequestError(str(e), 502)
+        if image is None:
+            raise RenderRequestError(f"未能从 '{pdf_path.name}' 第 {page_request['page']} 页生成图像。", 404)
+        save_format, mimetype = RENDER_FORMATS[page_request["format"]]
+        if save_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        if save_format == "PNG":
+            image.save(buffer, save_format)
+        else:
+            image.save(buffer, save_format, quality=JPEG_QUALITY)
+        return buffer.getvalue(), mimetype
+
+    def get_encoded_page(self, page_request):
+        """返回 (图片字节, MIME类型, 缓存状态)。
+
+        缓存状态为 hit（命中缓存）、coalesced（等待了相同请求正在进行的渲染）或 miss（本次渲染）。
+        """
+        cache_key = page_request["cache_key"]
+        with self.flight_lock:
+            entry = self.cache.get(cache_key)
+            if entry is not None:
+                return entry[0], entry[1], "hit"
+            flight = self.in_flight.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self.in_flight[cache_key] = RenderFlight()
+            else:
+                flight.waiters += 1
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result[0], flight.result[1], "coalesced"
+
+        try:
+            body, mimetype = self.render(page_request)
+            self.cache.put(cache_key, body, mimetype)
+            flight.result = (body, mimetype)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.flight_lock:
+                del self.in_flight[cache_key]
+                self.stats["renders" if flight.error is None else "render_errors"] += 1
+            flight.done.set()
+        logger.debug(f"已渲染 '{page_request['pdf_path'].name}' 第 {page_request['page']} 页 "
+                     f"({page_request['dpi']} DPI, {page_request['format']}, {len(body)} 字节，"
+                     f"另有 {flight.waiters} 个相同请求共用本次渲染)")
+        return body, mimetype, "miss"
+
+    def summary(self):
+        """渲染、合并请求和缓存的计数，供 /render/stats 导出。"""
+        with self.flight_lock:
+            stats = dict(self.stats, in_flight=len(self.in_flight))
+        stats["cache"] = self.cache.summary()
+        return stats
+
+    def cache_control(self, page_request, requested_hash=None):
+        return IMMUTABLE_CACHE_CONTROL if requested_hash == page_request["content_hash"] else REVALIDATE_CACHE_CONTROL
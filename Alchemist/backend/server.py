@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""生产环境入口：以多线程（可选多进程）WSGI服务器运行 flask_api，支持平稳退出。
+
+安装了 gunicorn（仅POSIX）时使用其 gthread worker；否则（如 Windows）退回 werkzeug 的多线程服务器，
+此时 --workers 和 --threads 不起作用。给出 --unix_socket 时只在该Unix域套接字上监听，不打开TCP端口。
+开始监听后向标准输出打印一行 READY_PREFIX + JSON（transport 为 unix 或 tcp），前端据此选择连接方式。
+"""
+
+import os
+import sys
+import json
+import signal
+import socket
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+import pdf_converter
+from pdf_converter import logger
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5003
+# 页面渲染在 pdftoppm 子进程中进行，请求线程大多在等待，默认一个进程、多个线程即可
+DEFAULT_WORKERS = 1
+DEFAULT_THREADS = 8
+DEFAULT_DRAIN_TIMEOUT = 60
+# gunicorn 在 graceful_timeout 后强制结束 worker，排空须在此之前结束并留出保存进度的时间
+GRACEFUL_TIMEOUT_MARGIN = 15
+# 服务开始监听时打印的行的前缀，Tauri 前端读取该行确定连接方式
+READY_PREFIX = "ALCHEMIST_READY "
+# Unix域套接字只允许当前用户连接
+UNIX_SOCKET_UMASK = 0o077
+
+def announce_ready(host, port, unix_socket=None):
+    if unix_socket:
+        ready = {"transport": "unix", "path": str(Path(unix_socket).resolve())}
+    else:
+        ready = {"transport": "tcp", "address": f"{host}:{port}"}
+    print(READY_PREFIX + json.dumps(ready, ensure_ascii=False), flush=True)
+
+def remove_stale_socket(unix_socket):
+    """删除上次异常退出遗留的套接字文件；仍有服务在监听时拒绝启动。"""
+    path = Path(unix_socket)
+    if not path.exists():
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+    except OSError:
+        path.unlink()
+    else:
+        raise SystemExit(f"Unix socket {path} is already in use")
+    finally:
+        probe.close()
+
+def start_drain(drain_timeout):
+    """在后台线程中排空任务（见 flask_api.drain_jobs），只启动一次。"""
+    import flask_api
+    if flask_api.draining_event.is_set():
+        return None
+    thread = threading.Thread(target=flask_api.drain_jobs, args=(drain_timeout,), name="drain", daemon=True)
+    thread.start()
+    return thread
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """以 gthread worker 运行 flask_api；各 worker 进程各自导入应用（不在主进程中预加载，
+        避免 fork 共享 SQLite 连接）。"""
+
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import flask_api
+            return flask_api.app
+
+    def post_worker_init(worker):
+        import flask_api
+        drain_timeout = max(0, worker.cfg.graceful_timeout - GRACEFUL_TIMEOUT_MARGIN)
+        handle_exit = worker.handle_exit
+
+        def drain_and_exit(sig, frame):
+            # 先停止接受新任务并开始排空，worker 随后停止接受连接，并在 graceful_timeout 内等待请求结束
+            start_drain(drain_timeout)
+            handle_exit(sig, frame)
+
+        worker.handle_exit = drain_and_exit
+        signal.signal(signal.SIGTERM, drain_and_exit)
+        # 只认领所属进程已退出的任务：新启动的服务恢复上次中断的任务，替换崩溃 worker 的进程接手其任务，
+        # 其他 worker 正在执行的任务不受影响
+        flask_api.resume_interrupted_jobs()
+
+    def worker_exit(server, worker):
+        import flask_api
+        flask_api.job_store.flush()
+
+def run_gunicorn(host, port, workers, threads, drain_timeout, unix_socket=None):
+    options = {
+        "bind": f"unix:{unix_socket}" if unix_socket else f"{host}:{port}",
+        "umask": UNIX_SOCKET_UMASK if unix_socket else 0,
+        "when_ready": lambda server: announce_ready(host, port, unix_socket),
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "graceful_timeout": drain_timeout + GRACEFUL_TIMEOUT_MARGIN,
+        "post_worker_init": post_worker_init,
+        "worker_exit": worker_exit,
+        "accesslog": None,
+        "errorlog": "-",
+    }
+    GunicornServer(options).run()
+
+def run_werkzeug(host, port, drain_timeout, unix_socket=None):
+    from werkzeug.serving import make_server
+    import flask_api
+    if unix_socket:
+        previous_umask = os.umask(UNIX_SOCKET_UMASK)
+        try:
+            server = make_server(f"unix://{unix_socket}", 0, flask_api.app, threaded=True)
+        finally:
+            os.umask(previous_umask)
+    else:
+        server = make_server(host, port, flask_api.app, threaded=True)
+
+    def drain_and_shutdown(sig, frame):
+        logger.info(f"收到信号 {sig}，准备退出。")
+        drain_thread = start_drain(drain_timeout)
+        if drain_thread is not None:
+            threading.Thread(target=lambda: (drain_thread.join(), server.shutdown()), daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain_and_shutdown)
+    signal.signal(signal.SIGINT, drain_and_shutdown)
+    flask_api.resume_interrupted_jobs()
+    announce_ready(host, server.server_port, unix_socket)
+    try:
+        server.serve_forever()
+    finally:
+        if unix_socket:
+            Path(unix_socket).unlink(missing_ok=True)
+
+if __name__ == "__main__":
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%H:%M:%S'))
+    logger.addHandler(handler)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    pdf_converter.find_and_set_bundled_poppler_path()
+
+    parser = argparse.ArgumentParser(description="Run the Alchemist backend with a production WSGI server")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on (0.0.0.0 for the LAN)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--unix_socket", default="", help="Listen on this Unix domain socket instead of TCP (POSIX only)")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("ALCHEMIST_WORKERS", DEFAULT_WORKERS)),
+                        help="Worker processes (gunicorn only). Each process has its own scheduler and render cache, "
+                             "so /stop and /jobs only see jobs running in the process that serves the request")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("ALCHEMIST_THREADS", DEFAULT_THREADS)),
+                        help="Request threads per worker process (gunicorn only)")
+    parser.add_argument("--drain_timeout", type=int, default=DEFAULT_DRAIN_TIMEOUT,
+                        help="Seconds to let running jobs finish on shutdown before checkpointing them for resume")
+    parser.add_argument("--server", choices=("auto", "gunicorn", "werkzeug"), default="auto",
+                        help="WSGI server (auto uses gunicorn when installed)")
+    parser.add_argument("--verbose_level", default="INFO", help="Verbose level (DEBUG, INFO, WARNING, ERROR, CRITICAL)")
+    args = parser.parse_args()
+    # flask_api 为捕获日志会将 logger 设为 DEBUG，输出级别由 handler 控制
+    handler.setLevel(args.verbose_level.upper())
+    if args.workers < 1 or args.threads < 1:
+        parser.error("--workers and --threads must be at least 1")
+
+    if args.unix_socket:
+        if sys.platform == "win32":
+            parser.error("--unix_socket is not supported on this platform")
+        remove_stale_socket(args.unix_socket)
+
+    server_kind = args.server
+    if server_kind == "auto":
+        server_kind = "gunicorn" if BaseApplication is not None else "werkzeug"
+    if server_kind == "gunicorn":
+        if BaseApplication is None:
+            parser.error("gunicorn is not installed (pip install gunicorn; not available on Windows)")
+        run_gunicorn(args.host, args.port, args.workers, args.threads, args.drain_timeout, args.unix_socket)
+    else:
+        if args.workers != DEFAULT_WORKERS or args.threads != DEFAULT_THREADS:
+            logger.warning("werkzeug 服务器为每个请求启动一个线程，--workers 和 --threads 不起作用。")
+        run_werkzeug(args.host, args.port, args.drain_timeout, args.unix_socket)
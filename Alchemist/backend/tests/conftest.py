@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 隔离列表、元数据缓存和任务队列默认位于 ~/.alchemist，测试使用临时的主目录，不读写用户数据
+os.environ["HOME"] = tempfile.mkdtemp(prefix="alchemist_tests_")
+# 后端模块以脚本方式运行、彼此按模块名导入，测试同样将 backend 目录加入搜索路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
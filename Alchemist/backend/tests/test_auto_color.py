@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+import io
+from pathlib import Path
+
+from PIL import Image
+
+import pdf_converter
+
+def scanned_text_page():
+    """无彩色的文字页面：白纸、黑色文字和灰色线条，以RGB渲染。"""
+    image = Image.new("RGB", (60, 40), (255, 255, 255))
+    image.paste((20, 20, 20), (5, 5, 50, 10))
+    image.paste((128, 128, 128), (5, 20, 50, 22))
+    return image
+
+def test_achromatic_page_with_auto_output_round_trips(monkeypatch):
+    page = scanned_text_page()
+    monkeypatch.setattr(pdf_converter, "render_page", lambda *args, **kwargs: page.copy())
+    options = dict(pdf_converter.DEFAULT_CONFIG, auto_color=True, output_mode="auto")
+    image, page_record, applied_output_mode = pdf_converter.render_processed_page(
+        Path("scan.pdf"), 1, 150, False, 0, options=options)
+    assert page_record["auto_color"] == "gray"
+    assert applied_output_mode == "palette"
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    reloaded = Image.open(io.BytesIO(buffer.getvalue()))
+    assert reloaded.convert("L").tobytes() == page.convert("L").tobytes()
+
+def test_color_page_is_not_converted_to_gray(monkeypatch):
+    page = scanned_text_page()
+    page.paste((220, 30, 30), (5, 30, 50, 35))
+    monkeypatch.setattr(pdf_converter, "render_page", lambda *args, **kwargs: page.copy())
+    options = dict(pdf_converter.DEFAULT_CONFIG, auto_color=True, output_mode="auto")
+    image, page_record, _ = pdf_converter.render_processed_page(Path("scan.pdf"), 1, 150, False, 0, options=options)
+    assert page_record["auto_color"] == "color"
+    assert image.convert("RGB").tobytes() == page.tobytes()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import benchmark
+
+def results(**benchmarks):
+    return {"benchmarks": {name: {"median": median, "higher_is_better": higher_is_better}
+                           for name, (median, higher_is_better) in benchmarks.items()}}
+
+def statuses(rows):
+    return {name: status for name, _, _, _, status in rows}
+
+def test_compare_results_direction_and_threshold():
+    baseline = results(**{"render.text": (1.0, False), "batch.pages_per_sec": (10.0, True),
+                          "encode.png": (2.0, False), "write.png": (2.0, False)})
+    current = results(**{"render.text": (1.2, False), "batch.pages_per_sec": (8.0, True),
+                         "encode.png": (1.5, False), "write.png": (2.1, False)})
+    rows = benchmark.compare_results(baseline, current, threshold=0.10)
+    assert statuses(rows) == {"batch.pages_per_sec": "regression", "encode.png": "improvement",
+                              "render.text": "regression", "write.png": "ok"}
+    assert [row[0] for row in rows] == sorted(row[0] for row in rows)
+    changes = {name: change for name, _, _, change, _ in rows}
+    assert changes["render.text"] == pytest.approx(0.2)
+    assert changes["batch.pages_per_sec"] == pytest.approx(-0.2)
+
+def test_compare_results_higher_is_better_improvement():
+    rows = benchmark.compare_results(results(rate=(10.0, True)), results(rate=(12.0, True)), threshold=0.10)
+    assert statuses(rows) == {"rate": "improvement"}
+
+def test_compare_results_new_and_missing():
+    rows = {row[0]: row for row in benchmark.compare_results(results(removed=(1.0, False)),
+                                                             results(added=(3.0, False)))}
+    assert rows["removed"] == ("removed", 1.0, None, None, "missing")
+    assert rows["added"] == ("added", None, 3.0, None, "new")
+
+def test_compare_results_zero_baseline():
+    baseline = results(seconds=(0.0, False), rate=(0.0, True), unchanged=(0.0, False))
+    current = results(seconds=(0.5, False), rate=(4.0, True), unchanged=(0.0, False))
+    rows = {row[0]: row for row in benchmark.compare_results(baseline, current)}
+    assert rows["seconds"] == ("seconds", 0.0, 0.5, None, "regression")
+    assert rows["rate"] == ("rate", 0.0, 4.0, None, "new")
+    assert rows["unchanged"] == ("unchanged", 0.0, 0.0, 0.0, "ok")
+
+def comparison_results(**benchmarks):
+    return dict(results(**benchmarks), environment={}, config={})
+
+def test_missing_benchmark_fails_comparison(capsys):
+    baseline = comparison_results(kept=(1.0, False), removed=(1.0, False))
+    assert [row[0] for row in benchmark.print_comparison(baseline, comparison_results(kept=(1.0, False)), 0.1)] == [
+        "removed"]
+    assert "0 regression(s) beyond 10%, 1 missing" in capsys.readouterr().out
+    assert benchmark.print_comparison(baseline, baseline, 0.1) == []
+
+def test_large_discovery_is_opt_in():
+    parser = benchmark.build_argument_parser()
+    assert parser.parse_args(["run"]).discovery_entries == benchmark.DEFAULT_DISCOVERY_ENTRIES < 100000
+    assert parser.parse_args(["run", "--large_discovery"]).large_discovery
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+
+import flask_api
+import pdf_converter
+
+def read_records(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def test_unread_stream_does_not_register_job():
+    stream = flask_api.stream_conversion({}, "stream-unread", threading.Event())
+    assert "stream-unread" not in flask_api.active_jobs
+    stream.close()
+    assert "stream-unread" not in flask_api.active_jobs
+
+def test_stream_forwards_only_its_own_logs(monkeypatch):
+    def fake_conversion(data, job_id, job_stop_event, on_page_done=None):
+        assert flask_api.active_jobs[job_id] is job_stop_event
+        pdf_converter.logger.warning(f"warning from {job_id}")
+
+        def other_job():
+            pdf_converter.job_context.job_id = "other-job"
+            pdf_converter.logger.warning("warning from other-job")
+
+        thread = threading.Thread(target=other_job)
+        thread.start()
+        thread.join()
+        return {"status": "completed", "job_id": job_id}, 200
+
+    monkeypatch.setattr(flask_api, "run_conversion_request", fake_conversion)
+    response = flask_api.app.test_client().post("/convert", json={"stream": True, "job_id": "stream-logs"})
+    records = read_records(response)
+    logs = [record["message"] for record in records if record["type"] == "log"]
+    assert len(logs) == 1 and logs[0].endswith("warning from stream-logs")
+    assert records[-1]["type"] == "summary" and records[-1]["status"] == "completed"
+    assert "stream-logs" not in flask_api.active_jobs
+
+def test_stream_reports_duplicate_job_started_before_iteration():
+    stream = flask_api.stream_conversion({}, "stream-dup", threading.Event())
+    stop_event = threading.Event()
+    with flask_api.active_jobs_lock:
+        flask_api.active_jobs["stream-dup"] = stop_event
+    try:
+        records = [json.loads(line) for line in stream]
+        assert flask_api.active_jobs["stream-dup"] is stop_event
+    finally:
+        with flask_api.active_jobs_lock:
+            flask_api.active_jobs.pop("stream-dup", None)
+    assert records == [{"type": "summary", "status": "error", "job_id": "stream-dup", "http_status": 409,
+                        "error": "job stream-dup is already running"}]
+
+def test_slow_client_does_not_block_page_callbacks(monkeypatch):
+    monkeypatch.setattr(flask_api, "STREAM_QUEUE_MAX_RECORDS", 2)
+    pages_done = threading.Event()
+
+    def fake_conversion(data, job_id, job_stop_event, on_page_done=None):
+        for page_num in range(1, 11):
+            on_page_done("doc.pdf", page_num, f"doc_{page_num}.png")
+        pages_done.set()
+        return {"status": "completed", "job_id": job_id}, 200
+
+    monkeypatch.setattr(flask_api, "run_conversion_request", fake_conversion)
+    stream = flask_api.stream_conversion({}, "stream-slow", threading.Event())
+    first = json.loads(next(stream))
+    # 客户端未继续读取时，页面完成回调（在渲染槽位上执行）不会等待
+    assert pages_done.wait(5)
+    records = [first] + [json.loads(line) for line in stream]
+    pages = [record["page"] for record in records if record["type"] == "page"]
+    summary = records[-1]
+    assert summary["type"] == "summary" and summary["converted_pages"] == 10
+    assert summary["omitted_page_records"] == 10 - len(pages) > 0
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+import pdf_converter
+import flask_api
+
+def wait_for_job(job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with flask_api.active_jobs_lock:
+            if job_id in flask_api.active_jobs:
+                return True
+        time.sleep(0.01)
+    return False
+
+def test_stop_cancels_only_the_requested_estimate(tmp_path, monkeypatch):
+    (tmp_path / "a.pdf").write_bytes(b"%PDF-1.7\n")
+
+    def blocking_estimate(pdf_files, settings, input_root_dir=None, stop_event=None):
+        stop_event.wait(10)
+        return None
+
+    monkeypatch.setattr(pdf_converter, "estimate_conversion", blocking_estimate)
+    results = {}
+
+    def request_estimate(job_id):
+        response = flask_api.app.test_client().post("/estimate", json={"input_path": str(tmp_path), "job_id": job_id})
+        results[job_id] = response.get_json()
+
+    threads = [threading.Thread(target=request_estimate, args=(job_id,)) for job_id in ("est-1", "est-2")]
+    for thread in threads:
+        thread.start()
+    assert wait_for_job("est-1") and wait_for_job("est-2")
+
+    client = flask_api.app.test_client()
+    assert client.post("/stop", json={"job_id": "est-1"}).status_code == 200
+    threads[0].join(5)
+    assert results["est-1"]["status"] == "stopped"
+    assert "est-2" not in results
+
+    assert client.post("/stop", json={}).status_code == 200
+    threads[1].join(5)
+    assert results["est-2"]["status"] == "stopped"
+    assert not flask_api.active_jobs
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+import pytest
+
+from pdf_converter import AdaptiveConcurrencyController, FairShareScheduler
+
+# 模拟渲染耗时，远大于任务线程补充队列所需的时间，与实际渲染相符
+RENDER_SECONDS = 0.02
+
+def controller(workers=1):
+    return AdaptiveConcurrencyController(workers, 1, workers, False)
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return False
+
+def test_runs_every_task_and_reports_stats():
+    scheduler = FairShareScheduler(slots=2)
+    done = []
+    stats = scheduler.run_job("job", range(10), done.append, controller(2), priority="bulk")
+    assert sorted(done) == list(range(10))
+    assert stats["started_pages"] == 10
+    assert stats["priority"] == "bulk"
+    assert scheduler.snapshot()["jobs"] == []
+
+def test_interactive_job_gets_weighted_share():
+    scheduler = FairShareScheduler(slots=1)
+    order = []
+    gate = threading.Event()
+
+    def run_bulk(task):
+        if task == 0:
+            gate.wait(5)
+        order.append(("bulk", task))
+        time.sleep(RENDER_SECONDS)
+
+    def run_interactive(task):
+        order.append(("interactive", task))
+        time.sleep(RENDER_SECONDS)
+
+    bulk = threading.Thread(target=scheduler.run_job, args=("bulk", range(10), run_bulk, controller()),
+                            kwargs={"priority": "bulk"})
+    bulk.start()
+    assert wait_until(lambda: scheduler.snapshot()["jobs"] and scheduler.snapshot()["jobs"][0]["in_flight"] == 1)
+    interactive = threading.Thread(target=scheduler.run_job,
+                                   args=("interactive", range(10), run_interactive, controller()), kwargs={"priority": "interactive"})
+    interactive.start()
+    assert wait_until(lambda: len(scheduler.snapshot()["jobs"]) == 2
+                      and all(job["queued_pages"] for job in scheduler.snapshot()["jobs"]))
+    gate.set()
+    bulk.join(5)
+    interactive.join(5)
+    assert order[0] == ("bulk", 0)
+    # 权重 8:1，bulk 的第一页之后的10个槽位中 interactive 至少占8个
+    assert sum(1 for kind, _ in order[1:11] if kind == "interactive") >= 8
+    assert len(order) == 20
+
+def test_task_error_is_raised_to_caller():
+    scheduler = FairShareScheduler(slots=2)
+
+    def run_task(task):
+        if task == 3:
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        scheduler.run_job("job", range(20), run_task, controller(2))
+    assert scheduler.snapshot()["jobs"] == []
+
+def test_stop_event_drops_queued_tasks():
+    scheduler = FairShareScheduler(slots=1)
+    stop_event = threading.Event()
+    done = []
+
+    def run_task(task):
+        done.append(task)
+        if task == 1:
+            stop_event.set()
+
+    scheduler.run_job("job", range(100), run_task, controller(), stop_event=stop_event)
+    assert 2 <= len(done) < 10
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import sqlite3
+import subprocess
+from pathlib import Path
+
+from PIL import Image
+
+import job_store
+import pdf_converter
+from job_store import JobStore
+
+def planned_pages(pdf_path, output_dir, page_count):
+    return [{"pdf": Path(pdf_path).resolve().as_posix(), "page": page_num, "total_pages": page_count,
+             "output": (output_dir / f"doc_page_{page_num}.png").as_posix()}
+            for page_num in range(1, page_count + 1)]
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def set_owner(store_path, job_id, pid):
+    with sqlite3.connect(str(store_path)) as connection:
+        connection.execute("UPDATE jobs SET owner_pid = ? WHERE id = ?", (pid, job_id))
+
+def test_interrupted_job_resumes_from_pending_pages(tmp_path):
+    store_path = tmp_path / "jobs.sqlite3"
+    pdf_path = tmp_path / "doc.pdf"
+    store = JobStore(store_path)
+    store.create_job("job-1", {"dpi": 72}, planned_pages(pdf_path, tmp_path, 4), tmp_path, priority="bulk")
+    store.mark_page_done("job-1", pdf_path, 1)
+    store.mark_page_done("job-1", pdf_path, 3)
+    assert store.job_status("job-1")["done_pages"] == 2
+    # 当前进程仍在运行，它的任务不是被中断的任务
+    assert store.interrupted_jobs() == []
+    store.close()
+    set_owner(store_path, "job-1", exited_pid())
+
+    reopened = JobStore(store_path)
+    assert [job["id"] for job in reopened.interrupted_jobs()] == ["job-1"]
+    assert reopened.interrupted_jobs()[0]["settings"] == {"dpi": 72}
+    assert [page["page"] for page in reopened.pending_pages("job-1")] == [2, 4]
+
+    reopened.finish_job("job-1", "completed", "manifest.json")
+    assert reopened.interrupted_jobs() == []
+    status = reopened.job_status("job-1")
+    assert (status["state"], status["total_pages"], status["manifest_path"]) == ("completed", 4, "manifest.json")
+    assert reopened.job_status("missing") is None
+    reopened.close()
+
+def test_claim_skips_jobs_of_running_processes(tmp_path):
+    store_path = tmp_path / "jobs.sqlite3"
+    store = JobStore(store_path)
+    for job_id in ("dead-owner", "live-owner", "legacy"):
+        store.create_job(job_id, {}, planned_pages(tmp_path / f"{job_id}.pdf", tmp_path, 1), tmp_path)
+    sibling = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    try:
+        set_owner(store_path, "dead-owner", exited_pid())
+        set_owner(store_path, "live-owner", sibling.pid)
+        set_owner(store_path, "legacy", None)
+        claimed = store.claim_interrupted_jobs()
+        assert [job["id"] for job in claimed] == ["dead-owner", "legacy"]
+        # 已认领的任务属于当前进程，不会被再次认领
+        assert store.claim_interrupted_jobs() == []
+        assert JobStore(store_path).claim_interrupted_jobs() == []
+    finally:
+        sibling.kill()
+        sibling.wait()
+    store.close()
+
+def test_opens_store_without_owner_column(tmp_path):
+    store_path = tmp_path / "jobs.sqlite3"
+    with sqlite3.connect(str(store_path)) as connection:
+        connection.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, state TEXT NOT NULL, priority TEXT,"
+                           " settings TEXT NOT NULL, output_dir TEXT NOT NULL, input_root TEXT,"
+                           " total_pages INTEGER NOT NULL, manifest_path TEXT, created_at TEXT NOT NULL,"
+                           " updated_at TEXT NOT NULL)")
+        connection.execute("INSERT INTO jobs VALUES ('old', 'running', NULL, '{}', '/out', NULL, 1, NULL, 't', 't')")
+    assert [job["id"] for job in JobStore(store_path).claim_interrupted_jobs()] == ["old"]
+
+def test_unflushed_pages_are_pending_after_restart(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_store, "COMMIT_INTERVAL_SECONDS", 3600)
+    store_path = tmp_path / "jobs.sqlite3"
+    pdf_path = tmp_path / "doc.pdf"
+    store = JobStore(store_path)
+    store.create_job("job-1", {}, planned_pages(pdf_path, tmp_path, 3), tmp_path)
+    store.mark_page_done("job-1", pdf_path, 1)
+    store.flush()
+    store.mark_page_done("job-1", pdf_path, 2)
+    # 模拟进程在批量提交前退出：未提交的记录丢失，该页恢复时重新渲染
+    assert [page["page"] for page in JobStore(store_path).pending_pages("job-1")] == [2, 3]
+
+def test_duplicate_pdf_pages_are_reported_done(monkeypatch, tmp_path):
+    monkeypatch.setattr(pdf_converter, "render_page",
+                        lambda *args, **kwargs: Image.new("RGB", (8, 8), (200, 30, 30)))
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    primary_path, duplicate_path = input_dir / "a.pdf", input_dir / "b.pdf"
+    for pdf_path in (primary_path, duplicate_path):
+        pdf_path.write_bytes(b"%PDF-1.4 same content")
+    output_dir = tmp_path / "out"
+    pages = planned_pages(primary_path, output_dir, 2) + [
+        {"pdf": duplicate_path.resolve().as_posix(), "page": page_num, "total_pages": 2,
+         "output": (output_dir / f"b_page_{page_num}.png").as_posix()} for page_num in (1, 2)]
+    settings = dict(pdf_converter.DEFAULT_CONFIG, dedup_files=True, workers=1,
+                    output_filename_template="{pdf_name}_page_{page_num}.png")
+
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    store.create_job("job-1", settings, pages, output_dir, input_dir)
+    reported = []
+
+    def on_page_done(pdf_path, page_num, output_path):
+        store.mark_page_done("job-1", pdf_path, page_num)
+        reported.append((Path(pdf_path).name, page_num, output_path is not None))
+
+    generated, processed = pdf_converter.run_conversion_batch(
+        [primary_path, duplicate_path], output_dir, settings, input_dir,
+        page_plan=pdf_converter.page_plan_from_records(pages), on_page_done=on_page_done)
+    store.flush()
+
+    assert len(generated) == 4 and processed == 2
+    assert sorted(reported) == [("a.pdf", 1, True), ("a.pdf", 2, True), ("b.pdf", 1, True), ("b.pdf", 2, True)]
+    assert store.pending_pages("job-1") == []
+    store.close()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import flask_api
+import pdf_converter
+
+def log_from_other_job(job_id, message):
+    def run():
+        with pdf_converter.running_job(job_id):
+            pdf_converter.logger.warning(message)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+def test_convert_returns_only_its_own_logs(monkeypatch):
+    log_from_other_job("log-other", "earlier line of a running job")
+
+    def fake_conversion(data, job_id, job_stop_event, on_page_done=None):
+        pdf_converter.logger.info(f"line of {job_id}")
+        log_from_other_job("log-other", "concurrent line of another job")
+        return {"status": "completed", "job_id": job_id}, 200
+
+    monkeypatch.setattr(flask_api, "run_conversion_request", fake_conversion)
+    response = flask_api.app.test_client().post("/convert", json={"job_id": "log-own"})
+    messages = [entry["message"] for entry in response.get_json()["logs"]]
+    assert len(messages) == 1 and messages[0].endswith("line of log-own")
+    # 其他任务的日志不会被本次请求清除
+    other_messages = [entry["message"] for entry in flask_api.log_capture_handler.get_logs("log-other")]
+    assert [message.rsplit(" - ", 1)[-1] for message in other_messages] == [
+        "earlier line of a running job", "concurrent line of another job"]
+
+def test_estimate_returns_only_its_own_logs(monkeypatch):
+    def fake_estimate(data, job_id, job_stop_event):
+        pdf_converter.logger.warning(f"estimate line of {job_id}")
+        log_from_other_job("log-other-estimate", "line of another job")
+        return {"status": "completed", "job_id": job_id}, 200
+
+    monkeypatch.setattr(flask_api, "run_estimate_request", fake_estimate)
+    response = flask_api.app.test_client().post("/estimate", json={"job_id": "log-estimate"})
+    messages = [entry["message"] for entry in response.get_json()["logs"]]
+    assert len(messages) == 1 and messages[0].endswith("estimate line of log-estimate")
+    assert pdf_converter.current_job_id() is None
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+from PIL import Image
+
+import pdf_converter
+
+def png_round_trip(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    buffer.seek(0)
+    reloaded = Image.open(buffer)
+    reloaded.load()
+    return reloaded
+
+def gray_page(levels=(40, 128, 255), size=(30, 10)):
+    image = Image.new("L", size, 255)
+    stripe = size[0] // len(levels)
+    for index, level in enumerate(levels):
+        image.paste(level, (index * stripe, 0, (index + 1) * stripe, size[1]))
+    return image
+
+def test_palette_gray_round_trip_keeps_levels():
+    image = gray_page()
+    palette_image = pdf_converter.to_palette(image)
+    assert palette_image.mode == "P"
+    assert png_round_trip(palette_image).convert("L").tobytes() == image.tobytes()
+
+def test_palette_rgb_round_trip_is_lossless():
+    image = Image.new("RGB", (30, 10), (255, 255, 255))
+    image.paste((200, 10, 10), (0, 0, 10, 10))
+    image.paste((0, 0, 255), (10, 0, 20, 10))
+    palette_image = pdf_converter.to_palette(image)
+    assert palette_image.mode == "P"
+    assert png_round_trip(palette_image).convert("RGB").tobytes() == image.tobytes()
+
+def test_palette_quantizes_pages_with_many_colors():
+    image = Image.linear_gradient("L").convert("RGB")
+    palette_image = pdf_converter.to_palette(image, max_colors=16)
+    assert palette_image.mode == "P"
+    assert len(palette_image.getcolors(256)) <= 16
+
+def test_bilevel_threshold():
+    image = gray_page((100, 200))
+    bilevel = pdf_converter.to_bilevel(image, threshold=128)
+    assert bilevel.mode == "1"
+    assert png_round_trip(bilevel).convert("L").getcolors() == [(150, 0), (150, 255)]
+
+def test_auto_mode_picks_palette_for_few_colors():
+    image, mode = pdf_converter.apply_output_mode(gray_page(), "auto")
+    assert mode == "palette"
+    assert png_round_trip(image).convert("L").tobytes() == gray_page().tobytes()
+
+def test_auto_mode_keeps_full_for_photos():
+    image = Image.linear_gradient("L").convert("RGB")
+    image = Image.merge("RGB", (image.getchannel(0), image.getchannel(1).rotate(90), image.getchannel(2)))
+    assert pdf_converter.apply_output_mode(image, "auto")[1] == "full"
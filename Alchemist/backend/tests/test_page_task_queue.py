@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import render_coordinator
+from render_coordinator import PageTaskQueue
+
+def make_pages(count):
+    return [{"pdf": f"/in/doc_{index}.pdf", "page": 1, "total_pages": 1, "output": f"/out/doc_{index}.png"}
+            for index in range(count)]
+
+def done_report(task_id):
+    return {"task_id": task_id, "output": f"/out/{task_id}.png", "pages": [], "skipped_pages": [], "failed_pages": []}
+
+def test_leases_tasks_in_order_and_finishes():
+    task_queue = PageTaskQueue(make_pages(3))
+    leased = task_queue.lease("w1", max_tasks=2)
+    assert [task["id"] for task in leased] == [0, 1]
+    assert [task["id"] for task in task_queue.lease("w2", max_tasks=5)] == [2]
+    for task_id in range(3):
+        assert task_queue.complete("w1", done_report(task_id))
+    assert task_queue.is_finished()
+    assert task_queue.status()["states"] == {"done": 3}
+
+def test_empty_queue_is_finished():
+    assert PageTaskQueue([]).is_finished()
+
+def test_expired_lease_is_requeued_first():
+    task_queue = PageTaskQueue(make_pages(2), page_timeout=1)
+    assert [task["id"] for task in task_queue.lease("w1")] == [0]
+    task_queue.reap(now=time.monotonic() + task_queue.lease_seconds + 1)
+    assert task_queue.status()["states"] == {"pending": 2}
+    assert [task["id"] for task in task_queue.lease("w2")] == [0]
+
+def test_silent_worker_loses_its_leases():
+    task_queue = PageTaskQueue(make_pages(1))
+    task_queue.lease("w1")
+    task_queue.reap(now=time.monotonic() + render_coordinator.WORKER_TIMEOUT + 1)
+    status = task_queue.status()
+    assert status["states"] == {"pending": 1}
+    assert status["workers"]["w1"]["alive"] is False
+
+def test_first_completion_wins_after_reassignment():
+    task_queue = PageTaskQueue(make_pages(1), page_timeout=1)
+    task_queue.lease("w1")
+    task_queue.reap(now=time.monotonic() + task_queue.lease_seconds + 1)
+    task_queue.lease("w2")
+    assert task_queue.complete("w1", done_report(0))
+    assert not task_queue.complete("w2", done_report(0))
+    assert task_queue.status()["workers"]["w2"]["leases"] == []
+    assert len(task_queue.results) == 1
+    assert task_queue.is_finished()
+
+def test_task_fails_after_max_lease_attempts():
+    task_queue = PageTaskQueue(make_pages(1), page_timeout=1)
+    for attempt in range(render_coordinator.MAX_LEASE_ATTEMPTS):
+        assert task_queue.lease(f"w{attempt}")
+        task_queue.reap(now=time.monotonic() + task_queue.lease_seconds + 1)
+    assert task_queue.status()["states"] == {"failed": 1}
+    assert task_queue.results[0]["failed_pages"][0]["reason"] == "crash"
+    assert task_queue.is_finished()
+
+def test_invalid_report_is_rejected():
+    task_queue = PageTaskQueue(make_pages(1))
+    assert not task_queue.complete("w1", {"task_id": 7})
+    assert not task_queue.complete("w1", {"task_id": "0"})
+
+def test_cancel_drops_pending_tasks():
+    task_queue = PageTaskQueue(make_pages(3))
+    task_queue.lease("w1")
+    task_queue.cancel()
+    assert task_queue.lease("w2") == []
+    assert not task_queue.is_finished()
+    task_queue.complete("w1", done_report(0))
+    assert task_queue.is_finished()
+    assert task_queue.status()["states"] == {"done": 1, "cancelled": 2}
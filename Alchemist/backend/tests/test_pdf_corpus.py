@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import pdf_corpus
+
+UNIT_PROFILE = {
+    "text": {"count": 2, "pages": 2},
+    "vector": {"count": 1, "pages": 1, "paths": 20},
+    "images": {"count": 1, "pages": 1, "image_size": 32},
+    "huge": {"count": 1, "pages": 1, "sizes": [(2384, 3370)]},
+    "long": {"count": 1, "pages": 12},
+    "tiny": {"count": 3},
+    "corrupt": {"count": 6},
+}
+
+@pytest.fixture(autouse=True)
+def unit_profile(monkeypatch):
+    monkeypatch.setitem(pdf_corpus.PROFILES, "unit", UNIT_PROFILE)
+
+def checksums(manifest):
+    return {entry["path"]: entry["sha256"] for entry in manifest["files"]}
+
+def test_same_seed_gives_identical_corpus(tmp_path):
+    first = pdf_corpus.generate_corpus(tmp_path / "a", seed=7, profile="unit")
+    second = pdf_corpus.generate_corpus(tmp_path / "b", seed=7, profile="unit")
+    assert first == second
+    assert len(first["files"]) == sum(params["count"] for params in UNIT_PROFILE.values())
+    for entry in first["files"]:
+        assert (tmp_path / "a" / entry["path"]).read_bytes() == (tmp_path / "b" / entry["path"]).read_bytes()
+
+def test_different_seed_changes_content(tmp_path):
+    first = checksums(pdf_corpus.generate_corpus(tmp_path / "a", seed=1, profile="unit"))
+    second = checksums(pdf_corpus.generate_corpus(tmp_path / "b", seed=2, profile="unit"))
+    assert first.keys() == second.keys()
+    assert first != second
+
+def test_changing_one_category_keeps_other_files(tmp_path, monkeypatch):
+    before = checksums(pdf_corpus.generate_corpus(tmp_path / "a", seed=3, profile="unit"))
+    monkeypatch.setitem(pdf_corpus.PROFILES, "unit", dict(UNIT_PROFILE, tiny={"count": 5}))
+    after = checksums(pdf_corpus.generate_corpus(tmp_path / "b", seed=3, profile="unit"))
+    assert {path: checksum for path, checksum in after.items() if not path.startswith("tiny/")} == {
+        path: checksum for path, checksum in before.items() if not path.startswith("tiny/")}
+
+def test_valid_files_are_complete_pdfs(tmp_path):
+    manifest = pdf_corpus.generate_corpus(tmp_path, seed=0, profile="unit")
+    for entry in manifest["files"]:
+        if entry["valid"]:
+            data = (tmp_path / entry["path"]).read_bytes()
+            assert data.startswith(b"%PDF-") and data.rstrip().endswith(b"%%EOF")
+            assert data.count(b"/Type /Page ") == entry["pages"]
+
+def test_verify_and_ensure_corpus(tmp_path):
+    manifest = pdf_corpus.generate_corpus(tmp_path, seed=5, profile="unit")
+    assert pdf_corpus.verify_corpus(tmp_path) == []
+    assert pdf_corpus.ensure_corpus(tmp_path, seed=5, profile="unit") == manifest
+    modified, deleted = manifest["files"][0]["path"], manifest["files"][1]["path"]
+    (tmp_path / modified).write_bytes(b"changed")
+    (tmp_path / deleted).unlink()
+    assert pdf_corpus.verify_corpus(tmp_path) == [modified, deleted]
+    # 文件缺失或被修改时重新生成，不复用
+    assert pdf_corpus.ensure_corpus(tmp_path, seed=5, profile="unit") == manifest
+    assert pdf_corpus.verify_corpus(tmp_path) == []
+    pdf_corpus.ensure_corpus(tmp_path, seed=6, profile="unit")
+    assert pdf_corpus.load_corpus_manifest(tmp_path)["seed"] == 6
+    assert pdf_corpus.verify_corpus(tmp_path) == []
+
+def test_verify_requires_manifest(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        pdf_corpus.verify_corpus(tmp_path)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+import pdf_converter
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    path = tmp_path / "poison.pdf"
+    path.write_bytes(b"%PDF-1.7\npoison\n")
+    return path
+
+def test_failures_quarantine_after_threshold(tmp_path, pdf_file):
+    store = pdf_converter.QuarantineStore(tmp_path / "quarantine.json", threshold=2)
+    assert not store.record_failure(pdf_file, {"crash"})
+    assert store.find_quarantined(pdf_file) is None
+    assert store.record_failure(pdf_file, {"timeout"})
+    entry = pdf_converter.QuarantineStore(tmp_path / "quarantine.json").find_quarantined(pdf_file)
+    assert entry["failures"] == 2
+    assert entry["reasons"] == ["crash", "timeout"]
+
+@pytest.mark.parametrize("content", ["[1, 2, 3]", "\"text\"", "null", "{\"abc\": 5, \"def\": {\"failures\": \"x\"}}",
+                                     "not json"])
+def test_invalid_store_is_ignored(tmp_path, pdf_file, content):
+    path = tmp_path / "quarantine.json"
+    path.write_text(content, encoding="utf-8")
+    store = pdf_converter.QuarantineStore(path, threshold=1)
+    assert store.entries == {}
+    assert store.record_failure(pdf_file, {"crash"})
+    assert len(json.loads(path.read_text(encoding="utf-8"))) == 1
+
+def test_quarantine_endpoint_ignores_client_path(tmp_path):
+    import flask_api
+    other_file = tmp_path / "secret.json"
+    other_file.write_text(json.dumps({"abc": {"quarantined": True, "failures": 3, "reasons": []}}), encoding="utf-8")
+    response = flask_api.app.test_client().get("/quarantine", query_string={"quarantine_file": str(other_file)})
+    assert response.status_code == 200
+    assert response.get_json()["quarantine_file"] == pdf_converter.DEFAULT_QUARANTINE_FILE.resolve().as_posix()
+    assert response.get_json()["quarantined"] == {}
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import pytest
+
+import pdf_converter
+import render_service
+from render_service import EncodedPageCache, PageRenderService, RenderRequestError
+
+def fake_metadata(monkeypatch, page_sizes):
+    monkeypatch.setattr(pdf_converter, "read_pdf_metadata",
+                        lambda *args, **kwargs: {"pages": len(page_sizes), "page_sizes": page_sizes})
+
+@pytest.mark.parametrize("page_width, width, expected", [
+    (612.0, 1275, 150),
+    (612.0, 1276, 151),
+    (595.3, 1240, 150),
+    (0.5, 100, render_service.MAX_RENDER_DPI),
+    (612.0, 1, 1),
+])
+def test_dpi_for_width(monkeypatch, page_width, width, expected):
+    fake_metadata(monkeypatch, [[page_width, 792.0]])
+    assert PageRenderService().dpi_for_width(Path("doc.pdf"), 1, width) == expected
+
+@pytest.mark.parametrize("page_size", [None, [0.0, 792.0], [-10.0, 792.0]])
+def test_dpi_for_width_rejects_unusable_page_size(monkeypatch, page_size):
+    fake_metadata(monkeypatch, [page_size])
+    with pytest.raises(RenderRequestError) as error:
+        PageRenderService().dpi_for_width(Path("doc.pdf"), 1, 800)
+    assert error.value.status == 422
+
+def test_dpi_for_width_rejects_page_out_of_range(monkeypatch):
+    fake_metadata(monkeypatch, [[612.0, 792.0]])
+    with pytest.raises(RenderRequestError) as error:
+        PageRenderService().dpi_for_width(Path("doc.pdf"), 2, 800)
+    assert error.value.status == 404
+
+def test_cache_evicts_least_recently_used_by_bytes():
+    cache = EncodedPageCache(max_bytes=10)
+    cache.put("a", b"1234", "image/png")
+    cache.put("b", b"1234", "image/png")
+    assert cache.get("a") == (b"1234", "image/png")
+    cache.put("c", b"1234", "image/png")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    summary = cache.summary()
+    assert (summary["entries"], summary["bytes"], summary["evictions"]) == (2, 8, 1)
+    assert (summary["hits"], summary["misses"]) == (3, 1)
+
+def test_cache_replaces_existing_key_and_skips_oversized_bodies():
+    cache = EncodedPageCache(max_bytes=10)
+    cache.put("a", b"1234", "image/png")
+    cache.put("a", b"123456", "image/webp")
+    assert cache.get("a") == (b"123456", "image/webp")
+    assert cache.summary()["bytes"] == 6
+    cache.put("big", b"x" * 11, "image/png")
+    assert cache.get("big") is None
+    assert cache.summary()["entries"] == 1
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import pdf_converter
+
+@pytest.mark.parametrize("spec, expected", [("", None), (None, None), ("1/1", (1, 1)), (" 2 / 5 ", (2, 5))])
+def test_parse_shard(spec, expected):
+    assert pdf_converter.parse_shard(spec) == expected
+
+@pytest.mark.parametrize("spec", ["0/3", "4/3", "1", "a/b", "1/0", "-1/2"])
+def test_parse_shard_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        pdf_converter.parse_shard(spec)
+
+def test_every_page_belongs_to_exactly_one_shard(tmp_path):
+    pdf_paths = [tmp_path / "sub" / f"doc_{index}.pdf" for index in range(20)]
+    for pdf_path in pdf_paths:
+        for page_num in range(1, 30):
+            owners = [index for index in range(1, 5)
+                      if pdf_converter.page_in_shard(pdf_path, page_num, (index, 4), tmp_path)]
+            assert len(owners) == 1
+
+def test_shard_key_is_relative_to_input_root(tmp_path):
+    assert pdf_converter.shard_key(tmp_path / "a" / "b.pdf", tmp_path) == "a/b.pdf"
+    other_root = tmp_path / "mount"
+    assert (pdf_converter.page_in_shard(tmp_path / "a" / "b.pdf", 3, (1, 3), tmp_path)
+            == pdf_converter.page_in_shard(other_root / "a" / "b.pdf", 3, (1, 3), other_root))
+
+def plan_shards(monkeypatch, tmp_path, overwrite, shard_count=3, manifest=None):
+    monkeypatch.setattr(pdf_converter, "read_pdf_page_count", lambda *args, **kwargs: 12)
+    pdf_path = tmp_path / "input" / "doc.pdf"
+    pages = {}
+    for index in range(1, shard_count + 1):
+        for page_num, _, output_path in pdf_converter.plan_pdf_pages(
+                pdf_path, tmp_path / "out", "all", 72, overwrite, "", "{pdf_name}_page_{page_num}.png", False,
+                input_root_dir=pdf_path.parent, manifest=manifest, reserved_paths=set(), shard=(index, shard_count)):
+            pages[page_num] = output_path
+    return pages
+
+def test_shards_cover_all_pages_with_default_paths(monkeypatch, tmp_path):
+    pages = plan_shards(monkeypatch, tmp_path, overwrite=False)
+    assert sorted(pages) == list(range(1, 13))
+    assert all(path.name == f"doc_page_{page_num}.png" for page_num, path in pages.items())
+
+def test_shard_skips_existing_outputs_without_overwrite(monkeypatch, tmp_path):
+    existing = tmp_path / "out" / "doc_page_3.png"
+    existing.parent.mkdir(parents=True)
+    existing.write_bytes(b"keep")
+    manifest = pdf_converter.new_job_manifest({})
+    pages = plan_shards(monkeypatch, tmp_path, overwrite=False, manifest=manifest)
+    assert 3 not in pages
+    assert [(record["page"], record["reason"]) for record in manifest["skipped_pages"]] == [(3, "exists")]
+    assert existing.read_bytes() == b"keep"
+
+def test_shard_overwrites_existing_outputs_with_overwrite(monkeypatch, tmp_path):
+    existing = tmp_path / "out" / "doc_page_3.png"
+    existing.parent.mkdir(parents=True)
+    existing.write_bytes(b"old")
+    assert plan_shards(monkeypatch, tmp_path, overwrite=True)[3] == existing
+
+def test_estimate_samples_only_pages_of_the_shard(monkeypatch, tmp_path):
+    monkeypatch.setattr(pdf_converter, "read_pdf_page_count", lambda *args, **kwargs: 12)
+    sampled = []
+
+    def fake_convert_page(pdf_path, page_num, *args, **kwargs):
+        sampled.append((pdf_path, page_num))
+        return None
+
+    monkeypatch.setattr(pdf_converter, "convert_page", fake_convert_page)
+    pdf_paths = [tmp_path / "input" / f"doc_{index}.pdf" for index in range(3)]
+    settings = dict(pdf_converter.DEFAULT_CONFIG, pages="all", shard="2/3", estimate_samples=100)
+    estimate = pdf_converter.estimate_conversion(pdf_paths, settings, tmp_path / "input")
+    expected = {(pdf_path, page_num) for pdf_path in pdf_paths for page_num in range(1, 13)
+                if pdf_converter.page_in_shard(pdf_path, page_num, (2, 3), tmp_path / "input")}
+    assert set(sampled) == expected
+    assert estimate["total_pages"] == len(expected)
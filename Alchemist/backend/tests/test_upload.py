@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import io
+import tempfile
+import zipfile
+
+import pytest
+from PIL import Image
+from werkzeug.test import EnvironBuilder
+
+import archive_service
+import flask_api
+import pdf_converter
+from archive_service import ArchiveRequestError
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(pdf_converter, "read_pdf_page_count", lambda *args, **kwargs: 2)
+    monkeypatch.setattr(pdf_converter, "render_processed_page",
+                        lambda *args, **kwargs: (Image.new("L", (4, 4), 255), {}, "full"))
+    return tmp_path
+
+def leftover_uploads(upload_dir):
+    return sorted(upload_dir.glob("alchemist_upload_*"))
+
+def multipart_body(**fields):
+    return dict(fields, file=(io.BytesIO(b"%PDF-1.4 upload"), "doc.pdf"))
+
+def test_multipart_upload_streams_archive_and_cleans_up(upload_dir):
+    response = flask_api.app.test_client().post("/convert/upload?job_id=upload-ok", data=multipart_body(pages="all"),
+                                                content_type="multipart/form-data")
+    assert response.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(response.get_data())).namelist()
+    assert len(names) == 3 and pdf_converter.MANIFEST_FILENAME in names
+    assert leftover_uploads(upload_dir) == []
+    assert "upload-ok" not in flask_api.active_jobs
+
+def test_unread_response_releases_job_and_upload(upload_dir):
+    with flask_api.app.test_request_context("/convert/upload?job_id=upload-unread", method="POST",
+                                            data=multipart_body(), content_type="multipart/form-data"):
+        response = flask_api.convert_upload()
+    assert len(leftover_uploads(upload_dir)) == 1
+    assert "upload-unread" not in flask_api.active_jobs
+    # 客户端在响应开始前断开：服务器关闭从未迭代的响应
+    response.close()
+    assert leftover_uploads(upload_dir) == []
+    assert "upload-unread" not in flask_api.active_jobs
+
+def oversized_environ():
+    return EnvironBuilder(method="POST", data={"file": (io.BytesIO(b"x" * 4096), "doc.pdf")},
+                          content_type="multipart/form-data").get_environ()
+
+def test_multipart_upload_rejects_oversized_file_and_removes_parts(upload_dir):
+    with pytest.raises(ArchiveRequestError) as error:
+        archive_service.receive_multipart_upload(oversized_environ(), max_bytes=1024)
+    assert error.value.status == 413
+    assert leftover_uploads(upload_dir) == []
+
+def test_multipart_upload_checks_content_length_before_receiving(upload_dir, monkeypatch):
+    monkeypatch.setattr(archive_service, "MULTIPART_OVERHEAD_BYTES", 0)
+    monkeypatch.setattr(tempfile, "NamedTemporaryFile", None) # 请求体不应被接收
+    with pytest.raises(ArchiveRequestError) as error:
+        archive_service.receive_multipart_upload(oversized_environ(), max_bytes=1024)
+    assert error.value.status == 413
+
+def test_multipart_upload_keeps_only_the_file_field(upload_dir):
+    environ = EnvironBuilder(method="POST", data={"other": (io.BytesIO(b"other"), "other.bin"), "dpi": "72",
+                                                  "file": (io.BytesIO(b"%PDF-1.4 upload"), "doc.pdf")},
+                             content_type="multipart/form-data").get_environ()
+    upload_path, upload_name, fields = archive_service.receive_multipart_upload(environ)
+    assert upload_path.read_bytes() == b"%PDF-1.4 upload"
+    assert (upload_name, fields) == ("doc.pdf", {"dpi": "72"})
+    assert leftover_uploads(upload_dir) == [upload_path]
+
+def test_save_upload_checks_content_length_before_reading(tmp_path):
+    class UnreadableStream:
+        def read(self, size):
+            raise AssertionError("request body must not be read")
+
+    with pytest.raises(ArchiveRequestError) as error:
+        archive_service.save_upload(UnreadableStream(), tmp_path / "upload.pdf", max_bytes=10, content_length=11)
+    assert error.value.status == 413
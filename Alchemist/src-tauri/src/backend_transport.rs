@@ -0,0 +1,119 @@
+// Transport between the UI and the Python backend.
+// The backend prints a ready line on startup announcing where it listens: a Unix domain socket
+// (POSIX, release builds) or TCP on localhost. Requests from the frontend are proxied through
+// `request`, so the webview never needs a network port or CORS.
+
+use std::path::PathBuf;
+use std::sync::Mutex;
+use tokio::io::{AsyncRead, AsyncReadExt, AsyncWrite, AsyncWriteExt};
+
+pub const READY_PREFIX: &str = "ALCHEMIST_READY ";
+pub const DEFAULT_TCP_ADDRESS: &str = "127.0.0.1:5003";
+
+#[derive(Clone, Debug, PartialEq)]
+pub enum Transport {
+    Tcp(String),
+    Unix(PathBuf),
+}
+
+// Current transport; TCP until the backend announces otherwise (the dev server never does)
+pub struct BackendTransport(pub Mutex<Transport>);
+
+impl Default for BackendTransport {
+    fn default() -> Self {
+        BackendTransport(Mutex::new(Transport::Tcp(DEFAULT_TCP_ADDRESS.to_string())))
+    }
+}
+
+#[derive(Debug, serde::Serialize)]
+pub struct BackendResponse {
+    pub status: u16,
+    pub body: String,
+}
+
+// Socket path handed to the backend with --unix_socket; None where Unix sockets are unavailable
+pub fn socket_path() -> Option<PathBuf> {
+    if cfg!(unix) {
+        Some(std::env::temp_dir().join(format!("alchemist-{}.sock", std::process::id())))
+    } else {
+        None
+    }
+}
+
+// Parse `ALCHEMIST_READY {"transport": "unix", "path": ...}` or `{"transport": "tcp", "address": ...}`
+pub fn parse_ready_line(line: &str) -> Option<Transport> {
+    let ready: serde_json::Value = serde_json::from_str(line.strip_prefix(READY_PREFIX)?).ok()?;
+    match ready.get("transport")?.as_str()? {
+        "unix" if cfg!(unix) => Some(Transport::Unix(PathBuf::from(ready.get("path")?.as_str()?))),
+        "tcp" => Some(Transport::Tcp(ready.get("address")?.as_str()?.to_string())),
+        _ => None,
+    }
+}
+
+// Send one HTTP/1.1 request to the backend and return the status and (de-chunked) body
+pub async fn request(transport: &Transport, method: &str, path: &str, body: Option<&str>) -> Result<BackendResponse, String> {
+    let body = body.unwrap_or("");
+    let request = format!(
+        "{} {} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: close\r\n\r\n{}",
+        method, path, body.len(), body
+    );
+    let raw = match transport {
+        Transport::Tcp(address) => {
+            let stream = tokio::net::TcpStream::connect(address).await
+                .map_err(|e| format!("Failed to connect to backend at {}: {}", address, e))?;
+            exchange(stream, &request).await?
+        }
+        #[cfg(unix)]
+        Transport::Unix(socket) => {
+            let stream = tokio::net::UnixStream::connect(socket).await
+                .map_err(|e| format!("Failed to connect to backend at {:?}: {}", socket, e))?;
+            exchange(stream, &request).await?
+        }
+        #[cfg(not(unix))]
+        Transport::Unix(socket) => return Err(format!("Unix sockets are not supported here: {:?}", socket)),
+    };
+    parse_response(&raw)
+}
+
+async fn exchange<S: AsyncRead + AsyncWrite + Unpin>(mut stream: S, request: &str) -> Result<Vec<u8>, String> {
+    stream.write_all(request.as_bytes()).await.map_err(|e| e.to_string())?;
+    let mut raw = Vec::new();
+    stream.read_to_end(&mut raw).await.map_err(|e| e.to_string())?;
+    Ok(raw)
+}
+
+fn parse_response(raw: &[u8]) -> Result<BackendResponse, String> {
+    let header_end = raw.windows(4).position(|w| w == b"\r\n\r\n").ok_or("Incomplete response from backend")?;
+    let head = String::from_utf8_lossy(&raw[..header_end]);
+    let mut lines = head.split("\r\n");
+    let status = lines.next()
+        .and_then(|line| line.split_whitespace().nth(1))
+        .and_then(|code| code.parse().ok())
+        .ok_or("Invalid status line from backend")?;
+    let chunked = lines.any(|line| {
+        let line = line.to_ascii_lowercase();
+        line.starts_with("transfer-encoding:") && line.contains("chunked")
+    });
+    let payload = &raw[header_end + 4..];
+    let body = if chunked { decode_chunked(payload)? } else { payload.to_vec() };
+    Ok(BackendResponse { status, body: String::from_utf8_lossy(&body).into_owned() })
+}
+
+fn decode_chunked(mut data: &[u8]) -> Result<Vec<u8>, String> {
+    let mut body = Vec::new();
+    loop {
+        let line_end = data.windows(2).position(|w| w == b"\r\n").ok_or("Invalid chunked body")?;
+        let size_field = String::from_utf8_lossy(&data[..line_end]);
+        let size_hex = size_field.split(';').next().unwrap_or("").trim();
+        let size = usize::from_str_radix(size_hex, 16).map_err(|e| format!("Invalid chunk size {:?}: {}", size_hex, e))?;
+        data = &data[line_end + 2..];
+        if size == 0 {
+            return Ok(body);
+        }
+        if data.len() < size + 2 {
+            return Err("Truncated chunked body".to_string());
+        }
+        body.extend_from_slice(&data[..size]);
+        data = &data[size + 2..];
+    }
+}
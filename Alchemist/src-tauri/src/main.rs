@@ -1,8 +1,11 @@
 // Prevents additional console window on Windows in release, DO NOT REMOVE!!
 #![cfg_attr(not(debug_assertions), windows_subsystem = "windows")]
 
+mod backend_transport;
+
 use tauri_plugin_dialog::FilePath;
-use tauri::{command, generate_handler, AppHandle, Manager};
+use tauri::{command, generate_handler, AppHandle, Manager, State};
+use backend_transport::{BackendResponse, BackendTransport};
 use tauri_plugin_dialog::DialogExt;
 use tokio::sync::oneshot;
 use tokio::process::Command as TokioCommand; // Use tokio::process::Command
@@ -41,8 +44,8 @@ async fn start_python_backend(app_handle: AppHandle) -> Result<String, String> {
         // In dev mode, current_dir is src-tauri/, so navigate up one level to Alchemist/ then into backend/
         std::env::current_dir().map_err(|e| e.to_string())?.join("..").join("backend").join("flask_api.py")
     } else {
-        // In release mode, resources are bundled
-        app_handle.path().resource_dir().map_err(|e| e.to_string())?.join("backend").join("flask_api.py")
+        // In release mode, resources are bundled; run the production server entry point
+        app_handle.path().resource_dir().map_err(|e| e.to_string())?.join("backend").join("server.py")
     };
 
     if !python_script_path.exists() {
@@ -53,6 +56,13 @@ async fn start_python_backend(app_handle: AppHandle) -> Result<String, String> {
 
     let mut command = TokioCommand::new("python3"); // Changed to python3
     command.args(&[python_script_path.to_str().unwrap()]);
+    // The production entry point can listen on a Unix domain socket instead of a TCP port;
+    // it announces the transport it actually uses in its ready line (see backend_transport)
+    if !cfg!(debug_assertions) {
+        if let Some(socket_path) = backend_transport::socket_path() {
+            command.args(&["--unix_socket", socket_path.to_str().unwrap()]);
+        }
+    }
     command.stdout(Stdio::piped());
     command.stderr(Stdio::piped());
 
@@ -64,6 +74,7 @@ async fn start_python_backend(app_handle: AppHandle) -> Result<String, String> {
     let stdout = child.stdout.take().ok_or_else(|| "Failed to capture stdout".to_string())?;
     let stderr = child.stderr.take().ok_or_else(|| "Failed to capture stderr".to_string())?;
 
+    let transport_handle = app_handle.clone();
     tokio::spawn(async move {
         let mut stdout_reader = tokio::io::BufReader::new(stdout).lines();
         let mut stderr_reader = tokio::io::BufReader::new(stderr).lines();
@@ -72,7 +83,13 @@ async fn start_python_backend(app_handle: AppHandle) -> Result<String, String> {
             tokio::select! {
                 stdout_line = stdout_reader.next_line() => {
                     match stdout_line {
-                        Ok(Some(line)) => println!("[Python Backend stdout]: {}", line),
+                        Ok(Some(line)) => {
+                            if let Some(transport) = backend_transport::parse_ready_line(&line) {
+                                println!("Python backend ready on {:?}", transport);
+                                *transport_handle.state::<BackendTransport>().0.lock().unwrap() = transport;
+                            }
+                            println!("[Python Backend stdout]: {}", line)
+                        },
                         Ok(None) => break, // EOF
                         Err(e) => eprintln!("Error reading stdout: {}", e),
                     }
@@ -94,6 +111,14 @@ async fn start_python_backend(app_handle: AppHandle) -> Result<String, String> {
     Ok(format!("Python backend started with PID: {}", pid_string)) // Use the stored PID string
 }
 
+// Forward an HTTP request from the frontend to the backend over the negotiated transport
+#[command]
+async fn backend_request(transport: State<'_, BackendTransport>, method: String, path: String,
+                         body: Option<String>) -> Result<BackendResponse, String> {
+    let current = transport.0.lock().unwrap().clone();
+    backend_transport::request(&current, &method, &path, body.as_deref()).await
+}
+
 #[tauri::command]
 async fn open_path_in_system(path: String) -> Result<(), String> {
     // 打印将要打开的路径，用于调试
@@ -138,8 +163,9 @@ fn main() {
         .plugin(tauri_plugin_opener::init()) // Initialize the opener plugin
         .plugin(tauri_plugin_shell::init()) // Initialize the shell plugin
         // .plugin(tauri_plugin_process::init()) // Remove plugin init as we are using tokio::process
+        .manage(BackendTransport::default())
         .invoke_handler(generate_handler![open_file_dialog, open_directory_dialog, start_python_backend,
-            open_path_in_system])
+            open_path_in_system, backend_request])
         .setup(|app| {
             let app_handle = app.app_handle().clone(); // Clone app_handle here
             tauri::async_runtime::spawn(async move {
@@ -1,5 +1,16 @@
 import { invoke } from "@tauri-apps/api/core";
 
+// Requests go through the Rust side, which talks to the backend over the transport it announced
+// at startup (a Unix domain socket in release builds on macOS/Linux, otherwise localhost TCP)
+async function backendRequest(method: string, path: string, body?: unknown) {
+  const response = (await invoke("backend_request", {
+    method,
+    path,
+    body: body === undefined ? null : JSON.stringify(body),
+  })) as { status: number; body: string };
+  return { status: response.status, json: () => JSON.parse(response.body) };
+}
+
 const pdfForm = document.querySelector<HTMLFormElement>("#pdf-form");
 const conversionOutput =
   document.querySelector<HTMLDivElement>("#conversion-output");
@@ -39,9 +50,7 @@ browseOutputDirButton?.addEventListener("click", async () => {
 
 stopButton?.addEventListener("click", async () => {
   try {
-    await fetch("http://localhost:5003/stop", {
-      method: "POST",
-    });
+    await backendRequest("POST", "/stop");
     conversionOutput!.innerHTML += `<p>转换终止请求已发送。</p>`;
   } catch (error) {
     conversionOutput!.innerHTML += `<p>错误: 无法发送终止请求: ${error}</p>`;
@@ -109,15 +118,9 @@ pdfForm?.addEventListener("submit", async (event) => {
   };
 
   try {
-    const response = await fetch("http://localhost:5003/convert", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify(data),
-    });
+    const response = await backendRequest("POST", "/convert", data);
 
-    const result = await response.json();
+    const result = response.json();
     conversionOutput!.innerHTML = ""; // Clear previous output
 
     if (result.logs && Array.isArray(result.logs)) {